@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Class, Subject, Quiz, Question, Choice, StudentQuizAttempt, Answer
 from .models import StudentQuizAttempt
+from .answer_key import invalidate_answer_key
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
@@ -11,10 +12,56 @@ class QuestionAdmin(admin.ModelAdmin):
     inlines = [ChoiceInline]
     list_display = ('text', 'quiz', 'question_type', 'marks')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # question moved to another quiz: the old quiz's key is stale too
+        if change and "quiz" in form.changed_data and form.initial.get("quiz"):
+            invalidate_answer_key(form.initial["quiz"])
+
+    # choices are saved with the inlines, so invalidate after related objects
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_answer_key(form.instance.quiz_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_answer_key(obj.quiz_id)
+
+    def delete_queryset(self, request, queryset):
+        quiz_ids = set(queryset.values_list("quiz_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for quiz_id in quiz_ids:
+            invalidate_answer_key(quiz_id)
+
+
+class ChoiceAdmin(admin.ModelAdmin):
+    list_display = ('text', 'question', 'is_correct')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_answer_key(obj.question.quiz_id)
+
+    def delete_model(self, request, obj):
+        quiz_id = obj.question.quiz_id
+        super().delete_model(request, obj)
+        invalidate_answer_key(quiz_id)
+
+    def delete_queryset(self, request, queryset):
+        quiz_ids = set(queryset.values_list("question__quiz_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for quiz_id in quiz_ids:
+            invalidate_answer_key(quiz_id)
+
 
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'subject', 'is_published')
     list_filter = ('subject', 'is_published')
+    exclude = ('content_version',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            invalidate_answer_key(obj)
 
 
 class AnswerAdmin(admin.ModelAdmin):
@@ -25,7 +72,7 @@ admin.site.register(Class)
 admin.site.register(Subject)
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Question, QuestionAdmin)
-admin.site.register(Choice)
+admin.site.register(Choice, ChoiceAdmin)
 admin.site.register(Answer, AnswerAdmin)
 
 
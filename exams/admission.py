@@ -0,0 +1,129 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# how long per-quiz admission state is kept in the cache (seconds)
+STATE_TIMEOUT = 6 * 60 * 60
+# a ticket not used within this many windows (and at least TICKET_GRACE_SECONDS) of its
+# window opening is dropped: the student left the waiting room and queues again on return
+TICKET_GRACE_WINDOWS = 5
+TICKET_GRACE_SECONDS = 30
+
+
+def start_limit(quiz):
+    """New attempts admitted per window for this quiz (Quiz.starts_per_window overrides the setting)."""
+    return quiz.starts_per_window or getattr(settings, "EXAM_STARTS_PER_WINDOW", 25)
+
+
+def start_window():
+    return float(getattr(settings, "EXAM_START_WINDOW_SECONDS", 1.0))
+
+
+class Admission:
+    def __init__(self, admitted, retry_after=0, position=0):
+        self.admitted = admitted
+        self.retry_after = retry_after  # seconds the client should wait before retrying
+        self.position = position  # students ahead of this one
+
+
+class AdmissionController:
+    """
+    Smooths the start-time storm for one quiz.
+
+    A rate limit, not a cap on students writing at once: every student who needs a new
+    attempt gets a ticket for a time window, and each window admits at most `limit` starts
+    (students already writing don't count). Windows are filled in arrival order, so students are
+    admitted first-come first-served. The ticket lives in the session, so refreshing the
+    waiting room never loses a place. The attempt timer only starts once the student is
+    admitted, so waiting costs no exam time.
+
+    State is kept in Django's cache, which must be shared by every web process (Redis,
+    Memcached or the database cache). With the default per-process LocMemCache each process
+    keeps its own windows and queue, so the site admits `limit` starts per window per process.
+    """
+
+    def __init__(self, quiz):
+        self.quiz = quiz
+        self.limit = start_limit(quiz)
+        self.window = start_window()
+        self.prefix = f"exam_admission:{quiz.pk}"
+        self.session_key = f"exam_ticket_{quiz.pk}"
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def _incr(self, name, delta=1):
+        key = self._key(name)
+        cache.add(key, 0, STATE_TIMEOUT)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:  # expired between add and incr
+            cache.set(key, delta, STATE_TIMEOUT)
+            return delta
+
+    def held_ticket(self, request):
+        """The session's ticket for this quiz, or None (a stale ticket is discarded)."""
+        ticket = request.session.get(self.session_key)
+        if ticket is None:
+            return None
+        grace = max(TICKET_GRACE_WINDOWS * self.window, TICKET_GRACE_SECONDS)
+        if time.time() > ticket["window"] * self.window + grace:
+            del request.session[self.session_key]
+            if ticket.get("queued"):
+                self._incr("queued", -1)
+            return None
+        return ticket
+
+    def _issue_ticket(self, now):
+        # start at the current window (or the last known full one) and take the first free slot
+        window_no = max(math.floor(now / self.window), cache.get(self._key("frontier"), 0))
+        while True:
+            taken = self._incr(f"w{window_no}")
+            if taken <= self.limit:
+                break
+            cache.set(self._key("frontier"), window_no + 1, STATE_TIMEOUT)
+            window_no += 1
+        waiting = window_no * self.window > now
+        if waiting:
+            self._incr("queued")
+        return {"window": window_no, "issued": now, "queued": waiting}
+
+    def admit(self, request):
+        """Return an Admission for this request; issue a ticket on the first call."""
+        now = time.time()
+        ticket = self.held_ticket(request)
+        if ticket is None:
+            ticket = self._issue_ticket(now)
+            request.session[self.session_key] = ticket
+
+        admit_at = ticket["window"] * self.window
+        if now < admit_at:
+            ahead = max(0, math.floor((admit_at - now) / self.window)) * self.limit
+            return Admission(False, retry_after=max(1, math.ceil(admit_at - now)), position=ahead)
+
+        # admitted: record metrics once and drop the ticket
+        del request.session[self.session_key]
+        if ticket.get("queued"):
+            self._incr("queued", -1)
+        self._incr("admitted")
+        latency_ms = int((now - ticket["issued"]) * 1000)
+        self._incr("latency_ms_total", latency_ms)
+        if latency_ms > cache.get(self._key("latency_ms_max"), 0):
+            cache.set(self._key("latency_ms_max"), latency_ms, STATE_TIMEOUT)
+        return Admission(True)
+
+    def metrics(self):
+        admitted = cache.get(self._key("admitted"), 0)
+        total_ms = cache.get(self._key("latency_ms_total"), 0)
+        return {
+            "quiz_id": self.quiz.pk,
+            "limit_per_window": self.limit,
+            "window_seconds": self.window,
+            "queue_depth": max(0, cache.get(self._key("queued"), 0)),
+            "admitted": admitted,
+            "avg_admission_latency_ms": round(total_ms / admitted, 1) if admitted else 0.0,
+            "max_admission_latency_ms": cache.get(self._key("latency_ms_max"), 0),
+        }
@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Quiz, Question, Choice
+
+
+class QuestionKey:
+    """Compiled grading data for one question."""
+
+    __slots__ = ("id", "marks", "question_type", "choice_ids", "correct_ids", "correct_text")
+
+    def __init__(self, id, marks, question_type):
+        self.id = id
+        self.marks = marks
+        self.question_type = question_type
+        self.choice_ids = set()
+        self.correct_ids = set()
+        self.correct_text = ""
+
+    @property
+    def is_objective(self):
+        return self.question_type == "objective"
+
+    def is_correct(self, choice_id):
+        return choice_id is not None and choice_id in self.correct_ids
+
+    def score(self, choice_id):
+        """Marks earned by selecting choice_id (objective questions only)."""
+        return float(self.marks) if self.is_correct(choice_id) else 0.0
+
+
+class AnswerKey:
+    """question id -> QuestionKey for one quiz at one content version."""
+
+    def __init__(self, quiz_id, version, questions):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.questions = questions
+
+    def get(self, question_id):
+        try:
+            return self.questions.get(int(question_id))
+        except (TypeError, ValueError):
+            return None
+
+    def __contains__(self, question_id):
+        return self.get(question_id) is not None
+
+    def __iter__(self):
+        return iter(self.questions.values())
+
+    @property
+    def objective_ids(self):
+        return [q.id for q in self.questions.values() if q.is_objective]
+
+    @property
+    def total_marks(self):
+        return sum(q.marks for q in self.questions.values())
+
+
+def build_answer_key(quiz_id, version):
+    """Compile the answer key for a quiz (2 queries)."""
+    questions = {
+        qid: QuestionKey(qid, marks, qtype)
+        for qid, marks, qtype in Question.objects.filter(quiz_id=quiz_id).values_list("id", "marks", "question_type")
+    }
+    correct_texts = {}
+    choices = (
+        Choice.objects.filter(question__quiz_id=quiz_id)
+        .order_by("id")
+        .values_list("id", "question_id", "text", "is_correct")
+    )
+    for cid, qid, text, is_correct in choices:
+        qkey = questions.get(qid)
+        if qkey is None:
+            continue
+        qkey.choice_ids.add(cid)
+        if is_correct:
+            qkey.correct_ids.add(cid)
+            correct_texts.setdefault(qid, []).append(text)
+    for qid, texts in correct_texts.items():
+        questions[qid].correct_text = ", ".join(texts)
+    return AnswerKey(quiz_id, version, questions)
+
+
+# ---- process-local LRU of compiled keys ----
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_size():
+    return getattr(settings, "ANSWER_KEY_CACHE_SIZE", 256)
+
+
+def get_answer_key(quiz):
+    """
+    Return the compiled AnswerKey for a Quiz instance.
+    Entries are keyed by quiz.content_version, so a key built before an edit
+    (in this or any other worker) is never served after the version is bumped.
+    """
+    with _lock:
+        key = _cache.get(quiz.pk)
+        if key is not None and key.version == quiz.content_version:
+            _cache.move_to_end(quiz.pk)
+            return key
+
+    key = build_answer_key(quiz.pk, quiz.content_version)
+    with _lock:
+        _cache[quiz.pk] = key
+        _cache.move_to_end(quiz.pk)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return key
+
+
+def invalidate_answer_key(quiz):
+    """Call after a quiz's questions/choices change. Accepts a Quiz or quiz id."""
+    if not isinstance(quiz, Quiz):
+        quiz = Quiz.objects.get(pk=quiz)
+    quiz.bump_content_version()
+    with _lock:
+        _cache.pop(quiz.pk, None)
+
+
+def clear_answer_key_cache():
+    with _lock:
+        _cache.clear()
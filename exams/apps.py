@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exams'
+
+    def ready(self):
+        from . import changes, events, inbox
+        changes.connect_signals()
+        events.connect_signals()
+        inbox.connect_signals()
@@ -0,0 +1,215 @@
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, OperationalError, close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActionLog
+from .changes import bump, LOGS
+
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sample_rate(action_type):
+    """Fraction of events kept for this action type (AUDIT_LOG_SAMPLE_RATES, default 1.0 = keep all)."""
+    return float(_setting("AUDIT_LOG_SAMPLE_RATES", {}).get(action_type, 1.0))
+
+
+class AuditLogWriter:
+    """
+    Write-behind ActionLog writer.
+
+    Events are queued in memory and written with bulk_create by a daemon thread once
+    AUDIT_LOG_BATCH_SIZE events are waiting or AUDIT_LOG_FLUSH_SECONDS have passed,
+    and once more when the process exits. If the database is busy (OperationalError,
+    e.g. SQLite "database is locked") the batch is appended to a JSON-lines spill file
+    and replayed after the next successful flush, so events are delayed, not lost.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, spill_path=None, max_queue=None):
+        self.batch_size = batch_size or _setting("AUDIT_LOG_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval or _setting("AUDIT_LOG_FLUSH_SECONDS", 2.0)
+        self.spill_path = spill_path or _setting(
+            "AUDIT_LOG_SPILL_FILE", os.path.join(settings.BASE_DIR, "audit_spill.jsonl")
+        )
+        self.max_queue = max_queue or _setting("AUDIT_LOG_MAX_QUEUE", 10000)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # ---- producer side ----
+    def enqueue(self, event):
+        with self._lock:
+            self._queue.append(event)
+            size = len(self._queue)
+        self._ensure_thread()
+        if size >= self.max_queue:
+            # flusher can't keep up: push this batch out from the request thread
+            self.flush()
+        elif size >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _ensure_thread(self):
+        # (re)start after fork: threads don't survive into forked worker processes
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed")
+            finally:
+                close_old_connections()
+
+    # ---- consumer side ----
+    def _take(self):
+        with self._lock:
+            batch = list(self._queue)
+            self._queue.clear()
+        return batch
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of events written to the database."""
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                written = self._write(batch)
+            except OperationalError:
+                logger.warning("Database busy, spilling %d audit event(s) to %s", len(batch), self.spill_path)
+                self._spill(batch)
+                return 0
+            self._replay_spill()
+            return written
+
+    def _write(self, events):
+        rows = [ActionLog(**_row_fields(e)) for e in events]
+        try:
+            ActionLog.objects.bulk_create(rows, batch_size=500)
+            bump(LOGS)  # bulk_create sends no signals
+            return len(rows)
+        except (IntegrityError, DataError):
+            # e.g. the user was deleted before the flush; keep the rest of the batch
+            written = 0
+            for row in rows:
+                try:
+                    row.save(force_insert=True)
+                    written += 1
+                except (IntegrityError, DataError):
+                    logger.warning("Dropping invalid audit event %s for user %s", row.action_type, row.user_id)
+            return written
+
+    def _spill(self, events):
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as fh:
+                fh.write("".join(json.dumps(e, default=str) + "\n" for e in events))
+        except OSError:
+            logger.exception("Could not write audit spill file, %d event(s) lost", len(events))
+
+    def _replay_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        # claim the file first so two processes never replay the same events
+        claimed = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, claimed)
+        except OSError:
+            return
+        with open(claimed, encoding="utf-8") as fh:
+            events = [json.loads(line) for line in fh if line.strip()]
+        try:
+            self._write(events)
+        except OperationalError:
+            self._spill(events)
+        except DatabaseError:
+            logger.exception("Could not replay audit spill file, keeping it at %s", claimed)
+            return
+        os.remove(claimed)
+
+
+def _row_fields(event):
+    fields = dict(event)
+    created_at = fields.get("created_at")
+    if isinstance(created_at, str):
+        fields["created_at"] = parse_datetime(created_at)
+    return fields
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter()
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def flush_audit_log():
+    """Write all queued audit events now (tests, management commands, shutdown hooks)."""
+    if _writer is not None:
+        return _writer.flush()
+    return 0
+
+
+def record(user, action_type, description="", model_name=None, object_id=None, details=None):
+    """
+    Record an audit event. With AUDIT_LOG_WRITE_BEHIND the row is queued and written in
+    batches; otherwise it is written immediately. Action types listed in
+    AUDIT_LOG_SAMPLE_RATES are only kept for that fraction of calls. Events without a
+    user (anonymous requests) are kept with user None.
+    """
+    user_id = getattr(user, "pk", user)
+    rate = sample_rate(action_type)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        details = dict(details or {}, sample_rate=rate)
+
+    event = {
+        "user_id": user_id,
+        "action_type": action_type,
+        "description": description or "",
+        "model_name": model_name,
+        "object_id": str(object_id) if object_id is not None else None,
+        "details": details,
+        "created_at": timezone.now(),
+    }
+    if not _setting("AUDIT_LOG_WRITE_BEHIND", True):
+        ActionLog.objects.create(**event)
+        return
+    get_writer().enqueue(event)
@@ -0,0 +1,150 @@
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Greatest
+
+from .models import Answer, StudentQuizAttempt
+from .answer_key import get_answer_key
+
+
+# max entries accepted in one autosave batch
+MAX_BATCH_SIZE = 500
+
+
+def _parse_seq(value):
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+
+def apply_answer_batch(attempt, items):
+    """
+    Validate and upsert many autosaved answers for one attempt.
+
+    items: list of {question_id, answer, client_seq}
+    Returns a list of per-item acks: {question_id, client_seq, status[, error]}
+    where status is "saved", "stale" (an equal or newer save already applied) or "rejected".
+
+    All questions/choices are validated against the attempt's quiz answer key in one
+    pass and every write happens inside a single transaction.
+    """
+    key = get_answer_key(attempt.quiz)
+
+    acks = [None] * len(items)
+    latest = {}  # question_id -> (index, seq, question, choice_id, text)
+
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            acks[idx] = {"question_id": None, "client_seq": None, "status": "rejected", "error": "invalid entry"}
+            continue
+
+        raw_qid = item.get("question_id")
+        seq = _parse_seq(item.get("client_seq"))
+        ack = {"question_id": raw_qid, "client_seq": item.get("client_seq")}
+        acks[idx] = ack
+
+        question = key.get(raw_qid)
+        if question is None:
+            ack.update(status="rejected", error="question not in this exam")
+            continue
+        if seq is None:
+            ack.update(status="rejected", error="client_seq required")
+            continue
+
+        answer = item.get("answer", None)
+        choice_id, text = None, None
+        if question.is_objective:
+            # unknown / empty choice clears the selection, same as the single autosave
+            try:
+                cid = int(answer)
+            except (TypeError, ValueError):
+                cid = None
+            if cid in question.choice_ids:
+                choice_id = cid
+        else:
+            text = str(answer or "")
+
+        # several saves for the same question in one batch: keep only the newest
+        prev = latest.get(question.id)
+        if prev is not None:
+            if seq <= prev[1]:
+                ack["status"] = "stale"
+                continue
+            acks[prev[0]]["status"] = "stale"
+        ack["status"] = "saved"
+        latest[question.id] = (idx, seq, question, choice_id, text)
+
+    if not latest:
+        return acks
+
+    with transaction.atomic():
+        existing = {
+            a.question_id: a
+            for a in Answer.objects.select_for_update().filter(attempt=attempt, question_id__in=list(latest))
+        }
+        to_create, to_update = [], []
+        for qid, (idx, seq, question, choice_id, text) in latest.items():
+            ans = existing.get(qid)
+            if ans is not None and seq <= ans.client_seq:
+                # out-of-order save arrived after a newer one, drop it
+                acks[idx]["status"] = "stale"
+                continue
+
+            if question.is_objective:
+                fields = {
+                    "selected_choice_id": choice_id,
+                    "text_answer": None,
+                    "score": question.score(choice_id),
+                    "is_pending": False,
+                }
+            else:
+                fields = {
+                    "selected_choice_id": None,
+                    "text_answer": text,
+                    "score": 0.0,
+                    "is_pending": True,
+                }
+
+            if ans is None:
+                to_create.append(Answer(attempt=attempt, question_id=qid, client_seq=seq, **fields))
+            else:
+                for name, value in fields.items():
+                    setattr(ans, name, value)
+                ans.client_seq = seq
+                to_update.append(ans)
+
+        if to_create:
+            Answer.objects.bulk_create(to_create)
+        if to_update:
+            Answer.objects.bulk_update(
+                to_update, ["selected_choice", "text_answer", "score", "is_pending", "client_seq"]
+            )
+
+    return acks
+
+
+def merge_answer_journal(attempt, entries):
+    """
+    Merge the client's answer-journal tail: [{seq, question_id, answer}, ...].
+
+    Each entry goes through apply_answer_batch, so merging is idempotent per
+    (attempt, question, seq) and a replayed or late entry never overwrites a newer one.
+    Returns (applied_seq, acks). applied_seq is the attempt's high-water mark, the highest
+    seq merged so far (a replayed old tail never moves it back); rejected entries can never
+    succeed, so they are acknowledged as well. It is kept in journal_seq so a reloaded page
+    continues above it.
+    """
+    items = [
+        {"question_id": e.get("question_id"), "answer": e.get("answer"), "client_seq": e.get("seq")}
+        if isinstance(e, dict) else e
+        for e in entries
+    ]
+    acks = apply_answer_batch(attempt, items) if items else []
+
+    seqs = [_parse_seq(i.get("client_seq")) for i in items if isinstance(i, dict)]
+    tail_seq = max((s for s in seqs if s is not None), default=0)
+    if tail_seq > attempt.journal_seq:
+        StudentQuizAttempt.objects.filter(pk=attempt.pk).update(journal_seq=Greatest("journal_seq", Value(tail_seq)))
+        attempt.journal_seq = tail_seq
+    return attempt.journal_seq, acks
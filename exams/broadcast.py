@@ -0,0 +1,33 @@
+"""
+Broadcasts.
+
+post_broadcast() announces a message to an audience (a role and/or a class) with a
+single BroadcastMessage row, merged into each member's notifications when they read
+them (see exams.inbox), so a school-wide announcement costs one row and one audit
+entry however many users it reaches. Every broadcast form uses it.
+"""
+from users.models import BroadcastMessage
+
+from .utils import log_action
+from . import events
+
+
+def post_broadcast(sender, message, role="", school_class=None, action_type="Broadcast"):
+    """
+    Announce message to every approved user with role (blank: any) in school_class (None:
+    any): one row, one push event. Returns the BroadcastMessage.
+    """
+    broadcast = BroadcastMessage.objects.create(sender=sender, message=message, role=role or "", school_class=school_class)
+    events.publish_audience(role or None, getattr(school_class, "pk", None), "broadcast", {
+        "id": broadcast.id,
+        "message": message,
+        "sender": sender.username,
+    })
+    log_action(
+        user=sender,
+        action_type=action_type,
+        model_name="BroadcastMessage",
+        object_id=str(broadcast.id),
+        details={"audience": broadcast.audience_display(), "message": message[:200]},
+    )
+    return broadcast
@@ -0,0 +1,133 @@
+"""
+Bulk exam import: a ZIP of exam workbooks (the active sheet of each), or one workbook with
+an exam on every sheet, all in the download_excel_template format (see exams.quiz_import).
+
+Sheets are parsed and validated in parallel (see exams.import_pool), class and subject
+names are resolved against one Catalog loaded for the whole import, and each valid exam is
+saved in its own transaction together with its QuizImportRecord. An invalid sheet fails
+on its own; the others are still imported. The records, keyed by the importing user and
+a hash of each sheet's contents, make imports resumable: running an import again (say
+after it was interrupted, or after fixing the sheets that failed) skips every sheet that
+user already imported and retries the rest.
+
+Uploads are checked before anything is decompressed: at most MAX_ARCHIVE_MEMBERS files
+and MAX_ARCHIVE_BYTES uncompressed in all.
+"""
+import os
+import zipfile
+from io import BytesIO
+
+from django.db import transaction
+
+from .models import QuizImportRecord
+from . import import_pool, quiz_import
+
+
+WORKBOOK_SUFFIXES = (".xlsx", ".xlsm")
+MAX_ARCHIVE_MEMBERS = 500
+MAX_ARCHIVE_BYTES = 200 * 1024 * 1024
+
+
+class ImportSource:
+    """One exam to import: the workbook's bytes and the sheet holding it (None: the active sheet)."""
+
+    def __init__(self, name, data, sheet_name=None):
+        self.name = name
+        self.data = data
+        self.sheet_name = sheet_name
+
+
+def _is_workbook(archive):
+    return "[Content_Types].xml" in archive.namelist()
+
+
+def sources(data, name):
+    """The exams in an uploaded file: every workbook of a ZIP, or every sheet of a workbook."""
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ValueError(f"{name} is neither a ZIP archive nor an Excel workbook")
+
+    with archive:
+        members = archive.infolist()
+        if len(members) > MAX_ARCHIVE_MEMBERS:
+            raise ValueError(f"{name} holds {len(members)} files; at most {MAX_ARCHIVE_MEMBERS} can be imported at once")
+        if sum(member.file_size for member in members) > MAX_ARCHIVE_BYTES:
+            raise ValueError(f"{name} is larger than {MAX_ARCHIVE_BYTES // (1024 * 1024)} MB uncompressed")
+
+        if _is_workbook(archive):  # an .xlsx is itself a zip
+            try:
+                wb = quiz_import.open_workbook(BytesIO(data))
+            except Exception as exc:
+                raise ValueError(f"{name} could not be read as an Excel workbook: {exc}")
+            try:
+                sheet_names = wb.sheetnames
+            finally:
+                wb.close()
+            if len(sheet_names) == 1:
+                return [ImportSource(name, data)]
+            return [ImportSource(f"{name} [{sheet}]", data, sheet) for sheet in sheet_names]
+
+        found = []
+        for member in sorted(archive.namelist()):
+            base = os.path.basename(member)
+            if (
+                member.endswith("/") or member.startswith("__MACOSX/") or base.startswith(("~$", "."))
+                or not base.lower().endswith(WORKBOOK_SUFFIXES)
+            ):
+                continue  # folders, editor lock files and anything that isn't a workbook
+            found.append(ImportSource(member, archive.read(member)))
+        return found
+
+
+def _result(source, status, parsed, quiz_id=None):
+    return {
+        "source": source.name,
+        "status": status,
+        "quiz_id": quiz_id,
+        "title": parsed.meta.get("title", ""),
+        "questions": len(parsed.questions),
+        **parsed.report(),
+    }
+
+
+def import_sources(items, user, workers=None):
+    """
+    Import each source's exam; returns one result per source, in order:
+      {"source", "status": "imported" | "skipped" | "failed", "quiz_id", "title", "questions", "errors", "truncated"}
+    skipped is a sheet user imported before (its exam still exists), failed lists the sheet's problems.
+    """
+    workers = import_pool.workers(workers)
+    catalog = quiz_import.Catalog()
+    results = []
+    parsed_items = import_pool.parse_all([(item.data, item.sheet_name) for item in items], workers)
+    for item, (digest, parsed) in zip(items, parsed_items):
+        done = QuizImportRecord.objects.filter(
+            imported_by=user, digest=digest, status="imported", quiz__isnull=False,
+        ).first()
+        if done is not None:
+            results.append(_result(item, "skipped", parsed, done.quiz_id))
+            continue
+
+        school_class, subject = catalog.resolve(parsed)
+        if not parsed.ok:
+            QuizImportRecord.objects.update_or_create(imported_by=user, digest=digest, defaults={
+                "source": item.name[:255], "status": "failed", "quiz": None, "errors": parsed.errors,
+            })
+            results.append(_result(item, "failed", parsed))
+            continue
+
+        with transaction.atomic():  # the exam and its record, or neither
+            quiz = quiz_import.save_quiz(parsed, school_class, subject, user)
+            QuizImportRecord.objects.update_or_create(imported_by=user, digest=digest, defaults={
+                "source": item.name[:255], "status": "imported", "quiz": quiz, "errors": [],
+            })
+        results.append(_result(item, "imported", parsed, quiz.id))
+    return results
+
+
+def summarize(results):
+    counts = {"imported": 0, "skipped": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return counts
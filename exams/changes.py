@@ -0,0 +1,197 @@
+"""
+Change tracking for the polled dashboard endpoints.
+
+Every kind of data a dashboard shows belongs to a scope ("users", "student:<user id>",
+"notifications:<user id>", ...) with a version number in ChangeCounter. Attempts are
+tracked per student, so starts and submissions during an exam each touch their own
+student's row rather than one shared counter. Versions are
+bumped after commit by model signals and, for bulk writes that skip signals, by an
+explicit bump(). A dashboard endpoint is a list of Sections, each depending on some
+scopes; section_response() answers 304 when nothing the client has seen changed, or
+returns only the changed sections plus a new cursor.
+"""
+import hashlib
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.http import JsonResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+
+from .models import (
+    ChangeCounter, Class, Subject, Quiz, Question, Choice, StudentQuizAttempt,
+    ActionLog, RetakeRequest, StudentDashboardSummary,
+)
+
+
+USERS = "users"
+CATALOG = "catalog"  # classes and subjects
+QUIZZES = "quizzes"
+RETAKES = "retakes"
+LOGS = "logs"
+LEADERBOARD = "leaderboard"
+BROADCASTS = "broadcasts"  # BroadcastMessages, shown in every audience member's notifications
+
+
+def notifications_scope(user_id):
+    return f"notifications:{user_id}"
+
+
+def sent_scope(user_id):
+    return f"sent:{user_id}"
+
+
+def student_scope(user_id):
+    """A student's attempts and dashboard summary."""
+    return f"student:{user_id}"
+
+
+def student_scopes(user_ids):
+    return [student_scope(user_id) for user_id in sorted(set(user_ids))]
+
+
+def _increment(scopes):
+    scopes = set(scopes)
+    updated = set(
+        ChangeCounter.objects.filter(scope__in=scopes).values_list("scope", flat=True)
+    )
+    if updated:
+        ChangeCounter.objects.filter(scope__in=updated).update(version=F("version") + 1)
+    missing = scopes - updated
+    if missing:
+        # a concurrent first bump may win the insert; either way the scope now has a version
+        ChangeCounter.objects.bulk_create(
+            [ChangeCounter(scope=s, version=1) for s in missing], ignore_conflicts=True
+        )
+
+
+def bump(*scopes):
+    """Mark scopes as changed once the current transaction commits (immediately in autocommit)."""
+    scopes = [s for s in scopes if s]
+    if scopes:
+        transaction.on_commit(lambda: _increment(scopes))
+
+
+def current_versions(scopes):
+    versions = dict.fromkeys(scopes, 0)
+    versions.update(ChangeCounter.objects.filter(scope__in=list(scopes)).values_list("scope", "version"))
+    return versions
+
+
+# ---- signal handlers: every save/delete of a tracked model bumps its scopes ----
+def _scopes_for(sender, instance):
+    if sender is get_user_model():
+        return [USERS]
+    if sender in (Class, Subject):
+        return [CATALOG]
+    if sender in (Quiz, Question, Choice):
+        return [QUIZZES]
+    if sender is StudentQuizAttempt:
+        return [student_scope(instance.student_id)]
+    if sender is RetakeRequest:
+        return [RETAKES]
+    if sender is ActionLog:
+        return [LOGS]
+    if sender is StudentDashboardSummary:
+        return [student_scope(instance.student_id)]
+    if sender._meta.label == "users.Notification":
+        return [notifications_scope(instance.recipient_id), sent_scope(instance.sender_id)]
+    if sender._meta.label == "users.BroadcastMessage":
+        return [BROADCASTS, sent_scope(instance.sender_id)]
+    if sender._meta.label == "users.BroadcastReceipt":
+        return [notifications_scope(instance.user_id)]
+    return []
+
+
+def _on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return  # every login saves the user; nothing a dashboard shows
+    bump(*_scopes_for(sender, instance))
+
+
+def _on_delete(sender, instance, **kwargs):
+    bump(*_scopes_for(sender, instance))
+
+
+def connect_signals():
+    from users.models import Notification, BroadcastMessage, BroadcastReceipt
+
+    for model in (
+        get_user_model(), Class, Subject, Quiz, Question, Choice, StudentQuizAttempt,
+        RetakeRequest, ActionLog, StudentDashboardSummary, Notification, BroadcastMessage, BroadcastReceipt,
+    ):
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"changes_save_{model._meta.label}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"changes_delete_{model._meta.label}")
+
+
+# ---- conditional / delta responses ----
+class Section:
+    """
+    One independently refreshable part of a dashboard payload.
+    build() returns the top-level keys it contributes; params are the query parameters
+    it depends on; max_age makes time-dependent sections (e.g. "not yet ended") refresh
+    at least that often even without writes.
+    """
+
+    def __init__(self, name, scopes, build, params=(), max_age=None):
+        self.name = name
+        self.scopes = list(scopes)
+        self.build = build
+        self.params = params
+        self.max_age = max_age
+
+    def token(self, request, versions):
+        parts = [self.name]
+        parts += [f"{s}={versions.get(s, 0)}" for s in self.scopes]
+        parts += [f"{p}={request.GET.get(p, '')}" for p in self.params]
+        if self.max_age:
+            parts.append(str(int(time.time() // self.max_age)))
+        return hashlib.md5("|".join(parts).encode()).hexdigest()[:12]
+
+
+def _parse_cursor(value):
+    known = {}
+    for part in (value or "").split(","):
+        name, _, token = part.partition(":")
+        if name and token:
+            known[name] = token
+    return known
+
+
+def _merge(data, part):
+    for key, value in part.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            data[key].update(value)
+        else:
+            data[key] = value
+
+
+def section_response(request, sections):
+    """
+    Build a dashboard response from sections.
+    - If-None-Match matching the current ETag, or a ?cursor= with nothing changed -> 304
+    - ?cursor= from an earlier response -> only the changed sections
+    - otherwise -> every section
+    The payload carries "cursor" (send it back on the next poll) and "changed" (section names).
+    """
+    versions = current_versions({s for section in sections for s in section.scopes})
+    tokens = {section.name: section.token(request, versions) for section in sections}
+    cursor = ",".join(f"{name}:{token}" for name, token in tokens.items())
+    etag = '"%s"' % hashlib.md5(f"{request.user.pk}|{cursor}".encode()).hexdigest()
+
+    known = _parse_cursor(request.GET.get("cursor"))
+    changed = [s for s in sections if known.get(s.name) != tokens[s.name]]
+    if request.headers.get("If-None-Match") == etag or (known and not changed):
+        response = HttpResponseNotModified()
+    else:
+        data = {}
+        for section in changed:
+            _merge(data, section.build())
+        data["cursor"] = cursor
+        data["changed"] = [s.name for s in changed]
+        response = JsonResponse(data)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,72 @@
+"""
+Report charts, drawn with matplotlib's object-oriented Figure/FigureCanvasAgg API (no
+pyplot global state, so safe under threaded workers) and memoized: a process-local LRU
+keyed by a hash of the chart's data and dimensions hands back the PNG of a chart
+already drawn, whichever request or student it was drawn for.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_size():
+    return getattr(settings, "CHART_CACHE_SIZE", 256)
+
+
+def clear_chart_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _chart_key(*parts):
+    raw = json.dumps(parts, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _draw_bar_chart(labels, values, title, figsize, color, xlabel, ylabel, rotation):
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot(111)
+    if color:
+        ax.bar(labels, values, color=color)
+    else:
+        ax.bar(labels, values)
+    ax.set_title(title)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    ax.tick_params(axis='x', rotation=rotation)
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    FigureCanvasAgg(fig).print_png(buffer)
+    return buffer.getvalue()
+
+
+def bar_chart(labels, values, title, figsize=(5, 2), color=None, xlabel=None, ylabel=None, rotation=45):
+    """PNG bytes of a bar chart, drawn once per distinct data and dimensions."""
+    labels, values = list(labels), [float(v or 0.0) for v in values]
+    key = _chart_key("bar", labels, values, title, figsize, color, xlabel, ylabel, rotation)
+    with _lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            return png
+
+    png = _draw_bar_chart(labels, values, title, figsize, color, xlabel, ylabel, rotation)
+    with _lock:
+        _cache[key] = png
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return png
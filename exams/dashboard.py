@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Answer, StudentQuizAttempt, StudentDashboardSummary
+from .answer_key import get_answer_key
+
+
+def _date(value):
+    return value.date().isoformat() if value else None
+
+
+def _attempt_row(attempt, answers):
+    """Past-attempt row as served by student_dashboard_data, plus the fields used to sort/filter it."""
+    key = get_answer_key(attempt.quiz)
+    total_score = 0.0
+    total_qmarks = 0.0
+    obtained = 0.0
+    pending = 0
+    wrong_review = []
+    for ans in answers:
+        total_score += float(ans.score or 0.0)
+        total_qmarks += ans.question.marks or 0
+        if ans.is_pending:
+            pending += 1
+        else:
+            obtained += float(ans.score or 0.0)
+        qkey = key.get(ans.question_id)
+        if qkey and qkey.is_objective and not qkey.is_correct(ans.selected_choice_id):
+            wrong_review.append({
+                "question": ans.question.text,
+                "your_answer": ans.selected_choice.text if ans.selected_choice else "-",
+                "correct_answer": qkey.correct_text,
+            })
+
+    quiz = attempt.quiz
+    return {
+        "attempt_id": attempt.id,
+        "quiz_id": quiz.id,
+        "quiz": quiz.title,
+        "subject": quiz.subject.name,
+        "total_score": total_score,
+        "obtained": obtained,
+        "total_qmarks": total_qmarks,
+        "pending_subjectives": pending,
+        "is_submitted": True,
+        "started_at": _date(attempt.started_at),
+        "submitted_at": _date(attempt.submitted_at),
+        "wrong_answer": wrong_review,
+        "retake_count": attempt.retake_count,
+        # not sent to the client
+        "sort_key": attempt.started_at.isoformat() if attempt.started_at else "",
+        "listed": not attempt.retake_requested,
+        "class_id": quiz.school_class_id,
+        "has_answers": bool(answers),
+    }
+
+
+PRIVATE_FIELDS = ("sort_key", "listed", "class_id", "has_answers")
+
+
+def public_row(row):
+    return {k: v for k, v in row.items() if k not in PRIVATE_FIELDS}
+
+
+def refresh_student_summary(student_id, attempt_ids=None):
+    """
+    Recompute the dashboard summary for one student and return it.
+    With attempt_ids only those attempts' rows are rebuilt, and rows of attempts that are
+    no longer submitted (deleted, say with their exam, or reopened for a retake) are
+    dropped; the counters are always recounted. Fixed number of queries whatever the
+    number of attempts.
+    """
+    with transaction.atomic():
+        StudentDashboardSummary.objects.get_or_create(student_id=student_id)
+        summary = StudentDashboardSummary.objects.select_for_update().get(pk=student_id)
+
+        attempts_qs = StudentQuizAttempt.objects.filter(student_id=student_id, is_submitted=True)
+        rows = {}
+        if attempt_ids is not None:
+            attempt_ids = [int(i) for i in attempt_ids]
+            submitted = set(attempts_qs.values_list("id", flat=True))
+            rows = {k: v for k, v in summary.attempts.items() if int(k) in submitted and int(k) not in attempt_ids}
+            attempts_qs = attempts_qs.filter(id__in=attempt_ids)
+        attempts = list(attempts_qs.select_related("quiz", "quiz__subject"))
+
+        answers = {a.id: [] for a in attempts}
+        for ans in (
+            Answer.objects.filter(attempt__in=attempts)
+            .select_related("question", "selected_choice")
+            .order_by("id")
+        ):
+            answers[ans.attempt_id].append(ans)
+        for attempt in attempts:
+            rows[str(attempt.id)] = _attempt_row(attempt, answers[attempt.id])
+
+        counts = Answer.objects.filter(attempt__student_id=student_id).aggregate(
+            graded=Count("id", filter=Q(is_pending=False)),
+            pending=Count("id", filter=Q(is_pending=True)),
+        )
+        summary.total_attempts = StudentQuizAttempt.objects.filter(student_id=student_id).count()
+        summary.auto_graded_count = counts["graded"]
+        summary.pending_subjectives = counts["pending"]
+        summary.attempts = rows
+        summary.save()
+    return summary
+
+
+def refresh_summaries_for_attempts(attempts):
+    """Refresh the rows of these attempts on their students' summaries (one refresh per student)."""
+    by_student = {}
+    for attempt in attempts:
+        by_student.setdefault(attempt.student_id, []).append(attempt.id)
+    for student_id, attempt_ids in by_student.items():
+        refresh_student_summary(student_id, attempt_ids)
+
+
+def attempt_students(**filters):
+    """Ids of the students with attempts matching filters (collect them before deleting the attempts)."""
+    return set(StudentQuizAttempt.objects.filter(**filters).values_list("student_id", flat=True))
+
+
+def refresh_students(student_ids):
+    """Rebuild these students' summaries in full (students without one yet build it on first use)."""
+    for student_id in StudentDashboardSummary.objects.filter(pk__in=student_ids).values_list("pk", flat=True):
+        refresh_student_summary(student_id)
+
+
+def note_attempt_started(student_id):
+    """A new attempt only changes the attempt count; bump it in place."""
+    StudentDashboardSummary.objects.filter(pk=student_id).update(total_attempts=F("total_attempts") + 1)
+
+
+def get_student_summary(student):
+    """The student's summary, built on first use."""
+    try:
+        return StudentDashboardSummary.objects.get(pk=student.pk)
+    except StudentDashboardSummary.DoesNotExist:
+        return refresh_student_summary(student.pk)
+
+
+def past_attempt_rows(summary):
+    """Rows for the past-attempts list: newest first, attempts with a pending retake request left out."""
+    rows = [r for r in summary.attempts.values() if r["listed"]]
+    rows.sort(key=lambda r: r["sort_key"], reverse=True)
+    return rows
+
+
+def subject_performance(summary, class_id):
+    """Per-attempt subject percentages for attempts in the student's class."""
+    chart = []
+    for row in sorted(summary.attempts.values(), key=lambda r: r["attempt_id"]):
+        if not row["has_answers"] or class_id is None or row["class_id"] != class_id:
+            continue
+        possible = row["total_qmarks"]
+        pct = round((row["total_score"] / possible) * 100, 2) if possible > 0 else 0.0
+        chart.append({"subject": row["subject"], "obtained": row["total_score"], "possible": possible, "percentage": pct})
+    return chart
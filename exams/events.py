@@ -0,0 +1,435 @@
+"""
+Push events for signed-in users: new notifications, grading results, retake decisions.
+
+publish() hands events to the configured backend once the current transaction commits.
+Every process has one Hub that fans events out to the streams open in that process;
+the backend decides how published events reach the hubs:
+
+  LocalBackend     straight into this process's hub (runserver, a single worker)
+  DatabaseBackend  a UserEvent row per channel; a relay thread in each process polls
+                   for new rows while it has open streams, so events cross workers
+
+Events go to channels: one per user ("user:<id>") and one per broadcast audience
+("audience:<role>:<class id>", "*" for any), so an announcement to every student is
+a single event however many students are listening.
+
+EVENTS_BACKEND picks one ("local", "database" or the dotted path of a class with the
+same methods). Streams resume from an event id (SSE Last-Event-ID / long-poll ?after=).
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import UserEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def audience_channel(role=None, class_id=None):
+    return f"audience:{role or '*'}:{class_id or '*'}"
+
+
+def channels_for(user):
+    """Every channel a user listens on: their own and each broadcast audience they belong to."""
+    roles = (getattr(user, "role", None) or "*", "*")
+    classes = (getattr(user, "student_class_id", None) or "*", "*")
+    return [user_channel(user.pk)] + sorted({audience_channel(r, c) for r in roles for c in classes})
+
+
+class Event:
+    __slots__ = ("id", "channel", "type", "data", "created_at")
+
+    def __init__(self, id, channel, type, data, created_at):
+        self.id = id
+        self.channel = channel
+        self.type = type
+        self.data = data
+        self.created_at = created_at
+
+    def as_dict(self):
+        return {"id": self.id, "type": self.type, "data": self.data, "created_at": self.created_at.isoformat()}
+
+    def sse(self):
+        return f"id: {self.id}\ndata: {json.dumps(self.as_dict(), default=str)}\n\n"
+
+
+class Subscription:
+    """
+    Events for one open stream. Filled from any thread by the hub; read either by
+    blocking (get, WSGI / long-poll) or by awaiting (aget, ASGI). Events come out in id
+    order and at most once, whatever order the backlog and live events arrived in.
+    """
+
+    def __init__(self, hub, channels, last_id):
+        self.hub = hub
+        self.channels = channels
+        self.last_id = last_id
+        self._events = deque()
+        self._cond = threading.Condition()
+        self._loop = None
+        self._ready = None
+
+    def push(self, events):
+        with self._cond:
+            self._events.extend(events)
+            self._cond.notify_all()
+            loop, ready = self._loop, self._ready
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass  # the stream's event loop is gone; close() will follow
+
+    def _drain(self):
+        with self._cond:
+            events = sorted(self._events, key=lambda e: e.id)
+            self._events.clear()
+        fresh = []
+        for event in events:
+            if event.id > self.last_id:
+                fresh.append(event)
+                self.last_id = event.id
+        return fresh
+
+    def get(self, timeout):
+        """Wait up to timeout seconds; returns the new events (possibly none)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._drain()
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            with self._cond:
+                if not self._events:
+                    self._cond.wait(remaining)
+
+    async def aget(self, timeout):
+        if self._loop is None:
+            ready = asyncio.Event()
+            with self._cond:
+                self._loop, self._ready = asyncio.get_running_loop(), ready
+        self._ready.clear()
+        events = self._drain()
+        if events:
+            return events
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """In-process fan-out: channel -> open subscriptions, plus a short history for resumes."""
+
+    def __init__(self, history=1000):
+        self._lock = threading.Lock()
+        self._subs = {}
+        self._recent = deque(maxlen=history)
+
+    def subscribe(self, channels, last_id):
+        sub = Subscription(self, list(channels), last_id)
+        with self._lock:
+            for channel in sub.channels:
+                self._subs.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subs.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[channel]
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subs)
+
+    def dispatch(self, events):
+        targets = {}
+        with self._lock:
+            self._recent.extend(events)
+            for event in events:
+                for sub in self._subs.get(event.channel, ()):
+                    targets.setdefault(sub, []).append(event)
+        for sub, sub_events in targets.items():
+            sub.push(sub_events)
+
+    def recent(self, channels, after_id):
+        channels = set(channels)
+        with self._lock:
+            return [e for e in self._recent if e.channel in channels and e.id > after_id]
+
+
+class LocalBackend:
+    """Events live only in this process. Ids are microsecond timestamps, so they keep increasing across restarts."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def _next_ids(self, count):
+        with self._lock:
+            first = max(self._last_id + 1, time.time_ns() // 1000)
+            self._last_id = first + count - 1
+        return range(first, first + count)
+
+    def publish(self, channels, event_type, data):
+        now = timezone.now()
+        ids = self._next_ids(len(channels))
+        self.hub.dispatch([Event(i, channel, event_type, data, now) for i, channel in zip(ids, channels)])
+
+    def last_id(self):
+        with self._lock:
+            return self._last_id
+
+    def backlog(self, channels, after_id):
+        return self.hub.recent(channels, after_id)
+
+    def start(self):
+        pass
+
+    def follow(self, after_id):
+        pass  # published events reach the hub directly
+
+
+class DatabaseBackend:
+    """
+    Events are UserEvent rows, so every worker (and every host sharing the database)
+    sees them. A daemon relay thread per process polls for rows newer than the last one
+    it dispatched, once per EVENTS_POLL_SECONDS and only while streams are open: one
+    small indexed query per process, however many streams it serves. Rows older than
+    EVENTS_RETENTION_SECONDS are pruned from time to time.
+    """
+
+    def __init__(self, hub, poll_interval=None, retention=None):
+        self.hub = hub
+        self.poll_interval = poll_interval or _setting("EVENTS_POLL_SECONDS", 1.0)
+        self.retention = retention or _setting("EVENTS_RETENTION_SECONDS", 3600)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._cursor = None
+        self._last_prune = 0.0
+
+    def publish(self, channels, event_type, data):
+        now = timezone.now()
+        UserEvent.objects.bulk_create([_row_for(channel, event_type, data, now) for channel in channels], batch_size=500)
+        if time.monotonic() - self._last_prune > 300:
+            self._last_prune = time.monotonic()
+            UserEvent.objects.filter(created_at__lt=now - timezone.timedelta(seconds=self.retention)).delete()
+
+    def last_id(self):
+        return UserEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+    def backlog(self, channels, after_id):
+        user_ids = [c.split(":", 1)[1] for c in channels if c.startswith("user:")]
+        groups = [c for c in channels if not c.startswith("user:")]
+        rows = UserEvent.objects.filter(Q(user_id__in=user_ids) | Q(group__in=groups), id__gt=after_id).order_by("id")[:200]
+        return [_event_from_row(r) for r in rows]
+
+    def start(self):
+        # (re)start after fork: threads don't survive into forked worker processes
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._cursor = None
+            self._thread = threading.Thread(target=self._run, name="events-relay", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.relay()
+            except DatabaseError:
+                logger.exception("Event relay query failed")
+            finally:
+                close_old_connections()
+
+    def follow(self, after_id):
+        """Relay every row after after_id: called as a stream subscribes, so nothing published meanwhile is lost."""
+        with self._lock:
+            if self._cursor is None or after_id < self._cursor:
+                self._cursor = after_id
+
+    def relay(self):
+        """Dispatch rows published since the last call to this process's hub."""
+        with self._lock:
+            if not self.hub.has_subscribers():
+                self._cursor = None  # the next stream to subscribe seeds it (see follow)
+                return 0
+            cursor = self._cursor
+        if cursor is None:
+            return 0
+        rows = list(UserEvent.objects.filter(id__gt=cursor).order_by("id")[:1000])
+        if rows:
+            with self._lock:
+                if self._cursor == cursor:  # not moved back by a stream subscribing meanwhile
+                    self._cursor = rows[-1].id
+            self.hub.dispatch([_event_from_row(r) for r in rows])
+        return len(rows)
+
+
+def _row_for(channel, event_type, data, created_at):
+    if channel.startswith("user:"):
+        return UserEvent(user_id=int(channel.split(":", 1)[1]), event_type=event_type, payload=data, created_at=created_at)
+    return UserEvent(group=channel, event_type=event_type, payload=data, created_at=created_at)
+
+
+def _event_from_row(row):
+    channel = user_channel(row.user_id) if row.user_id else row.group
+    return Event(row.id, channel, row.event_type, row.payload, row.created_at)
+
+
+BACKENDS = {"local": LocalBackend, "database": DatabaseBackend}
+
+hub = Hub()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = _setting("EVENTS_BACKEND", "local")
+                backend_class = BACKENDS.get(name) or import_string(name)
+                _backend = backend_class(hub)
+    return _backend
+
+
+def _publish(channels, event_type, data):
+    def send():
+        try:
+            get_backend().publish(channels, event_type, data)
+        except Exception:
+            logger.exception("Could not publish %s event to %d channel(s)", event_type, len(channels))
+
+    transaction.on_commit(send)
+
+
+def publish(user_ids, event_type, data=None):
+    """
+    Push an event to one user or an iterable of users once the current transaction
+    commits (immediately in autocommit). Failures are logged, never raised: a lost push
+    only delays the update until the dashboards' next poll.
+    """
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    channels = [user_channel(uid) for uid in dict.fromkeys(user_ids) if uid is not None]
+    if channels:
+        _publish(channels, event_type, data or {})
+
+
+def publish_audience(role, class_id, event_type, data=None):
+    """Push one event to every user with this role (None: any) in this class (None: any)."""
+    _publish([audience_channel(role, class_id)], event_type, data or {})
+
+
+def last_event_id():
+    return get_backend().last_id()
+
+
+def subscribe(user, after_id=None):
+    """
+    Open a subscription for user. With after_id (a resumed stream) events the user
+    missed since then are queued first; without it only events published from now on.
+    Call close() on the subscription when the stream ends.
+    """
+    backend = get_backend()
+    backend.start()
+    channels = channels_for(user)
+    start_id = backend.last_id()
+    sub = hub.subscribe(channels, start_id if after_id is None else after_id)
+    backend.follow(start_id)  # anything newer than start_id is relayed to the subscription
+    if after_id is not None:
+        sub.push(backend.backlog(channels, after_id))
+    return sub
+
+
+def parse_event_id(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ---- SSE bodies ----
+def _stream_settings():
+    return _setting("EVENTS_HEARTBEAT_SECONDS", 15), _setting("EVENTS_RETRY_MS", 3000)
+
+
+def sse_stream(sub, duration):
+    """Blocking SSE body for WSGI servers; ends after duration seconds and the browser reconnects."""
+    heartbeat, retry = _stream_settings()
+    deadline = time.monotonic() + duration
+    try:
+        yield f"retry: {retry}\n\n"
+        while time.monotonic() < deadline:
+            events = sub.get(min(heartbeat, max(deadline - time.monotonic(), 0)))
+            yield "".join(e.sse() for e in events) if events else ": ping\n\n"
+    finally:
+        sub.close()
+
+
+async def asse_stream(sub, duration):
+    """SSE body for ASGI servers: waiting streams hold no thread."""
+    heartbeat, retry = _stream_settings()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    try:
+        yield f"retry: {retry}\n\n"
+        while loop.time() < deadline:
+            events = await sub.aget(min(heartbeat, max(deadline - loop.time(), 0)))
+            yield "".join(e.sse() for e in events) if events else ": ping\n\n"
+    finally:
+        sub.close()
+
+
+# ---- signal handlers ----
+def _on_notification_saved(sender, instance, created=False, **kwargs):
+    if not created:
+        return
+    publish(instance.recipient_id, "notification", {
+        "id": instance.id,
+        "message": instance.message,
+        "sender": getattr(instance.sender, "username", None),
+        "created_at": instance.created_at.isoformat() if instance.created_at else None,
+    })
+
+
+def connect_signals():
+    from users.models import Notification
+
+    post_save.connect(_on_notification_saved, sender=Notification, dispatch_uid="events_notification_saved")
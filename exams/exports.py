@@ -0,0 +1,141 @@
+"""
+Tabular exports of results: one row per attempt, or one per answer (per-question
+scores), for a class, exam, subject and/or submission date range, as CSV or XLSX.
+
+Text that a spreadsheet would take for a formula (starting with =, +, -, @, tab or CR;
+answers and feedback are typed by users) is written with a leading apostrophe.
+
+Rows come from a values_list() queryset read with .iterator(), so neither format holds
+the result set in memory. CSV is encoded row by row as the response is sent and starts
+downloading at once. An XLSX file is a zip that can only be finished once every row is
+in it, so openpyxl's write_only workbook spools the rows to a temporary file and the
+finished file is then sent in chunks.
+"""
+import csv
+import tempfile
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Answer, StudentQuizAttempt
+
+
+KINDS = ("attempts", "answers")
+FORMATS = ("csv", "xlsx")
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+CHUNK_SIZE = 2000  # rows fetched per round trip
+FILE_CHUNK_SIZE = 64 * 1024
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+ATTEMPT_COLUMNS = (
+    ("Attempt ID", "id"),
+    ("Username", "student__username"),
+    ("First Name", "student__first_name"),
+    ("Last Name", "student__last_name"),
+    ("Class", "quiz__school_class__name"),
+    ("Subject", "quiz__subject__name"),
+    ("Exam", "quiz__title"),
+    ("Started", "started_at"),
+    ("Submitted", "submitted_at"),
+    ("Is Submitted", "is_submitted"),
+    ("Graded", "graded"),
+    ("Score", "score"),
+)
+
+ANSWER_COLUMNS = (
+    ("Attempt ID", "attempt_id"),
+    ("Username", "attempt__student__username"),
+    ("First Name", "attempt__student__first_name"),
+    ("Last Name", "attempt__student__last_name"),
+    ("Class", "attempt__quiz__school_class__name"),
+    ("Subject", "attempt__quiz__subject__name"),
+    ("Exam", "attempt__quiz__title"),
+    ("Submitted", "attempt__submitted_at"),
+    ("Question ID", "question_id"),
+    ("Question", "question__text"),
+    ("Question Type", "question__question_type"),
+    ("Marks", "question__marks"),
+    ("Choice", "selected_choice__text"),
+    ("Text Answer", "text_answer"),
+    ("Score", "score"),
+    ("Pending", "is_pending"),
+    ("Feedback", "feedback"),
+)
+
+
+def scope_filters(prefix="", class_id=None, quiz_id=None, subject_id=None, start_date=None, end_date=None):
+    """
+    Attempt filters (under prefix, e.g. "attempt__" for answers) for an export's scope.
+    start_date and end_date are YYYY-MM-DD submission days, both included.
+    """
+    filters = {}
+    if class_id:
+        filters["quiz__school_class_id"] = class_id
+    if quiz_id:
+        filters["quiz_id"] = quiz_id
+    if subject_id:
+        filters["quiz__subject_id"] = subject_id
+    if start_date:
+        filters["submitted_at__gte"] = timezone.make_aware(datetime.strptime(start_date, "%Y-%m-%d"))
+    if end_date:
+        day_after = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        filters["submitted_at__lt"] = timezone.make_aware(day_after)
+    return {prefix + key: value for key, value in filters.items()}
+
+
+def rows(kind, **scope):
+    """The header row, then one tuple per attempt or answer in scope, read lazily."""
+    if kind == "attempts":
+        columns, queryset = ATTEMPT_COLUMNS, StudentQuizAttempt.objects.filter(**scope_filters(**scope))
+        order = ("id",)
+    else:
+        columns, queryset = ANSWER_COLUMNS, Answer.objects.filter(**scope_filters("attempt__", **scope))
+        order = ("attempt_id", "id")
+    yield tuple(label for label, _ in columns)
+    yield from queryset.order_by(*order).values_list(*(field for _, field in columns)).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _cell(value):
+    # spreadsheets have no time zones: write datetimes in the school's local time
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value  # text, never a formula
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield "\ufeff"  # BOM, so Excel reads the file as UTF-8
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def stream_xlsx(rows, title="Results"):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for row in rows:
+        ws.append([_cell(value) for value in row])
+    with tempfile.TemporaryFile() as spool:
+        wb.save(spool)
+        spool.seek(0)
+        while chunk := spool.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def stream(kind, fmt, **scope):
+    """Iterator of the export's content, for a StreamingHttpResponse."""
+    if fmt == "csv":
+        return stream_csv(rows(kind, **scope))
+    return stream_xlsx(rows(kind, **scope), title=kind.capitalize())
@@ -0,0 +1,183 @@
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Question, Answer, StudentQuizAttempt, ActionLog
+from .answer_key import get_answer_key
+from .dashboard import refresh_summaries_for_attempts
+from . import leaderboard
+from .changes import bump, student_scopes, LOGS
+
+
+def _question_row(question, ans, qkey):
+    """Per-question summary row for the submit response."""
+    if question.question_type == "objective":
+        correct = bool(qkey and qkey.is_correct(ans.selected_choice_id))
+        return {
+            "question_id": question.id,
+            "type": "objective",
+            "text": question.text,
+            "student": ans.selected_choice.text if ans.selected_choice else None,
+            "correct_answer": qkey.correct_text if qkey else "",
+            "marks_awarded": ans.score,
+            "max_marks": question.marks,
+            "status": "correct" if correct else "wrong",
+        }
+    return {
+        "question_id": question.id,
+        "type": "subjective",
+        "text": question.text,
+        "student": ans.text_answer,
+        "marks_awarded": ans.score if not ans.is_pending else None,
+        "max_marks": question.marks,
+        "status": "pending" if ans.is_pending else "graded",
+        "feedback": ans.feedback,
+    }
+
+
+def _lock_open_attempts(attempt_ids, skip_locked=False):
+    """Unsubmitted attempts among attempt_ids, row-locked where the database supports it."""
+    qs = StudentQuizAttempt.objects.filter(id__in=attempt_ids, is_submitted=False).select_related("quiz").order_by("id")
+    features = connection.features
+    if features.has_select_for_update:
+        kwargs = {}
+        if skip_locked and features.has_select_for_update_skip_locked:
+            kwargs["skip_locked"] = True  # another node is already closing these rows
+        if features.has_select_for_update_of:
+            kwargs["of"] = ("self",)
+        qs = qs.select_for_update(**kwargs)
+    return list(qs)
+
+
+def _grade_answers(attempts, with_details=False):
+    """
+    Create missing objective answers and re-score objective ones for many attempts.
+    Returns {attempt_id: [answers]}. Query count is fixed whatever the number of attempts/questions.
+    """
+    keys = {a.id: get_answer_key(a.quiz) for a in attempts}
+
+    answers_qs = Answer.objects.filter(attempt_id__in=list(keys)).order_by("id")
+    if with_details:
+        answers_qs = answers_qs.select_related("question", "selected_choice")
+    by_attempt = {attempt_id: [] for attempt_id in keys}
+    for ans in answers_qs:
+        by_attempt[ans.attempt_id].append(ans)
+
+    # every objective question gets an Answer row (0 marks if unanswered)
+    to_create = []
+    for attempt_id, key in keys.items():
+        answered = {a.question_id for a in by_attempt[attempt_id]}
+        to_create.extend(
+            Answer(attempt_id=attempt_id, question_id=qid, selected_choice=None, text_answer=None, score=0.0, is_pending=False)
+            for qid in key.objective_ids if qid not in answered
+        )
+    if to_create:
+        created = Answer.objects.bulk_create(to_create)
+        questions = Question.objects.in_bulk({a.question_id for a in created}) if with_details else {}
+        for ans in created:
+            if with_details:
+                ans.question = questions[ans.question_id]
+                ans.selected_choice = None
+            by_attempt[ans.attempt_id].append(ans)
+
+    # auto-grade objective answers; subjective answers are left pending until graded
+    changed = []
+    for attempt_id, answers in by_attempt.items():
+        key = keys[attempt_id]
+        for ans in answers:
+            qkey = key.get(ans.question_id)
+            if qkey is None or not qkey.is_objective:
+                continue
+            score = qkey.score(ans.selected_choice_id)
+            if ans.score != score or ans.is_pending:
+                ans.score = score
+                ans.is_pending = False
+                changed.append(ans)
+    if changed:
+        Answer.objects.bulk_update(changed, ["score", "is_pending"])
+    return by_attempt
+
+
+def finalize_attempts(attempt_ids, skip_locked=False, with_details=False):
+    """
+    Grade and submit many attempts, set-based:
+      - bulk-create zero-score answers for unanswered objective questions
+      - re-score objective answers from the cached answer keys and bulk-update the changed ones
+      - total objective + graded subjective with one conditional aggregate
+      - bulk-update the attempts as submitted, then refresh the students' dashboard summaries and leaderboard entries
+    Attempts that are already submitted (or locked by another node when skip_locked) are skipped.
+    Returns (finalized_attempts, {attempt_id: (objective, subjective)}, {attempt_id: [answers]}).
+    """
+    with transaction.atomic():
+        attempts = _lock_open_attempts(attempt_ids, skip_locked=skip_locked)
+        if not attempts:
+            return [], {}, {}
+        answers = _grade_answers(attempts, with_details=with_details)
+        totals = Answer.score_totals_for([a.id for a in attempts])
+
+        now = timezone.now()
+        for attempt in attempts:
+            objective_sum, subjective_sum = totals.get(attempt.id, (0.0, 0.0))
+            attempt.score = objective_sum + subjective_sum
+            attempt.is_submitted = True
+            attempt.submitted_at = now
+        StudentQuizAttempt.objects.bulk_update(attempts, ["score", "is_submitted", "submitted_at"])
+        bump(*student_scopes(a.student_id for a in attempts))  # bulk_update sends no signals
+    refresh_summaries_for_attempts(attempts)
+    leaderboard.refresh_for_attempts(attempts)
+    return attempts, totals, answers
+
+
+def finalize_attempt(attempt):
+    """
+    Grade and submit one attempt with a fixed number of queries, whatever the quiz size.
+    Returns (objective_sum, subjective_sum, question_details), or None if it was already submitted.
+    """
+    finalized, totals, answers = finalize_attempts([attempt.pk], with_details=True)
+    if not finalized:
+        return None
+    done = finalized[0]
+    attempt.score, attempt.is_submitted, attempt.submitted_at = done.score, done.is_submitted, done.submitted_at
+
+    key = get_answer_key(done.quiz)
+    details = [_question_row(ans.question, ans, key.get(ans.question_id)) for ans in answers[done.id]]
+    objective_sum, subjective_sum = totals.get(done.id, (0.0, 0.0))
+    return objective_sum, subjective_sum, details
+
+
+def close_expired_attempts(batch_size=200, grace_seconds=0):
+    """
+    One deadline sweep: auto-submit every unsubmitted attempt whose end_time has passed.
+    Safe to run on several nodes at once (rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED
+    where supported, and already-submitted attempts are never graded twice).
+    Returns (closed_count, elapsed_seconds).
+    """
+    started = time.monotonic()
+    cutoff = timezone.now() - timezone.timedelta(seconds=grace_seconds)
+    closed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            StudentQuizAttempt.objects.filter(is_submitted=False, end_time__lt=cutoff, id__gt=last_id)
+            .order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        finalized, _, _ = finalize_attempts(ids, skip_locked=True)
+        if finalized:
+            ActionLog.objects.bulk_create([
+                ActionLog(
+                    user_id=a.student_id,
+                    action_type="Auto-submitted Exam",
+                    description=f"Attempt {a.id} auto-submitted after its deadline",
+                    model_name="StudentQuizAttempt",
+                    object_id=str(a.id),
+                    details={"score": a.score},
+                )
+                for a in finalized
+            ])
+            bump(LOGS)
+        closed += len(finalized)
+    return closed, time.monotonic() - started
@@ -0,0 +1,97 @@
+"""
+Decoded images for PDF reports (the school logo and student photos).
+
+Each file is opened, decoded and downsampled to the size it is drawn at (at
+REPORT_IMAGE_DPI) once, then kept in a process-local LRU keyed by path, modification
+time and size, so a class report decodes the logo once rather than once per student and
+later reports skip the disk (bar a stat()) and decoding altogether. Replacing a file
+changes its mtime, and the new version is picked up on the next report.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image
+
+
+logger = logging.getLogger(__name__)
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_BROKEN = object()  # cached for files that could not be decoded, so they are not retried (or logged) per page
+
+
+def _cache_size():
+    return getattr(settings, "REPORT_IMAGE_CACHE_SIZE", 128)
+
+
+def clear_image_cache():
+    with _lock:
+        _cache.clear()
+
+
+class ReportImage(Image):
+    """A reportlab Image drawn from an already decoded ImageReader (shared, never re-read)."""
+
+    def __init__(self, reader, width, height):
+        self._img = reader  # set first, so Image never reads the (empty) stream below
+        super().__init__(BytesIO(), width, height)
+
+
+def _pixels(points):
+    return max(1, round(points / 72 * getattr(settings, "REPORT_IMAGE_DPI", 150)))
+
+
+def _decode(path, size):
+    with PILImage.open(path) as img:
+        img.draft("RGB", size)  # lets JPEGs decode straight at a reduced scale
+        img.thumbnail(size, PILImage.Resampling.LANCZOS)
+        if img.mode in ("RGBA", "LA", "P"):
+            # flatten transparency onto the white page
+            img = img.convert("RGBA")
+            flat = PILImage.new("RGB", img.size, "white")
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        img.load()
+    return ImageReader(img)
+
+
+def _reader(path, width, height):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        return None  # no such file (or no path): the caller leaves the cell empty
+    size = (_pixels(width), _pixels(height))
+    key = (path, mtime, size)
+    with _lock:
+        reader = _cache.get(key)
+        if reader is not None:
+            _cache.move_to_end(key)
+            return None if reader is _BROKEN else reader
+
+    try:
+        reader = _decode(path, size)
+    except Exception:
+        logger.warning("Could not load report image %s", path, exc_info=True)
+        reader = _BROKEN
+    with _lock:
+        _cache[key] = reader
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return None if reader is _BROKEN else reader
+
+
+def report_image(path, width, height):
+    """A flowable drawing the image at path in width x height points, or None if it can't be read."""
+    reader = _reader(path, width, height)
+    if reader is None:
+        return None
+    return ReportImage(reader, width, height)
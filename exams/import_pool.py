@@ -0,0 +1,75 @@
+"""
+Parallel parsing for bulk exam imports: each workbook sheet is read and validated
+(exams.quiz_import.parse_sheet, which needs no database) by a worker process, and the
+parsed exams come back in order for the importing process to save.
+
+Workers are spawned rather than forked (the caller holds database connections) and set up
+Django once each. Unlike the report pool the pool only lives for one import, which is
+rare and long enough to pay for starting it. This module is what the workers unpickle, so
+it imports no models at load time.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+
+
+def workers(count=None):
+    """Processes parsing a bulk import: count, else QUIZ_IMPORT_WORKERS (0: one per core, 1: parse in-process)."""
+    if count is None:
+        count = getattr(settings, "QUIZ_IMPORT_WORKERS", 1)
+    return count if count > 0 else (os.cpu_count() or 1)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _hashed(rows, digest):
+    for row in rows:
+        digest.update(repr(row).encode())
+        yield row
+
+
+def parse(data, sheet_name=None):
+    """
+    (digest, parsed exam) for one sheet of a workbook (its active sheet when sheet_name is
+    None). The digest hashes the sheet's values, so an unchanged sheet is recognised
+    whichever workbook or archive it arrives in.
+    """
+    from . import quiz_import
+
+    digest = hashlib.sha256()
+    try:
+        wb = quiz_import.open_workbook(BytesIO(data))
+        try:
+            sheet = wb[sheet_name] if sheet_name else wb.active
+            parsed = quiz_import.parse_sheet(_hashed(sheet.iter_rows(values_only=True), digest), sheet.title)
+        finally:
+            wb.close()
+    except Exception as exc:  # an unreadable file fails on its own, not the whole import
+        parsed = quiz_import.ParsedQuiz(sheet_name)
+        parsed.error(None, "file", f"Invalid Excel file: {exc}")
+        digest.update(data)
+    return digest.hexdigest(), parsed
+
+
+def parse_all(jobs, workers):
+    """Yield parse(data, sheet_name) for each job in order, on up to workers processes."""
+    if workers <= 1 or len(jobs) <= 1:
+        for data, sheet_name in jobs:
+            yield parse(data, sheet_name)
+        return
+
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+    )
+    try:
+        # results are yielded as they arrive in order, so saving overlaps parsing the rest
+        yield from pool.map(parse, *zip(*jobs))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,211 @@
+"""
+A user's notifications as shown to them: direct Notification rows merged at read time
+with the BroadcastMessages addressed to their audience (role and class). A broadcast is
+stored once; whether a user has read it is a BroadcastReceipt row, created only when
+they do. Items are plain dicts carrying "kind" ("notification" or "broadcast") so that
+mark-read can tell the two apart.
+
+Unread counts come from a per-user UnreadCounter for direct notifications (adjusted on
+create, read and delete here) plus a count of the user's unread broadcasts, of which
+there are few (only those posted since the account was created), so badges never count
+the notification table.
+"""
+import math
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+
+from users.models import Notification, BroadcastMessage, BroadcastReceipt, UnreadCounter
+
+from .changes import bump, notifications_scope
+
+
+NOTIFICATION = "notification"
+BROADCAST = "broadcast"
+
+
+def broadcasts_for(user):
+    """
+    Broadcasts whose audience includes user, each annotated with is_read. Audiences are
+    approved accounts only, and an account sees the broadcasts posted since it was created.
+    """
+    broadcasts = BroadcastMessage.objects.filter(
+        Q(role="") | Q(role=user.role),
+        Q(school_class__isnull=True) | Q(school_class_id=user.student_class_id),
+    )
+    if not user.approved:
+        broadcasts = broadcasts.none()
+    elif user.created_at is not None:
+        broadcasts = broadcasts.filter(created_at__gte=user.created_at)
+    return (
+        broadcasts
+        .annotate(is_read=Exists(BroadcastReceipt.objects.filter(broadcast=OuterRef("pk"), user=user)))
+        .select_related("sender")
+    )
+
+
+def _notification_item(n):
+    return {
+        "id": n.id,
+        "kind": NOTIFICATION,
+        "message": n.message,
+        "sender": getattr(n.sender, "username", None),
+        "is_read": n.is_read,
+        "created_at": n.created_at,
+    }
+
+
+def _broadcast_item(b):
+    return {
+        "id": b.id,
+        "kind": BROADCAST,
+        "message": b.message,
+        "sender": getattr(b.sender, "username", None),
+        "is_read": b.is_read,
+        "created_at": b.created_at,
+    }
+
+
+def _page_bounds(total, page_number, page_size):
+    pages = max(1, math.ceil(total / page_size))
+    try:
+        return min(max(int(page_number), 1), pages), pages
+    except (TypeError, ValueError):
+        return 1, pages
+
+
+def _merged(notifications, broadcasts, count):
+    items = [_notification_item(n) for n in notifications[:count]]
+    items += [_broadcast_item(b) for b in broadcasts[:count]]
+    items.sort(key=lambda item: item["created_at"], reverse=True)
+    return items[:count]
+
+
+def page(user, page_number=1, page_size=5, unread_only=False):
+    """
+    One page of the user's merged notifications, newest first.
+    Returns (items, meta) with meta = {"page", "pages", "total"}. Each source is read
+    with a bounded, ordered query (page * page_size rows at most) plus one count.
+    """
+    notifications = Notification.objects.filter(recipient=user).select_related("sender").order_by("-created_at")
+    broadcasts = broadcasts_for(user).order_by("-created_at")
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+        broadcasts = broadcasts.filter(is_read=False)
+
+    total = notifications.count() + broadcasts.count()
+    page_number, pages = _page_bounds(total, page_number, page_size)
+    start = (page_number - 1) * page_size
+    items = _merged(notifications, broadcasts, start + page_size)[start:]
+    return items, {"page": page_number, "pages": pages, "total": total}
+
+
+def unread(user, limit=None):
+    """The user's unread notifications and broadcasts, newest first (at most limit)."""
+    notifications = Notification.objects.filter(recipient=user, is_read=False).select_related("sender").order_by("-created_at")
+    broadcasts = broadcasts_for(user).filter(is_read=False).order_by("-created_at")
+    if limit is None:
+        items = [_notification_item(n) for n in notifications] + [_broadcast_item(b) for b in broadcasts]
+        items.sort(key=lambda item: item["created_at"], reverse=True)
+        return items
+    return _merged(notifications, broadcasts, limit)
+
+
+def mark_read(user, item_id, kind=NOTIFICATION):
+    """Mark one item read for user. Returns False if it isn't one of theirs."""
+    if kind == BROADCAST:
+        if not broadcasts_for(user).filter(pk=item_id).exists():
+            return False
+        try:
+            with transaction.atomic():
+                BroadcastReceipt.objects.get_or_create(broadcast_id=item_id, user=user)
+        except IntegrityError:
+            pass  # marked read concurrently
+        return True
+    if Notification.objects.filter(pk=item_id, recipient=user, is_read=False).update(is_read=True):
+        _remove_unread(user.pk, 1)
+        bump(notifications_scope(user.pk))  # update() sends no signals
+        return True
+    return Notification.objects.filter(pk=item_id, recipient=user).exists()
+
+
+def mark_all_read(user):
+    """Mark every notification and broadcast of user read. Returns how many were unread."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        if updated:
+            _remove_unread(user.pk, updated)
+        broadcast_ids = list(broadcasts_for(user).filter(is_read=False).values_list("pk", flat=True))
+        BroadcastReceipt.objects.bulk_create(
+            [BroadcastReceipt(broadcast_id=pk, user=user) for pk in broadcast_ids], ignore_conflicts=True
+        )
+    if updated or broadcast_ids:
+        bump(notifications_scope(user.pk))
+    return updated + len(broadcast_ids)
+
+
+def sent_page(user, page_number=1, page_size=5):
+    """Broadcasts a user sent (one-row BroadcastMessages and per-recipient Notifications), newest first."""
+    notifications = Notification.objects.filter(sender=user).select_related("sender", "recipient").order_by("-created_at")
+    broadcasts = BroadcastMessage.objects.filter(sender=user).select_related("sender", "school_class").order_by("-created_at")
+    total = notifications.count() + broadcasts.count()
+    page_number, pages = _page_bounds(total, page_number, page_size)
+    start = (page_number - 1) * page_size
+    end = start + page_size
+    rows = list(notifications[:end]) + list(broadcasts[:end])
+    rows.sort(key=lambda row: row.created_at, reverse=True)
+    return rows[start:end], {"page": page_number, "pages": pages, "total": total}
+
+
+# ---- unread counters ----
+def unread_count(user):
+    """How many notifications and broadcasts user hasn't read."""
+    direct = UnreadCounter.objects.filter(user=user).values_list("unread", flat=True).first() or 0
+    return direct + broadcasts_for(user).filter(is_read=False).count()
+
+
+def add_unread(user_ids, count=1):
+    """Count new unread notifications for these users (for writes that send no signals, e.g. bulk_create)."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    UnreadCounter.objects.bulk_create([UnreadCounter(user_id=uid) for uid in user_ids], ignore_conflicts=True)
+    UnreadCounter.objects.filter(user_id__in=user_ids).update(unread=F("unread") + count)
+
+
+def _remove_unread(user_id, count):
+    UnreadCounter.objects.filter(user_id=user_id).update(unread=Greatest(F("unread") - count, Value(0)))
+
+
+def recount(user_ids=None):
+    """Recompute counters from the notification table (all users, or these). Returns the number of rows written."""
+    notifications = Notification.objects.filter(is_read=False)
+    counters = UnreadCounter.objects.all()
+    if user_ids is not None:
+        notifications = notifications.filter(recipient_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+    rows = notifications.values("recipient_id").annotate(unread=Count("id")).order_by()
+    with transaction.atomic():
+        counters.delete()
+        created = UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=r["recipient_id"], unread=r["unread"]) for r in rows], batch_size=500
+        )
+    return len(created)
+
+
+# ---- signal handlers ----
+def _on_notification_saved(sender, instance, created=False, **kwargs):
+    if created and not instance.is_read:
+        add_unread([instance.recipient_id])
+
+
+def _on_notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        _remove_unread(instance.recipient_id, 1)
+
+
+def connect_signals():
+    post_save.connect(_on_notification_saved, sender=Notification, dispatch_uid="inbox_notification_saved")
+    post_delete.connect(_on_notification_deleted, sender=Notification, dispatch_uid="inbox_notification_deleted")
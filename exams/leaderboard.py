@@ -0,0 +1,121 @@
+"""
+Leaderboard tables: one LeaderboardEntry per student on the global board, on their
+class board and on each subject board they have submitted attempts in, holding the
+running score total and attempt count (and their average, so boards are read with an
+indexed top-N query instead of a GROUP BY over every attempt).
+
+Entries are kept current on submit, grade, retake and exam deletion events by refreshing
+the students involved; `manage.py rebuild_leaderboards` recomputes every board for backfills.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import Class, LeaderboardEntry, StudentQuizAttempt
+from .changes import bump, LEADERBOARD
+
+
+GLOBAL = LeaderboardEntry.GLOBAL
+CLASS = LeaderboardEntry.CLASS
+SUBJECT = LeaderboardEntry.SUBJECT
+
+
+def _entries_for(student_ids):
+    """Fresh entries for these students, from one grouped query over their submitted attempts."""
+    totals = {}
+
+    def add(scope, scope_id, student_id, total, count):
+        entry = totals.setdefault((scope, scope_id, student_id), [0.0, 0])
+        entry[0] += total
+        entry[1] += count
+
+    rows = (
+        StudentQuizAttempt.objects.filter(student_id__in=student_ids, is_submitted=True)
+        .values("student_id", "student__student_class_id", "quiz__subject_id")
+        .annotate(total=Sum("score"), count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        student_id, total, count = row["student_id"], float(row["total"] or 0.0), row["count"]
+        add(GLOBAL, 0, student_id, total, count)
+        add(CLASS, row["student__student_class_id"] or 0, student_id, total, count)
+        add(SUBJECT, row["quiz__subject_id"], student_id, total, count)
+
+    return [
+        LeaderboardEntry(
+            scope=scope, scope_id=scope_id, student_id=student_id,
+            total_score=total, attempt_count=count, avg_score=total / count if count else 0.0,
+        )
+        for (scope, scope_id, student_id), (total, count) in totals.items()
+    ]
+
+
+def refresh_students(student_ids):
+    """
+    Recompute every board entry of these students (a student's attempts are few, so this
+    is cheap, and a regrade or deleted attempt can never leave a running total drifting).
+    """
+    student_ids = {int(s) for s in student_ids if s is not None}
+    if not student_ids:
+        return
+    with transaction.atomic():
+        entries = _entries_for(student_ids)
+        LeaderboardEntry.objects.filter(student_id__in=student_ids).delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+        bump(LEADERBOARD)  # bulk writes send no signals
+
+
+def refresh_for_attempts(attempts):
+    refresh_students({a.student_id for a in attempts})
+
+
+def rebuild(batch_size=500):
+    """Recompute every board from scratch. Returns the number of students with entries."""
+    student_ids = list(
+        StudentQuizAttempt.objects.filter(is_submitted=True)
+        .order_by("student_id").values_list("student_id", flat=True).distinct()
+    )
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        for i in range(0, len(student_ids), batch_size):
+            LeaderboardEntry.objects.bulk_create(_entries_for(student_ids[i:i + batch_size]), batch_size=500)
+        bump(LEADERBOARD)
+    return len(student_ids)
+
+
+# ---- reads ----
+def top(scope, scope_id=0, limit=10):
+    """Top entries of one board, best average first, with their students."""
+    return list(
+        LeaderboardEntry.objects.filter(scope=scope, scope_id=scope_id or 0)
+        .select_related("student")
+        .order_by("-avg_score", "student_id")[:limit]
+    )
+
+
+def best_per_class():
+    """The top entry of every class board (students without a class under scope_id 0)."""
+    best = (
+        LeaderboardEntry.objects.filter(scope=CLASS, scope_id=OuterRef("scope_id"))
+        .order_by("-avg_score", "student_id").values("id")[:1]
+    )
+    ids = (
+        LeaderboardEntry.objects.filter(scope=CLASS)
+        .values("scope_id").distinct()
+        .annotate(best_id=Subquery(best)).values_list("best_id", flat=True)
+    )
+    return list(
+        LeaderboardEntry.objects.filter(id__in=ids).select_related("student").order_by("scope_id")
+    )
+
+
+def class_averages():
+    """{class id (0 = no class): average attempt score} from the class boards."""
+    rows = (
+        LeaderboardEntry.objects.filter(scope=CLASS)
+        .values("scope_id").annotate(total=Sum("total_score"), count=Sum("attempt_count")).order_by()
+    )
+    return {r["scope_id"]: (r["total"] / r["count"] if r["count"] else 0.0) for r in rows}
+
+
+def class_names(class_ids):
+    return dict(Class.objects.filter(id__in=[c for c in class_ids if c]).values_list("id", "name"))
@@ -0,0 +1,409 @@
+"""
+Exam-day load simulation.
+
+Seeds a synthetic school and drives virtual students through the real exam flow:
+login -> take_quiz_view -> api_submit_answer (once per question) -> api_submit_attempt
+-> quiz_result_view, with think time between answers. Results are aggregated per
+endpoint (latency percentiles, throughput, error rate, DB queries) into a report
+that can be written as JSON/HTML and compared with an earlier run.
+
+Used by `manage.py simulate_exam_load`.
+"""
+import html
+import math
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Class, Subject, Quiz, Question, Choice
+from .audit import flush_audit_log
+
+
+User = get_user_model()
+
+ENDPOINTS = ["login", "take_quiz", "submit_answer", "submit_attempt", "result"]
+ATTEMPT_ID_RE = re.compile(r'id="attemptId" value="(\d+)"')
+
+
+# ---------------------------------------------------------------------------
+# synthetic school
+# ---------------------------------------------------------------------------
+class SyntheticSchool:
+    """What the virtual students need to know about the seeded data."""
+
+    def __init__(self, prefix, quiz_id, usernames, password, questions):
+        self.prefix = prefix
+        self.quiz_id = quiz_id
+        self.usernames = usernames
+        self.password = password
+        self.questions = questions  # [(question_id, question_type, [choice ids])]
+
+
+def seed_school(students=100, questions=20, subjective=2, prefix="loadsim", password="loadsim-pass"):
+    """
+    Create one class with `students` approved students, a teacher and a published quiz
+    of `questions` questions (the last `subjective` of them free text). Any earlier
+    school with the same prefix is removed first.
+    """
+    teardown_school(prefix)
+    now = timezone.now()
+    school_class = Class.objects.create(name=f"{prefix}-class")
+    subject = Subject.objects.create(name=f"{prefix} Mathematics", school_class=school_class)
+    hashed = make_password(password)  # hash once, it's the slow part of creating users
+    teacher = User.objects.create(
+        username=f"{prefix}-teacher", password=hashed, role="teacher", approved=True, student_class=school_class
+    )
+    User.objects.bulk_create([
+        User(username=f"{prefix}-student-{n}", password=hashed, role="student", approved=True, student_class=school_class)
+        for n in range(students)
+    ], batch_size=500)
+
+    quiz = Quiz.objects.create(
+        school_class=school_class, subject=subject, title=f"{prefix} exam", created_by=teacher,
+        start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=6),
+        duration_minutes=120, is_published=True,
+    )
+    Question.objects.bulk_create([
+        Question(
+            quiz=quiz, text=f"Question {n + 1}", marks=1,
+            question_type="subjective" if n >= questions - subjective else "objective",
+        )
+        for n in range(questions)
+    ])
+    qs = list(Question.objects.filter(quiz=quiz).order_by("id"))
+    Choice.objects.bulk_create([
+        Choice(question=q, text=f"Option {c + 1}", is_correct=(c == 0))
+        for q in qs if q.question_type == "objective" for c in range(4)
+    ])
+    choices = {}
+    for cid, qid in Choice.objects.filter(question__quiz=quiz).values_list("id", "question_id"):
+        choices.setdefault(qid, []).append(cid)
+
+    usernames = [f"{prefix}-student-{n}" for n in range(students)]
+    layout = [(q.id, q.question_type, choices.get(q.id, [])) for q in qs]
+    return SyntheticSchool(prefix, quiz.id, usernames, password, layout)
+
+
+def teardown_school(prefix="loadsim"):
+    """Remove a seeded school (students, quiz, attempts and answers cascade from the class)."""
+    User.objects.filter(username__startswith=f"{prefix}-").delete()
+    Class.objects.filter(name=f"{prefix}-class").delete()
+
+
+# ---------------------------------------------------------------------------
+# transports
+# ---------------------------------------------------------------------------
+class Response:
+    def __init__(self, status, body, headers, queries=None):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.queries = queries  # DB queries, only known in-process
+
+
+class InProcessTransport:
+    """Calls the Django stack directly with a test Client; counts queries per request."""
+
+    name = "inprocess"
+
+    def __init__(self, host="localhost"):
+        self.client = Client(HTTP_HOST=host, raise_request_exception=False)  # a 500 is a measured error
+
+    def request(self, method, path, data=None, json_body=None):
+        kwargs = {}
+        if json_body is not None:
+            kwargs = {"data": json.dumps(json_body), "content_type": "application/json"}
+        elif data is not None:
+            kwargs = {"data": data}
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(path) if method == "GET" else self.client.post(path, **kwargs)
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return Response(resp.status_code, body, resp, queries=len(ctx.captured_queries))
+
+    def csrf_token(self):
+        return ""  # the test client doesn't enforce CSRF
+
+    def close(self):
+        close_old_connections()
+
+
+class HttpTransport:
+    """Talks to a running server over HTTP with its own cookie jar (session + CSRF)."""
+
+    name = "http"
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, method, path, data=None, json_body=None):
+        url = self.base_url + path
+        headers = {"Referer": url}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if method != "GET":
+            headers["X-CSRFToken"] = self.csrf_token()
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                return Response(resp.status, resp.read(), resp.headers)
+        except urllib.error.HTTPError as err:
+            return Response(err.code, err.read(), err.headers)
+
+    def close(self):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # a 302 after login is the success signal, don't follow it
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# measurements
+# ---------------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {name: [] for name in ENDPOINTS}  # endpoint -> [(ms, ok, queries)]
+        self.started = None
+        self.finished = None
+
+    def add(self, endpoint, ms, ok, queries):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((ms, ok, queries))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct * len(sorted_values) / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_report(recorder, config):
+    duration = max((recorder.finished or time.time()) - recorder.started, 1e-9)
+    endpoints = {}
+    total = errors = 0
+    for name, samples in recorder.samples.items():
+        if not samples:
+            continue
+        latencies = sorted(ms for ms, _, _ in samples)
+        failed = sum(1 for _, ok, _ in samples if not ok)
+        queries = [q for _, _, q in samples if q is not None]
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": failed,
+            "error_rate": round(failed / len(samples), 4),
+            "throughput_rps": round(len(samples) / duration, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "avg_queries": round(sum(queries) / len(queries), 2) if queries else None,
+            "max_queries": max(queries) if queries else None,
+        }
+        total += len(samples)
+        errors += failed
+    return {
+        "config": config,
+        "started_at": datetime.fromtimestamp(recorder.started, tz=dt_timezone.utc).isoformat(),
+        "duration_s": round(duration, 2),
+        "total_requests": total,
+        "total_errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+def compare_reports(current, baseline):
+    """Per-endpoint change against an earlier report: {endpoint: {metric: {before, after, change_pct}}}."""
+    metrics = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "error_rate", "avg_queries"]
+    result = {}
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        row = {}
+        for metric in metrics:
+            a, b = before.get(metric), now.get(metric)
+            if a is None or b is None:
+                continue
+            row[metric] = {"before": a, "after": b, "change_pct": round((b - a) / a * 100, 1) if a else None}
+        result[name] = row
+    return result
+
+
+def render_html(report):
+    esc = html.escape
+    cols = ["requests", "errors", "error_rate", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "avg_queries"]
+    rows = "".join(
+        "<tr><td>{}</td>{}</tr>".format(esc(name), "".join(f"<td>{esc(str(data.get(c)))}</td>" for c in cols))
+        for name, data in report["endpoints"].items()
+    )
+    comparison = ""
+    if report.get("comparison"):
+        crow = "".join(
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                esc(name), esc(metric), v["before"], v["after"], "" if v["change_pct"] is None else f'{v["change_pct"]:+}%'
+            )
+            for name, metrics in report["comparison"].items() for metric, v in metrics.items()
+        )
+        comparison = (
+            "<h2>Compared with baseline</h2><table><tr><th>endpoint</th><th>metric</th>"
+            f"<th>before</th><th>after</th><th>change</th></tr>{crow}</table>"
+        )
+    config = ", ".join(f"{esc(str(k))}={esc(str(v))}" for k, v in report["config"].items())
+    return (
+        "<!doctype html><html><head><meta charset='utf-8'><title>Exam load report</title>"
+        "<style>body{font-family:sans-serif;margin:2rem}table{border-collapse:collapse;margin-bottom:1.5rem}"
+        "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}td:first-child{text-align:left}</style>"
+        "</head><body><h1>Exam load report</h1>"
+        f"<p>{esc(report['started_at'])} &middot; {report['duration_s']}s &middot; {report['total_requests']} requests"
+        f" &middot; {report['throughput_rps']} req/s &middot; error rate {report['error_rate']}</p>"
+        f"<p><small>{config}</small></p>"
+        "<table><tr><th>endpoint</th>" + "".join(f"<th>{c}</th>" for c in cols) + f"</tr>{rows}</table>"
+        f"{comparison}</body></html>"
+    )
+
+
+# ---------------------------------------------------------------------------
+# virtual students
+# ---------------------------------------------------------------------------
+class VirtualStudent:
+    def __init__(self, username, school, transport, recorder, think=(1.0, 3.0), max_waits=30, rng=None):
+        self.username = username
+        self.school = school
+        self.transport = transport
+        self.recorder = recorder
+        self.think = think
+        self.max_waits = max_waits
+        self.rng = rng or random.Random()
+
+    def _call(self, endpoint, method, path, ok_statuses=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self.transport.request(method, path, **kwargs)
+        except Exception:
+            self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, False, None)
+            raise
+        ms = (time.perf_counter() - started) * 1000
+        ok = resp.status in ok_statuses
+        if ok and kwargs.get("json_body") is not None and resp.body[:1] == b"{":
+            ok = bool(json.loads(resp.body).get("ok", True))
+        self.recorder.add(endpoint, ms, ok, resp.queries)
+        return resp
+
+    def _pause(self):
+        low, high = self.think
+        if high > 0:
+            time.sleep(self.rng.uniform(low, high))
+
+    def run(self):
+        try:
+            self.transport.request("GET", reverse("login"))  # csrf cookie
+            resp = self._call("login", "POST", reverse("login"), ok_statuses=(302,), data={
+                "username": self.username, "password": self.school.password,
+                "csrfmiddlewaretoken": self.transport.csrf_token(),
+            })
+            if resp.status != 302:
+                return
+
+            take_path = reverse("take_quiz", args=[self.school.quiz_id])
+            for _ in range(self.max_waits):
+                resp = self._call("take_quiz", "GET", take_path, ok_statuses=(200, 429))
+                if resp.status != 429:
+                    break
+                # waiting room: come back when told to
+                time.sleep(float(resp.headers.get("Retry-After") or 1))
+            match = ATTEMPT_ID_RE.search(resp.body.decode(errors="replace")) if resp.status == 200 else None
+            if not match:
+                return
+            attempt_id = int(match.group(1))
+
+            save_path = reverse("api_submit_answer", args=[attempt_id])
+            for question_id, qtype, choice_ids in self.school.questions:
+                self._pause()
+                answer = self.rng.choice(choice_ids) if qtype == "objective" and choice_ids else "Simulated answer text"
+                self._call("submit_answer", "POST", save_path, json_body={"question_id": question_id, "answer": answer})
+
+            self._call("submit_attempt", "POST", reverse("api_submit_attempt", args=[attempt_id]), json_body={})
+            self._call("result", "GET", reverse("quiz_result", args=[attempt_id]))
+        except Exception:
+            pass  # already counted as an error by _call
+        finally:
+            self.transport.close()
+
+
+def run_simulation(school, concurrency=20, ramp_up=10.0, think=(1.0, 3.0), base_url=None, host="localhost", seed=None):
+    """
+    Drive every seeded student through one exam, at most `concurrency` at a time, with
+    start times spread over `ramp_up` seconds. With base_url requests go over HTTP to a
+    running server, otherwise through the Django stack in this process.
+    Returns the report dict.
+    """
+    rng = random.Random(seed)
+    recorder = Recorder()
+
+    def make_transport():
+        return HttpTransport(base_url) if base_url else InProcessTransport(host=host)
+
+    def student_task(username, student_seed):
+        VirtualStudent(username, school, make_transport(), recorder, think=think, rng=random.Random(student_seed)).run()
+
+    arrivals = sorted((rng.uniform(0, ramp_up), username) for username in school.usernames)
+    recorder.started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset, username in arrivals:
+            # students arrive spread over the ramp-up; beyond `concurrency` they queue for a slot
+            time.sleep(max(0.0, recorder.started + offset - time.time()))
+            pool.submit(student_task, username, rng.random())
+    recorder.finished = time.time()
+    flush_audit_log()  # queued audit rows belong to the seeded users, write them before teardown
+
+    config = {
+        "students": len(school.usernames),
+        "questions": len(school.questions),
+        "concurrency": concurrency,
+        "ramp_up_s": ramp_up,
+        "think_s": list(think),
+        "transport": "http" if base_url else "inprocess",
+        "target": base_url or host,
+        "database": connection.vendor,
+    }
+    return build_report(recorder, config)
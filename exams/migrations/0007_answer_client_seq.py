@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_remove_studentquizattempt_total_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='client_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
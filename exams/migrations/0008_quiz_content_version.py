@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_answer_client_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
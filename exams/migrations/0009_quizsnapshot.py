@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0008_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('payload', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='exams.quiz')),
+            ],
+            options={
+                'unique_together': {('quiz', 'version')},
+            },
+        ),
+    ]
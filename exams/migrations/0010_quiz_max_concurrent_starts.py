@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_quizsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='max_concurrent_starts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
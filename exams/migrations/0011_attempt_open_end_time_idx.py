@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_quiz_max_concurrent_starts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentquizattempt',
+            index=models.Index(fields=['is_submitted', 'end_time'], name='attempt_open_end_time_idx'),
+        ),
+    ]
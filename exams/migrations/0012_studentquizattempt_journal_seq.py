@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_attempt_open_end_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentquizattempt',
+            name='journal_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_studentquizattempt_journal_seq'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentDashboardSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_attempts', models.PositiveIntegerField(default=0)),
+                ('auto_graded_count', models.PositiveIntegerField(default=0)),
+                ('pending_subjectives', models.PositiveIntegerField(default=0)),
+                ('attempts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill(apps, schema_editor):
+    StudentQuizAttempt = apps.get_model("exams", "StudentQuizAttempt")
+    LeaderboardEntry = apps.get_model("exams", "LeaderboardEntry")
+    totals = {}
+    rows = (
+        StudentQuizAttempt.objects.filter(is_submitted=True)
+        .values("student_id", "student__student_class_id", "quiz__subject_id")
+        .annotate(total=Sum("score"), count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        for key in (
+            ("global", 0, row["student_id"]),
+            ("class", row["student__student_class_id"] or 0, row["student_id"]),
+            ("subject", row["quiz__subject_id"], row["student_id"]),
+        ):
+            entry = totals.setdefault(key, [0.0, 0])
+            entry[0] += float(row["total"] or 0.0)
+            entry[1] += row["count"]
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(scope=scope, scope_id=scope_id, student_id=student_id,
+                         total_score=total, attempt_count=count, avg_score=total / count if count else 0.0)
+        for (scope, scope_id, student_id), (total, count) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_userevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('class', 'Class'), ('subject', 'Subject')], max_length=10)),
+                ('scope_id', models.PositiveIntegerField(default=0)),
+                ('total_score', models.FloatField(default=0.0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('avg_score', models.FloatField(default=0.0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'scope_id', '-avg_score'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'scope_id', 'student'), name='leaderboard_unique_entry')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
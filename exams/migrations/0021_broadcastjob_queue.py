@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0020_quizimportrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='action_type',
+            field=models.CharField(default='Broadcast', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='is_broadcast',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='recipients',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='role',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
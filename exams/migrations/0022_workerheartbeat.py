@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0021_broadcastjob_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(max_length=50, unique=True)),
+                ('seen_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0022_workerheartbeat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizimportrecord',
+            name='digest',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizimportrecord',
+            unique_together={('imported_by', 'digest')},
+        ),
+    ]
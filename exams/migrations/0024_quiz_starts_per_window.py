@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0023_quizimportrecord_per_importer'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='quiz',
+            old_name='max_concurrent_starts',
+            new_name='starts_per_window',
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0025_actionlog_anonymous_user'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BroadcastJob',
+        ),
+    ]
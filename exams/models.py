@@ -33,6 +33,8 @@ class Quiz(models.Model):
     is_published = models.BooleanField(default=False)
     allow_retake = models.BooleanField(default=False)  # if true, students can ret
     max_retake_count = models.PositiveIntegerField(default=0)  # 0 = unlimited if allow_retake is True
+    content_version = models.PositiveIntegerField(default=1)  # bumped whenever questions/choices change
+    starts_per_window = models.PositiveIntegerField(default=0)  # rate limit: new attempts admitted per window, 0 = EXAM_STARTS_PER_WINDOW
 
     def __str__(self):
         return f"{self.title} ({self.subject})"
@@ -40,6 +42,11 @@ class Quiz(models.Model):
     def total_marks(self):
         return sum(q.marks for q in self.questions.all())
 
+    def bump_content_version(self):
+        """Atomically increment content_version and refresh it on this instance."""
+        Quiz.objects.filter(pk=self.pk).update(content_version=models.F("content_version") + 1)
+        self.refresh_from_db(fields=["content_version"])
+
 
 
 class Question(models.Model):
@@ -67,6 +74,20 @@ class Choice(models.Model):
         return f"{self.text} ({'Correct' if self.is_correct else 'Wrong'})"
 
 
+class QuizSnapshot(models.Model):
+    """Immutable serialized copy of a quiz's content (no correctness flags) for one content_version."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="snapshots")
+    version = models.PositiveIntegerField()
+    payload = models.TextField()  # JSON: quiz meta + questions + choices
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("quiz", "version")
+
+    def __str__(self):
+        return f"{self.quiz} v{self.version}"
+
+
 class StudentQuizAttempt(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     quiz = models.ForeignKey("Quiz", on_delete=models.CASCADE)
@@ -80,7 +101,13 @@ class StudentQuizAttempt(models.Model):
     retake_count = models.PositiveIntegerField(default=0)  # how many times student retook
     is_retake_approved = models.BooleanField(default=False)
     retake_requested = models.BooleanField(default=False)
+    journal_seq = models.PositiveBigIntegerField(default=0)  # highest answer-journal seq merged from the client
 
+    class Meta:
+        indexes = [
+            # deadline sweeps: unsubmitted attempts ordered by expiry
+            models.Index(fields=["is_submitted", "end_time"], name="attempt_open_end_time_idx"),
+        ]
 
     def can_resume(self):
         """Allow resume if attempt still within time and not submitted."""
@@ -105,6 +132,7 @@ class Answer(models.Model):
     graded_at = models.DateTimeField(auto_now_add=True)
     feedback = models.TextField(blank=True, null=True)
     is_pending = models.BooleanField(default=True)  # True for subjective until graded
+    client_seq = models.PositiveBigIntegerField(default=0)  # last autosave sequence applied (drops stale saves)
 
     @classmethod
     def objective_score(cls, attempt):
@@ -123,6 +151,20 @@ class Answer(models.Model):
             is_pending=False
         ).aggregate(total=models.Sum("score"))["total"] or 0
 
+    @classmethod
+    def score_totals(cls, attempt):
+        """Return (objective, graded subjective) totals in a single conditional aggregate."""
+        return cls.score_totals_for([attempt.pk]).get(attempt.pk, (0.0, 0.0))
+
+    @classmethod
+    def score_totals_for(cls, attempt_ids):
+        """Return {attempt_id: (objective, graded subjective)} for many attempts in one query."""
+        rows = cls.objects.filter(attempt_id__in=attempt_ids).values("attempt_id").annotate(
+            objective=models.Sum("score", filter=models.Q(question__question_type="objective")),
+            subjective=models.Sum("score", filter=models.Q(question__question_type="subjective", is_pending=False)),
+        ).order_by()
+        return {r["attempt_id"]: (float(r["objective"] or 0), float(r["subjective"] or 0)) for r in rows}
+
     @classmethod
     def total_score(cls, attempt):
         """Return grand total (objective + graded subjective)."""
@@ -134,6 +176,159 @@ class Answer(models.Model):
 
 
 
+class StudentDashboardSummary(models.Model):
+    """Precomputed student dashboard data, refreshed on submit, grading and retakes (see exams.dashboard)."""
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="dashboard_summary")
+    total_attempts = models.PositiveIntegerField(default=0)
+    auto_graded_count = models.PositiveIntegerField(default=0)
+    pending_subjectives = models.PositiveIntegerField(default=0)
+    attempts = models.JSONField(default=dict)  # attempt id -> past-attempt row
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard summary for {self.student}"
+
+
+class ChangeCounter(models.Model):
+    """Version number per data scope, bumped after every change to it (see exams.changes)."""
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+class LeaderboardEntry(models.Model):
+    """Running score total/count of one student on one leaderboard (see exams.leaderboard)."""
+    GLOBAL = "global"
+    CLASS = "class"
+    SUBJECT = "subject"
+    SCOPE_CHOICES = ((GLOBAL, "Global"), (CLASS, "Class"), (SUBJECT, "Subject"))
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    scope_id = models.PositiveIntegerField(default=0)  # class/subject id; 0 for global (and students without a class)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    total_score = models.FloatField(default=0.0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    avg_score = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "scope_id", "student"], name="leaderboard_unique_entry"),
+        ]
+        indexes = [
+            # top-N per board
+            models.Index(fields=["scope", "scope_id", "-avg_score"], name="leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.scope_id} {self.student_id} avg {self.avg_score:.2f}"
+
+
+class ReportJob(models.Model):
+    """One requested PDF report, rendered by the report worker (see exams.report_jobs)."""
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+    KIND_CHOICES = (
+        ("class", "Class report"),
+        ("class_range", "Class report (date range)"),
+        ("student", "Student report"),
+        ("student_results", "Student results"),
+        ("quiz", "Exam report"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    cache_key = models.CharField(max_length=64, db_index=True)  # hash of kind, params and data version
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="report_jobs")
+    filename = models.CharField(max_length=255)  # download name
+    artifact = models.CharField(max_length=255, blank=True)  # path under MEDIA_ROOT once rendered
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker claims the oldest queued job
+            models.Index(fields=["status", "created_at"], name="report_job_queue_idx"),
+        ]
+
+    def progress(self):
+        if self.status == "done":
+            return 100.0
+        return round(100.0 * self.done / self.total, 1) if self.total else 0.0
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "filename": self.filename,
+            "total": self.total,
+            "done": self.done,
+            "progress": self.progress(),
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+
+class WorkerHeartbeat(models.Model):
+    """When a background worker last showed it was alive, per queue (see exams.report_jobs)."""
+    queue = models.CharField(max_length=50, unique=True)
+    seen_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.queue} worker seen {self.seen_at}"
+
+
+class QuizImportRecord(models.Model):
+    """Outcome of importing one exam workbook or sheet; a bulk import skips sources already imported (see exams.bulk_import)."""
+    STATUS_CHOICES = (
+        ("imported", "Imported"),
+        ("failed", "Failed"),
+    )
+
+    digest = models.CharField(max_length=64)  # sha256 of the sheet's cell values (of the file, if unreadable)
+    source = models.CharField(max_length=255)  # file name, with the sheet for multi-sheet workbooks
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True, related_name="import_records")
+    errors = models.JSONField(default=list, blank=True)  # per-row problems when failed
+    imported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="quiz_imports")
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # each importer resumes their own imports; someone else importing the same sheet gets their own exam
+        unique_together = ("imported_by", "digest")
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+class UserEvent(models.Model):
+    """Push event for one user or one broadcast audience, relayed to every worker by the database events backend (see exams.events)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="push_events")
+    group = models.CharField(max_length=100, blank=True, db_index=True)  # audience channel when user is empty
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.event_type} for {self.user_id} #{self.id}"
+
+
 # class ActionLog(models.Model):
 #     """Log significant actions performed by admins/teachers for audit"""
 #     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
@@ -158,7 +353,7 @@ class ActionLog(models.Model):
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
     )
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="action_logs")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="action_logs")  # None: anonymous
     action_type = models.CharField(max_length=50, choices=ACTION_TYPES)
     description = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
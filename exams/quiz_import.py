@@ -0,0 +1,294 @@
+"""
+Exam import from Excel, in the download_excel_template format:
+
+  - rows 1-8: metadata, key in column A and value in column B (exam_title, class_name,
+    subject_name, start_time, end_time, duration_minutes, is_published)
+  - a header row whose first cell is question_text (row 9 if there is none), then one
+    question per row: question_text | question_type | marks | choice_1 |
+    choice_1_correct (0/1) | choice_2 | choice_2_correct | ...
+
+The workbook is read in read-only mode, row by row as plain values. The whole sheet is
+validated before anything is written and every problem is reported with its row, so a
+sheet is fixed in one go. A valid sheet is then saved in one transaction with bulk
+inserts (the exam, then its questions, then their choices mapped to the questions' ids).
+
+parse_sheet() does no database access (the class and subject are only named), so sheets
+can be parsed anywhere, e.g. in worker processes; Catalog resolves the names.
+"""
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import Choice, Class, Question, Quiz, Subject
+
+
+META_ROWS = 8
+HEADER_SEARCH_ROWS = 29
+DEFAULT_HEADER_ROW = 9
+HEADER_NAMES = ("question_text", "question", "q_text")
+TITLE_KEYS = ("exam_title", "quiz_title", "title")
+QUESTION_TYPES = ("objective", "subjective")
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n", "")
+MAX_REPORTED_ERRORS = 200
+
+
+class ParsedQuiz:
+    """One sheet's exam: metadata, questions (each with its choices) and the problems found."""
+
+    def __init__(self, sheet_name=None):
+        self.sheet_name = sheet_name
+        self.meta = {}  # title, class_name, subject_name, start_time, end_time, duration_minutes, is_published
+        self.meta_rows = {}  # metadata key -> sheet row, for error reports
+        self.questions = []  # {"row", "text", "question_type", "marks", "choices": [{"text", "is_correct"}]}
+        self.errors = []  # {"row", "field", "error"}
+        self.truncated = False
+
+    def error(self, row, field, message):
+        if len(self.errors) >= MAX_REPORTED_ERRORS:
+            self.truncated = True
+            return
+        self.errors.append({"row": row, "field": field, "error": message})
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def report(self):
+        """The per-row error report, as returned to clients."""
+        return {"errors": self.errors, "truncated": self.truncated}
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _flag(value):
+    text = _text(value).lower()
+    if value is True or text in TRUE_VALUES:
+        return True
+    if value is False or text in FALSE_VALUES:
+        return False
+    return None
+
+
+def _int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(_text(value))
+    except ValueError:
+        return None
+
+
+def parse_datetime(value):
+    """An aware datetime from an Excel datetime or 'DD-MM-YYYY HH:MM' / ISO text; None if unreadable."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    text = _text(value).replace("T", " ")
+    for parse in (lambda s: datetime.strptime(s, "%d-%m-%Y %H:%M"), datetime.fromisoformat):
+        try:
+            parsed = parse(text)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    return None
+
+
+def _parse_meta(parsed, raw):
+    """raw: metadata key -> (row, value)."""
+    def value(*keys):
+        for key in keys:
+            if key in raw:
+                return raw[key]
+        return (None, None)
+
+    meta, meta_rows = parsed.meta, parsed.meta_rows
+    for field, keys in (("title", TITLE_KEYS), ("class_name", ("class_name",)), ("subject_name", ("subject_name",))):
+        row, val = value(*keys)
+        meta[field], meta_rows[field] = _text(val), row
+        if not meta[field]:
+            parsed.error(row, keys[0], f"{keys[0]} is required")
+
+    for field in ("start_time", "end_time"):
+        row, val = value(field)
+        meta[field], meta_rows[field] = parse_datetime(val), row
+        if meta[field] is None:
+            parsed.error(row, field, f"{field} must be an Excel date/time or 'DD-MM-YYYY HH:MM'")
+    if meta["start_time"] and meta["end_time"] and meta["end_time"] <= meta["start_time"]:
+        parsed.error(meta_rows["end_time"], "end_time", "end_time must be after start_time")
+
+    row, val = value("duration_minutes", "duration")
+    meta["duration_minutes"] = 30 if _text(val) == "" else _int(val)
+    if meta["duration_minutes"] is None or meta["duration_minutes"] <= 0:
+        parsed.error(row, "duration_minutes", "duration_minutes must be a positive whole number")
+
+    row, val = value("is_published")
+    meta["is_published"] = _flag(val)
+    if meta["is_published"] is None:
+        parsed.error(row, "is_published", "is_published must be True or False")
+
+
+def _parse_question(parsed, row_number, row):
+    text = _text(row[0] if row else None)
+    cells = list(row[1:]) + [None, None]
+    if not text:
+        parsed.error(row_number, "question_text", "question_text is required")
+        return
+
+    question_type = _text(cells[0]).lower() or "objective"
+    if question_type not in QUESTION_TYPES:
+        parsed.error(row_number, "question_type", f"question_type must be one of: {', '.join(QUESTION_TYPES)}")
+    marks = 1 if _text(cells[1]) == "" else _int(cells[1])
+    if marks is None or marks <= 0:
+        parsed.error(row_number, "marks", "marks must be a positive whole number")
+
+    # choices from column D, in text/correct pairs, up to the first empty choice text
+    choices = []
+    bad_flags = False
+    pairs = cells[2:]
+    for index in range(0, len(pairs) - 1, 2):
+        choice_text, flag = _text(pairs[index]), pairs[index + 1]
+        if not choice_text:
+            break
+        number = index // 2 + 1
+        is_correct = _flag(flag)
+        if is_correct is None:
+            bad_flags = True
+            parsed.error(row_number, f"choice_{number}_correct", "must be 1 (correct) or 0")
+        choices.append({"text": choice_text, "is_correct": bool(is_correct)})
+
+    if question_type == "objective":
+        if not choices:
+            parsed.error(row_number, "choice_1", "an objective question needs choices")
+        elif not bad_flags and not any(c["is_correct"] for c in choices):
+            parsed.error(row_number, "choice_1_correct", "an objective question needs at least one correct choice")
+    else:
+        choices = []  # free-text questions have no choices
+
+    parsed.questions.append({
+        "row": row_number, "text": text, "question_type": question_type, "marks": marks, "choices": choices,
+    })
+
+
+def parse_sheet(rows, sheet_name=None):
+    """Parse and validate a sheet given as an iterable of row value tuples (no database access)."""
+    parsed = ParsedQuiz(sheet_name)
+    rows = iter(rows)
+
+    # the metadata and header are within the first rows; only those are held in memory
+    head = []
+    for row in rows:
+        head.append(row)
+        if len(head) >= HEADER_SEARCH_ROWS:
+            break
+    header_row = DEFAULT_HEADER_ROW
+    for number, row in enumerate(head, 1):
+        if row and _text(row[0]).lower() in HEADER_NAMES:
+            header_row = number
+            break
+
+    raw_meta = {}
+    for number, row in enumerate(head[:min(META_ROWS, header_row - 1)], 1):
+        key = _text(row[0] if row else None).lower()
+        if key:
+            raw_meta[key] = (number, row[1] if len(row) > 1 else None)
+    _parse_meta(parsed, raw_meta)
+
+    def question_rows():
+        yield from enumerate(head[header_row:], header_row + 1)
+        yield from enumerate(rows, len(head) + 1)
+
+    for number, row in question_rows():
+        if not any(_text(value) for value in row):
+            continue  # blank rows (read-only sheets often end in a few)
+        _parse_question(parsed, number, row)
+
+    if not parsed.questions:
+        parsed.error(header_row + 1, "question_text", "the sheet has no questions")
+    return parsed
+
+
+def open_workbook(file):
+    """A read-only workbook (values, not formulas) for a path or uploaded file."""
+    return load_workbook(filename=file, read_only=True, data_only=True)
+
+
+def parse_workbook(file):
+    """Parse the first sheet of an Excel file."""
+    wb = open_workbook(file)
+    try:
+        sheet = wb.active
+        return parse_sheet(sheet.iter_rows(values_only=True), sheet.title)
+    finally:
+        wb.close()
+
+
+class Catalog:
+    """Case-insensitive class and subject lookup by name, loaded in two queries and reused."""
+
+    def __init__(self):
+        self.classes = {c.name.strip().lower(): c for c in Class.objects.all()}
+        self.subjects = {
+            (s.school_class_id, s.name.strip().lower()): s for s in Subject.objects.all()
+        }
+
+    def resolve(self, parsed):
+        """(class, subject) for a parsed sheet, recording an error on it for any that is unknown."""
+        meta, rows = parsed.meta, parsed.meta_rows
+        school_class = self.classes.get(meta["class_name"].lower()) if meta.get("class_name") else None
+        if meta.get("class_name") and school_class is None:
+            parsed.error(rows["class_name"], "class_name", f"Class '{meta['class_name']}' not found")
+        subject = None
+        if school_class is not None and meta.get("subject_name"):
+            subject = self.subjects.get((school_class.id, meta["subject_name"].lower()))
+            if subject is None:
+                parsed.error(
+                    rows["subject_name"], "subject_name",
+                    f"Subject '{meta['subject_name']}' not found for class {school_class.name}",
+                )
+        return school_class, subject
+
+
+def save_quiz(parsed, school_class, subject, user):
+    """Create the exam of a valid parsed sheet with its questions and choices, all or nothing."""
+    meta = parsed.meta
+    with transaction.atomic():
+        quiz = Quiz.objects.create(
+            title=meta["title"], school_class=school_class, subject=subject, created_by=user,
+            start_time=meta["start_time"], end_time=meta["end_time"],
+            duration_minutes=meta["duration_minutes"], is_published=meta["is_published"],
+        )
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=q["text"], question_type=q["question_type"], marks=q["marks"])
+            for q in parsed.questions
+        ], batch_size=500)
+        if questions and questions[0].pk is None:
+            # backends that don't return ids from bulk inserts: they were inserted in order
+            questions = list(Question.objects.filter(quiz=quiz).order_by("id"))
+        Choice.objects.bulk_create([
+            Choice(question=question, text=c["text"], is_correct=c["is_correct"])
+            for question, q in zip(questions, parsed.questions)
+            for c in q["choices"]
+        ], batch_size=500)
+    return quiz
+
+
+def import_workbook(file, user, catalog=None):
+    """
+    Parse, validate and (if valid) save the exam in an Excel file. Returns (quiz, parsed):
+    quiz is None when the sheet had problems, which are listed in parsed.errors.
+    """
+    parsed = parse_workbook(file)
+    school_class, subject = (catalog or Catalog()).resolve(parsed)
+    if not parsed.ok:
+        return None, parsed
+    return save_quiz(parsed, school_class, subject, user), parsed
@@ -0,0 +1,133 @@
+"""
+Report data: everything one report shows, loaded in a fixed number of queries however
+many students, attempts or answers it covers, and grouped in memory into plain dicts and
+lists for the renderers in exams.reports (which then run no queries of their own, and
+whose worker processes get picklable rows).
+"""
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .models import Answer, Class, Quiz, StudentQuizAttempt
+
+
+User = get_user_model()
+
+STUDENT_FIELDS = ("id", "username", "first_name", "last_name", "profile_picture")
+ATTEMPT_FIELDS = ("id", "student_id", "quiz__title", "quiz__subject__name", "score", "started_at", "submitted_at")
+ANSWER_FIELDS = ("attempt_id", "question__text", "selected_choice__text", "text_answer", "score", "feedback")
+
+
+def date_filter(start_date=None, end_date=None):
+    """Attempt filter for a YYYY-MM-DD date range (either end optional), both days included."""
+    filters = {}
+    if start_date:
+        filters["submitted_at__gte"] = timezone.make_aware(datetime.strptime(start_date, "%Y-%m-%d"))
+    if end_date:
+        day_after = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        filters["submitted_at__lt"] = timezone.make_aware(day_after)
+    return filters
+
+
+def _photo_path(name):
+    if not name:
+        return None
+    return User._meta.get_field("profile_picture").storage.path(name)
+
+
+def _student(row, prefix=""):
+    first, last = row[f"{prefix}first_name"], row[f"{prefix}last_name"]
+    full_name = f"{first} {last}".strip()
+    return {
+        "id": row[f"{prefix}id"],
+        "username": row[f"{prefix}username"],
+        "full_name": full_name,
+        "name": full_name or row[f"{prefix}username"],
+        "photo_path": _photo_path(row.get(f"{prefix}profile_picture")),
+        "attempts": [],
+    }
+
+
+def _attempt(row):
+    return {
+        "id": row["id"],
+        "title": row["quiz__title"],
+        "subject": row["quiz__subject__name"],
+        "score": row["score"],
+        "started_at": row["started_at"],
+        "submitted_at": row["submitted_at"],
+        "answers": [],
+    }
+
+
+def _answer(row):
+    return {
+        "question": row["question__text"],
+        "answer": row["selected_choice__text"] or row["text_answer"] or "-",
+        "score": row["score"],
+        "feedback": row["feedback"] or "",
+    }
+
+
+def _attach_answers(attempts, answers):
+    by_attempt = {a["id"]: a for a in attempts}
+    for row in answers.values(*ANSWER_FIELDS).order_by("attempt_id", "id"):
+        attempt = by_attempt.get(row["attempt_id"])
+        if attempt is not None:
+            attempt["answers"].append(_answer(row))
+
+
+def class_report(class_id, start_date=None, end_date=None):
+    """
+    {"class_name", "students": [student with "attempts"]} for every student of the class
+    (3 queries). With dates only attempts submitted in the range are included.
+    """
+    class_name = Class.objects.values_list("name", flat=True).get(id=class_id)
+    students = [
+        _student(row)
+        for row in User.objects.filter(role="student", student_class_id=class_id).order_by("pk").values(*STUDENT_FIELDS)
+    ]
+    by_id = {s["id"]: s for s in students}
+    attempts = (
+        StudentQuizAttempt.objects.filter(student__role="student", student__student_class_id=class_id, **date_filter(start_date, end_date))
+        .order_by("student_id", "id").values(*ATTEMPT_FIELDS)
+    )
+    for row in attempts:
+        by_id[row["student_id"]]["attempts"].append(_attempt(row))
+    return {"class_name": class_name, "students": students}
+
+
+def student_report(student_id):
+    """{"student" (with "attempts"), "class_name", "total_students"} for one student (3 queries)."""
+    row = User.objects.filter(id=student_id, role="student").values(*STUDENT_FIELDS, "student_class_id", "student_class__name").get()
+    student = _student(row)
+    total_students = User.objects.filter(role="student", student_class_id=row["student_class_id"]).count()
+    student["attempts"] = [
+        _attempt(a) for a in StudentQuizAttempt.objects.filter(student_id=student_id).order_by("id").values(*ATTEMPT_FIELDS)
+    ]
+    return {"student": student, "class_name": row["student_class__name"], "total_students": total_students}
+
+
+def student_results(student_id):
+    """{"student" (None if unknown), "attempts": [attempt with "answers"]} (3 queries)."""
+    row = User.objects.filter(id=student_id).values(*STUDENT_FIELDS).first()
+    attempts = [
+        _attempt(a) for a in StudentQuizAttempt.objects.filter(student_id=student_id).order_by("id").values(*ATTEMPT_FIELDS)
+    ]
+    _attach_answers(attempts, Answer.objects.filter(attempt__student_id=student_id))
+    return {"student": _student(row) if row else None, "attempts": attempts}
+
+
+def quiz_report(quiz_id):
+    """{"title", "attempts": [attempt with "student" and "answers"]} for every attempt at an exam (3 queries)."""
+    title = Quiz.objects.values_list("title", flat=True).get(id=quiz_id)
+    student_fields = [f"student__{f}" for f in STUDENT_FIELDS] + ["student__student_class__name"]
+    attempts = []
+    for row in StudentQuizAttempt.objects.filter(quiz_id=quiz_id).order_by("id").values(*ATTEMPT_FIELDS, *student_fields):
+        attempt = _attempt(row)
+        attempt["student"] = _student(row, prefix="student__")
+        attempt["student"]["class_name"] = row["student__student_class__name"]
+        attempts.append(attempt)
+    _attach_answers(attempts, Answer.objects.filter(attempt__quiz_id=quiz_id))
+    return {"title": title, "attempts": attempts}
@@ -0,0 +1,224 @@
+"""
+Report jobs: PDF reports are rendered by a worker (`manage.py run_report_worker`),
+not inside the request that asks for them.
+
+request_report() records a ReportJob and returns it; the client follows its progress
+through the report job endpoint and downloads the file when it is done. The rendered
+PDF is stored under MEDIA_ROOT/REPORTS_DIR, named by a cache key hashed from the
+report kind, its parameters and the data version (the change counters of the data a
+report shows: students, classes, exams and the attempts of the students in it). Asking again while nothing has changed is answered from that file
+without rendering; once anything changes the key does too and the report is rendered
+afresh. The worker records a heartbeat as it polls and renders; while none has been
+seen for REPORT_WORKER_TIMEOUT_SECONDS (no worker is running) jobs are rendered in the
+request instead, as they always are with REPORT_JOBS_INLINE (e.g. in development), and
+a job left queued is rendered when its status is next asked for.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ReportJob, WorkerHeartbeat
+from . import changes, reports
+from .dashboard import attempt_students
+
+
+logger = logging.getLogger(__name__)
+
+# every report shows students, classes/subjects and exams, plus the attempts of its students
+DATA_SCOPES = (changes.USERS, changes.CATALOG, changes.QUIZZES)
+QUEUE = "reports"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def report_students(params):
+    """Ids of the students whose attempts a report with these parameters shows."""
+    if "student_id" in params:
+        return {params["student_id"]}
+    if "class_id" in params:
+        return set(get_user_model().objects.filter(role="student", student_class_id=params["class_id"]).values_list("pk", flat=True))
+    if "quiz_id" in params:
+        return attempt_students(quiz_id=params["quiz_id"])
+    return set()
+
+
+def data_version(params):
+    scopes = [*DATA_SCOPES, *changes.student_scopes(report_students(params))]
+    versions = changes.current_versions(scopes)
+    return ".".join(f"{scope}={versions[scope]}" for scope in scopes)
+
+
+def cache_key(kind, params):
+    raw = json.dumps({"kind": kind, "params": params, "version": data_version(params)}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def artifact_name(key):
+    return os.path.join(_setting("REPORTS_DIR", "reports"), f"{key}.pdf")
+
+
+def artifact_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def _cached_artifact(key):
+    """Path (under MEDIA_ROOT) of an already rendered report for this key, if its file is still there."""
+    names = (
+        ReportJob.objects.filter(cache_key=key, status="done")
+        .exclude(artifact="").values_list("artifact", flat=True)
+    )
+    for name in names[:1]:
+        if os.path.exists(artifact_path(name)):
+            return name
+    return None
+
+
+def request_report(user, kind, params, filename):
+    """
+    The job answering user's request for a report: done at once (with no rendering) when
+    the same report was rendered since the data last changed, otherwise queued for the
+    worker. Repeated requests for a report that is still queued get the same job.
+    """
+    key = cache_key(kind, params)
+    pending = ReportJob.objects.filter(cache_key=key, requested_by=user, status__in=("queued", "running")).first()
+    if pending is not None:
+        return pending
+
+    job = ReportJob(kind=kind, params=params, cache_key=key, requested_by=user, filename=filename)
+    cached = _cached_artifact(key)
+    if cached:
+        job.status, job.artifact, job.finished_at = "done", cached, timezone.now()
+    job.save()
+    return run_unserved(job)
+
+
+def run_unserved(job):
+    """Render a queued job in this process when no worker will (REPORT_JOBS_INLINE, or none running)."""
+    if job.status != "queued" or not (_setting("REPORT_JOBS_INLINE", False) or not worker_alive()):
+        return job
+    claimed = claim(job.pk)
+    return run_job(claimed) if claimed is not None else job
+
+
+# ---- worker ----
+def heartbeat():
+    WorkerHeartbeat.objects.update_or_create(queue=QUEUE, defaults={"seen_at": timezone.now()})
+
+
+def worker_alive():
+    """Whether a worker has polled (or reported progress) within REPORT_WORKER_TIMEOUT_SECONDS."""
+    cutoff = timezone.now() - timezone.timedelta(seconds=_setting("REPORT_WORKER_TIMEOUT_SECONDS", 60))
+    return WorkerHeartbeat.objects.filter(queue=QUEUE, seen_at__gte=cutoff).exists()
+
+def claim(job_id):
+    """Mark a queued job running; None if another worker got there first."""
+    now = timezone.now()
+    if not ReportJob.objects.filter(pk=job_id, status="queued").update(status="running", started_at=now):
+        return None
+    return ReportJob.objects.get(pk=job_id)
+
+
+def claim_next():
+    """The oldest queued job, claimed for this worker (None when the queue is empty)."""
+    for job_id in ReportJob.objects.filter(status="queued").order_by("created_at").values_list("pk", flat=True)[:10]:
+        job = claim(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def _progress_writer(job, beat=False):
+    last = [0.0, time.monotonic()]  # last progress write, last heartbeat
+
+    def progress(done, total):
+        job.done, job.total = done, total
+        now = time.monotonic()
+        if done == total or now - last[0] >= 1:  # at most one write a second
+            last[0] = now
+            ReportJob.objects.filter(pk=job.pk).update(done=done, total=total)
+        if beat and now - last[1] >= 10:  # a worker on a long report still counts as running
+            last[1] = now
+            heartbeat()
+
+    return progress
+
+
+def run_job(job, in_worker=False):
+    """Render a claimed job to its artifact (or reuse one rendered meanwhile) and record the outcome."""
+    name = _cached_artifact(job.cache_key) or artifact_name(job.cache_key)
+    path = artifact_path(name)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial_path = f"{path}.{os.getpid()}.part"
+            try:
+                reports.render(job.kind, job.params, partial_path, progress=_progress_writer(job, beat=in_worker))
+                os.replace(partial_path, path)  # readers never see a half-written file
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+    except Exception as exc:
+        logger.exception("Report job %s (%s) failed", job.pk, job.kind)
+        job.status, job.error = "failed", str(exc)
+    else:
+        job.status, job.artifact = "done", name
+    job.finished_at = timezone.now()
+    ReportJob.objects.filter(pk=job.pk).update(
+        status=job.status, artifact=job.artifact, error=job.error, done=job.done, total=job.total,
+        finished_at=job.finished_at,
+    )
+    return job
+
+
+def requeue_stale(seconds=None):
+    """Put back jobs left running longer than REPORT_JOB_TIMEOUT_SECONDS (their worker died)."""
+    seconds = seconds or _setting("REPORT_JOB_TIMEOUT_SECONDS", 1800)
+    cutoff = timezone.now() - timezone.timedelta(seconds=seconds)
+    return ReportJob.objects.filter(status="running", started_at__lt=cutoff).update(status="queued", started_at=None)
+
+
+def prune(seconds=None):
+    """Delete finished jobs older than REPORT_RETENTION_SECONDS and the files no newer job uses."""
+    seconds = seconds or _setting("REPORT_RETENTION_SECONDS", 7 * 24 * 3600)
+    cutoff = timezone.now() - timezone.timedelta(seconds=seconds)
+    old = ReportJob.objects.filter(status__in=("done", "failed"), created_at__lt=cutoff)
+    names = set(old.exclude(artifact="").values_list("artifact", flat=True))
+    deleted, _ = old.delete()
+    for name in names - set(ReportJob.objects.filter(artifact__in=names).values_list("artifact", flat=True)):
+        try:
+            os.remove(artifact_path(name))
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def work(once=False, sleep=None):
+    """Worker loop: render queued jobs until interrupted (or until the queue is empty, with once)."""
+    sleep = sleep or _setting("REPORT_WORKER_POLL_SECONDS", 2)
+    last_housekeeping = 0.0
+    last_beat = 0.0
+    while True:
+        if time.monotonic() - last_beat >= 10:
+            last_beat = time.monotonic()
+            heartbeat()
+        if time.monotonic() - last_housekeeping >= 60:
+            last_housekeeping = time.monotonic()
+            requeue_stale()
+            prune()
+        job = claim_next()
+        if job is not None:
+            run_job(job, in_worker=True)
+            close_old_connections()
+            continue
+        if once:
+            return
+        time.sleep(sleep)
@@ -0,0 +1,131 @@
+"""
+Parallel rendering of class reports: each student's section is built into its own PDF
+chunk by a worker process and the chunks are concatenated in student order.
+
+Workers are spawned rather than forked (the web or report-worker process holds database
+connections and background threads) and set up Django and the report styles once each.
+The pool is kept for the life of the process, so only the first report pays for starting
+it. Workers get each student's rows as loaded by exams.report_data and run no queries.
+This module is what the workers unpickle, so it imports no models at load time.
+"""
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_styles = None  # set in each worker process
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+_merge_checked = False
+_merge_available = False
+
+
+def _can_merge():
+    global _merge_checked, _merge_available
+    if not _merge_checked:
+        _merge_available = importlib.util.find_spec("pypdf") is not None
+        _merge_checked = True
+        if not _merge_available:
+            logger.warning("REPORT_WORKERS is above 1 but pypdf is not installed; class reports are rendered in-process")
+    return _merge_available
+
+
+def workers():
+    """
+    REPORT_WORKERS: processes per class report (0: one per core, 1: render in-process).
+    Parallel chunks are merged with pypdf; without it reports are rendered in-process.
+    """
+    count = getattr(settings, "REPORT_WORKERS", 1)
+    count = count if count > 0 else (os.cpu_count() or 1)
+    return count if count <= 1 or _can_merge() else 1
+
+
+def _init_worker():
+    global _styles
+    import django
+    django.setup()
+
+    from reportlab.lib.styles import getSampleStyleSheet
+    _styles = getSampleStyleSheet()
+
+
+def _render_class_chunk(path, class_name, student, total_students, dated):
+    """Worker: one student's section of a class report, written to path."""
+    from . import reports
+
+    reports._class_doc(path).build(
+        reports._class_student_section(_styles, student, class_name, total_students, dated)
+    )
+    return path
+
+
+def _get_pool(size):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=size, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+            )
+            _pool_size = size
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_pdfs(paths, out):
+    from pypdf import PdfWriter  # only needed when rendering in parallel
+
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    writer.write(out)
+    writer.close()
+
+
+def class_report(out, class_name, students, dated, workers, progress):
+    """Render a class report's student sections on up to workers processes and merge them into out."""
+    from reportlab.lib.styles import getSampleStyleSheet
+    from . import reports
+
+    total_students = len(students)
+    progress(0, total_students)
+    with tempfile.TemporaryDirectory(prefix="report-") as tmp:
+        paths = [os.path.join(tmp, f"{i:06d}.pdf") for i in range(total_students)]
+        pool = _get_pool(workers)
+        futures = [
+            pool.submit(_render_class_chunk, path, class_name, student, total_students, dated)
+            for path, student in zip(paths, students)
+        ]
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()  # re-raise a worker's failure
+                progress(done, total_students)
+        except BrokenProcessPool:
+            _discard_pool(pool)  # a worker died; start afresh next time
+            raise
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        if dated:
+            paths.append(os.path.join(tmp, "signature.pdf"))
+            reports._class_doc(paths[-1]).build([reports._signature(getSampleStyleSheet())])
+        merge_pdfs(paths, out)
@@ -0,0 +1,323 @@
+"""
+PDF report renderers. Each takes the output (a path or binary file) and the report's
+parameters, plus an optional progress(done, total) callback, and writes one PDF.
+They are run by the report worker (see exams.report_jobs), not inside requests.
+
+A report's data is loaded up front in a fixed number of queries (see exams.report_data)
+and the renderers work from those plain rows, so none of them queries per student,
+attempt or answer.
+
+Reports with a section per student or attempt are streamed through the layout: each
+section's flowables (tables, chart images) are built only when the previous section
+has been laid out and are dropped once they are on the page, so memory stays flat
+however big the class is. Pages are compressed as they are added to the document.
+"""
+import os
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
+
+from . import charts, images, report_data, report_pool
+
+
+def _no_progress(done, total):
+    pass
+
+
+class SectionFeed(list):
+    """
+    Flowables for doc.build(), pulled from an iterable of sections (lists of flowables)
+    one section at a time: build() lays out and removes flowables from the front of the
+    list, and the next section is fetched only when the list runs empty.
+    """
+
+    def __init__(self, sections):
+        super().__init__()
+        self._sections = iter(sections)
+
+    def __len__(self):
+        while not super().__len__():
+            section = next(self._sections, None)
+            if section is None:
+                break
+            self.extend(section)
+        return super().__len__()
+
+
+def _streamed_doc(out, **kwargs):
+    return SimpleDocTemplate(out, pagesize=A4, pageCompression=1, **kwargs)
+
+
+def _school_name(default="My School"):
+    return getattr(settings, "SCHOOL_NAME", default)
+
+
+def _student_header(styles, photo_path=None):
+    """Logo | school name | student photo, as used by the class and student reports."""
+    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'school_logo.png')
+    logo = images.report_image(logo_path, 1.2*inch, 1.2*inch) or Paragraph("", styles['Normal'])
+    student_photo = images.report_image(photo_path, 1.2*inch, 1.2*inch) or Paragraph("", styles['Normal'])
+
+    header_data = [
+        [logo, Paragraph(f"<b>{_school_name()}</b>", ParagraphStyle('centered', fontSize=16, alignment=1)), student_photo]
+    ]
+    header_table = Table(header_data, colWidths=[1.5*inch, 3.5*inch, 1.5*inch])
+    header_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    return header_table
+
+
+def _attempts_table(attempts, date_format, header_fontsize=None):
+    data = [["Exam Title", "Subject", "Score", "Date"]]
+    for attempt in attempts:
+        data.append([
+            attempt["title"],
+            attempt["subject"] or "—",
+            f"{attempt['score']}",
+            attempt["submitted_at"].strftime(date_format) if attempt["submitted_at"] else "—"
+        ])
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#003366")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ]
+    if header_fontsize:
+        style.append(('FONTSIZE', (0, 0), (-1, 0), header_fontsize))
+    style.append(('BOTTOMPADDING', (0, 0), (-1, 0), 8))
+    table = Table(data, colWidths=[160, 120, 80, 100])
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def _subject_chart(subjects, scores, color=None):
+    png = charts.bar_chart(subjects, scores, "Performance by Subject", figsize=(5, 2), color=color)
+    return Image(BytesIO(png), width=5.5*inch, height=2.2*inch)
+
+
+def _class_doc(out):
+    return _streamed_doc(out, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=30)
+
+
+def _class_student_section(styles, student, class_name, total_students, dated):
+    """One student's pages of a class report (student as loaded by report_data), ending with a page break."""
+    elements = [_student_header(styles, student["photo_path"]), Spacer(1, 12)]
+
+    # Student info
+    info_text = f"""
+    <b>Student Name:</b> {student["name"]}<br/>
+    <b>Class:</b> {class_name}<br/>
+    <b>Total Students in Class:</b> {total_students}
+    """
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    # Student attempts (already filtered by date for ranged reports)
+    attempts = student["attempts"]
+    if attempts:
+        graded = [a for a in attempts if a["subject"]]
+        subjects = [a["subject"] for a in graded]
+        scores = [a["score"] for a in graded]
+        elements.append(_subject_chart(subjects, scores, color="steelblue" if dated else None))
+        elements.append(Spacer(1, 12))
+        elements.append(_attempts_table(attempts, "%Y-%m-%d %H:%M"))
+    elif dated:
+        elements.append(Paragraph("<i>No Exam attempts found for this period.</i>", styles['Normal']))
+    else:
+        elements.append(Paragraph("<i>No Exam attempts yet.</i>", styles['Normal']))
+
+    # Add page break between students
+    elements.append(PageBreak())
+    return elements
+
+
+def _signature(styles):
+    signature_text = f"""
+    <br/><br/><br/>
+    ____________________________ <br/>
+    <b>Class Teacher / Admin Signature</b><br/>
+    Generated on: {timezone.now().strftime("%d-%m-%Y %H:%M")}
+    """
+    return Paragraph(signature_text, styles['Normal'])
+
+
+def class_report(out, class_id, start_date=None, end_date=None, dated=False, progress=None):
+    """
+    One section per student of the class: header, chart and attempt table. A dated report
+    lists only the attempts submitted between start_date and end_date (YYYY-MM-DD, both
+    optional) and closes with a signature block. With REPORT_WORKERS above 1 the student
+    sections are rendered in parallel (see exams.report_pool).
+    """
+    progress = progress or _no_progress
+    data = report_data.class_report(class_id, start_date, end_date)
+    students, class_name = data["students"], data["class_name"]
+    total_students = len(students)
+
+    workers = report_pool.workers()
+    if workers > 1 and total_students > 1:
+        return report_pool.class_report(out, class_name, students, dated, workers=workers, progress=progress)
+
+    styles = getSampleStyleSheet()
+
+    def sections():
+        progress(0, total_students)
+        for done, student in enumerate(students, 1):
+            yield _class_student_section(styles, student, class_name, total_students, dated)
+            progress(done, total_students)  # laid out by now
+        if dated:
+            yield [_signature(styles)]
+
+    _class_doc(out).build(SectionFeed(sections()))
+
+
+def student_report(out, student_id, progress=None):
+    """A student's header, performance chart and attempt table."""
+    progress = progress or _no_progress
+    data = report_data.student_report(student_id)
+    student = data["student"]
+    attempts = student["attempts"]
+    progress(0, 1)
+
+    doc = SimpleDocTemplate(out, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=30)
+    styles = getSampleStyleSheet()
+    elements = [_student_header(styles, student["photo_path"]), Spacer(1, 12)]
+
+    info_text = f"""
+    <b>Student Name:</b> {student["name"]}<br/>
+    <b>Class:</b> {data["class_name"] or 'N/A'}<br/>
+    <b>Total Students in Class:</b> {data["total_students"]}
+    """
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    # Performance chart
+    subjects = []
+    scores = []
+    for attempt in attempts:
+        if attempt["subject"]:
+            subjects.append(attempt["subject"])
+            scores.append(attempt["score"] or 0.0)
+
+    if subjects:
+        png = charts.bar_chart(
+            subjects, scores, "Student Performance by Subject", figsize=(6, 2), color='#2a9df4',
+            xlabel="Subject", ylabel="Score",
+        )
+        elements.append(Image(BytesIO(png), width=5.5*inch, height=4.5*inch))
+        elements.append(Spacer(1, 20))
+
+    # Attempt table
+    elements.append(Paragraph("<b>Exam Attempt Details</b>", styles['Heading3']))
+    elements.append(Spacer(1, 8))
+    if not attempts:
+        elements.append(Paragraph("No Exam attempts yet.", styles['Normal']))
+    else:
+        elements.append(_attempts_table(attempts, "%d-%m-%Y %H:%M", header_fontsize=11))
+
+    doc.build(elements)
+    progress(1, 1)
+
+
+def _answers_table(answers):
+    data = [["Question", "Answer", "Marks", "Feedback"]]
+    for ans in answers:
+        data.append([ans["question"], ans["answer"], ans["score"], ans["feedback"]])
+
+    table = Table(data, colWidths=[200, 150, 60, 100])
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
+    ]))
+    return table
+
+
+def _title_header(styles, title, photo_path=None):
+    """Logo | school name and title | optional photo, as used by the results reports."""
+    school_logo = os.path.join(settings.MEDIA_ROOT, "school_logo.png")
+    header_data = [
+        [
+            images.report_image(school_logo, 50, 50) or "",
+            Paragraph(f"<b>{_school_name('My School Name')}</b><br/>{title}", styles["Title"]),
+            images.report_image(photo_path, 50, 50) or "",
+        ]
+    ]
+    header_table = Table(header_data, colWidths=[70, 350, 70])
+    header_table.setStyle(TableStyle([("ALIGN", (1, 0), (1, 0), "CENTER")]))
+    return header_table
+
+
+def student_results_report(out, student_id, progress=None):
+    """Every attempt of one student with its answers, marks and feedback."""
+    progress = progress or _no_progress
+    data = report_data.student_results(student_id)
+    attempts = data["attempts"]
+    total = len(attempts)
+    progress(0, total)
+
+    styles = getSampleStyleSheet()
+    student = data["student"] if total else None
+    title = " " + (student["full_name"] if student else "Unknown")
+
+    def sections():
+        yield [_title_header(styles, title, student["photo_path"] if student else None), Spacer(1, 20)]
+        for done, attempt in enumerate(attempts, 1):
+            yield [
+                Paragraph(f"<b>Exam:</b> {attempt['title']}", styles["Heading3"]),
+                Paragraph(f"Subject: {attempt['subject']}", styles["Normal"]),
+                Paragraph(f"Date: {attempt['started_at'].strftime('%d-%m-%Y %H:%M')}", styles["Normal"]),
+                _answers_table(attempt["answers"]),
+                Spacer(1, 15),
+            ]
+            progress(done, total)
+
+    _streamed_doc(out).build(SectionFeed(sections()))
+
+
+def quiz_report(out, quiz_id, progress=None):
+    """Every attempt at one exam with the student's answers, marks and feedback."""
+    progress = progress or _no_progress
+    data = report_data.quiz_report(quiz_id)
+    attempts = data["attempts"]
+    total = len(attempts)
+    progress(0, total)
+
+    styles = getSampleStyleSheet()
+
+    def sections():
+        yield [_title_header(styles, f"Exam Report: {data['title']}"), Spacer(1, 20)]
+        for done, attempt in enumerate(attempts, 1):
+            student = attempt["student"]
+            yield [
+                Paragraph(f"<b>Student:</b> {student['full_name']} ({student['class_name'] or 'N/A'})", styles["Heading3"]),
+                Paragraph(f"Date: {attempt['started_at'].strftime('%d-%m-%Y %H:%M')}", styles["Normal"]),
+                _answers_table(attempt["answers"]),
+                Spacer(1, 15),
+            ]
+            progress(done, total)
+
+    _streamed_doc(out).build(SectionFeed(sections()))
+
+
+# kind (ReportJob.kind) -> renderer
+RENDERERS = {
+    "class": class_report,
+    "class_range": partial(class_report, dated=True),
+    "student": student_report,
+    "student_results": student_results_report,
+    "quiz": quiz_report,
+}
+
+
+def render(kind, params, out, progress=None):
+    RENDERERS[kind](out, progress=progress, **params)
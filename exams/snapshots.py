@@ -0,0 +1,108 @@
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
+
+from .models import Question, QuizSnapshot
+
+
+class PublishedQuiz:
+    """Decoded snapshot kept in the process cache: raw payload, parsed data and rendered questions."""
+
+    def __init__(self, quiz_id, version, payload):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.payload = payload
+        self.data = json.loads(payload)
+        self._questions_html = None
+
+    @property
+    def etag(self):
+        return quiz_etag(self.quiz_id, self.version)
+
+    @property
+    def questions(self):
+        return self.data["questions"]
+
+    @property
+    def questions_html(self):
+        # questions markup is identical for every student, render it once per version
+        if self._questions_html is None:
+            self._questions_html = render_to_string(
+                "exams/partials/_quiz_questions.html", {"questions": self.questions}
+            )
+        return self._questions_html
+
+
+def quiz_etag(quiz_id, version):
+    return f'"quiz-{quiz_id}-v{version}"'
+
+
+def build_snapshot_payload(quiz):
+    """Serialize questions/choices for the take page. Correct flags are never included."""
+    type_display = dict(Question.QUESTION_TYPES)
+    questions = []
+    for q in Question.objects.filter(quiz=quiz).prefetch_related("choices").order_by("id"):
+        questions.append({
+            "id": q.id,
+            "text": q.text,
+            "type": q.question_type,
+            "type_display": type_display.get(q.question_type, q.question_type),
+            "marks": q.marks,
+            "choices": [{"id": c.id, "text": c.text} for c in q.choices.all()] if q.question_type == "objective" else [],
+        })
+    return json.dumps({
+        "quiz": {
+            "id": quiz.id,
+            "title": quiz.title,
+            "duration_minutes": quiz.duration_minutes,
+            "version": quiz.content_version,
+        },
+        "questions": questions,
+    }, separators=(",", ":"))
+
+
+# ---- process-local LRU of decoded snapshots ----
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_size():
+    return getattr(settings, "QUIZ_SNAPSHOT_CACHE_SIZE", 64)
+
+
+def _load_or_create(quiz):
+    snap = QuizSnapshot.objects.filter(quiz=quiz, version=quiz.content_version).only("payload").first()
+    if snap is not None:
+        return snap.payload
+
+    payload = build_snapshot_payload(quiz)
+    try:
+        with transaction.atomic():
+            QuizSnapshot.objects.create(quiz=quiz, version=quiz.content_version, payload=payload)
+    except IntegrityError:
+        # another worker published this version first; versions are immutable so use theirs
+        return QuizSnapshot.objects.get(quiz=quiz, version=quiz.content_version).payload
+    QuizSnapshot.objects.filter(quiz=quiz, version__lt=quiz.content_version).delete()
+    return payload
+
+
+def get_quiz_snapshot(quiz):
+    """Return the PublishedQuiz for quiz.content_version, building and storing it on first use."""
+    cache_key = (quiz.pk, quiz.content_version)
+    with _lock:
+        snap = _cache.get(cache_key)
+        if snap is not None:
+            _cache.move_to_end(cache_key)
+            return snap
+
+    snap = PublishedQuiz(quiz.pk, quiz.content_version, _load_or_create(quiz))
+    with _lock:
+        _cache[cache_key] = snap
+        _cache.move_to_end(cache_key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return snap
@@ -1,3 +1,1096 @@
-from django.test import TestCase
+import importlib.util
+import os
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from users.models import BroadcastMessage, Notification, UnreadCounter
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from PIL import Image as PILImage
+
+from . import (
+    admission, answer_key, audit, broadcast, bulk_import, charts, events, exports, grading, images, inbox, leaderboard,
+    loadsim, quiz_import, report_data, report_jobs, report_pool, reports,
+)
+from .autosave import merge_answer_journal
+from .models import (
+    ActionLog, Answer, Choice, Class, LeaderboardEntry, Question, Quiz, QuizImportRecord, ReportJob, StudentDashboardSummary,
+    StudentQuizAttempt, Subject, UserEvent, WorkerHeartbeat,
+)
+
+
+User = get_user_model()
+
+
+@override_settings(AUDIT_LOG_WRITE_BEHIND=False)
+class ExamTestCase(TestCase):
+    """A class with a teacher, a student and a published exam that is open now."""
+
+    def setUp(self):
+        answer_key.clear_answer_key_cache()  # test databases reuse exam ids
+        self.school_class = Class.objects.create(name="JSS1")
+        self.subject = Subject.objects.create(name="Maths", school_class=self.school_class)
+        self.teacher = User.objects.create_user("teacher", password="x", role="teacher", approved=True, student_class=self.school_class)
+        self.student = User.objects.create_user("student", password="x", role="student", approved=True, student_class=self.school_class)
+        now = timezone.now()
+        self.quiz = Quiz.objects.create(
+            school_class=self.school_class, subject=self.subject, title="Test 1", created_by=self.teacher,
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1), is_published=True,
+        )
+        self.objective = Question.objects.create(quiz=self.quiz, text="2+2", question_type="objective", marks=2)
+        self.wrong = Choice.objects.create(question=self.objective, text="3")
+        self.right = Choice.objects.create(question=self.objective, text="4", is_correct=True)
+        self.subjective = Question.objects.create(quiz=self.quiz, text="Explain", question_type="subjective", marks=5)
+        self.client.force_login(self.student)
+
+    def start_attempt(self):
+        return StudentQuizAttempt.objects.create(
+            student=self.student, quiz=self.quiz, end_time=timezone.now() + timedelta(minutes=30),
+        )
+
+
+class ReportDataQueryCountTests(TestCase):
+    """Report data is loaded in the same number of queries whatever the class size."""
+
+    def setUp(self):
+        self.school_class = Class.objects.create(name="JSS1")
+        subject = Subject.objects.create(name="Maths", school_class=self.school_class)
+        teacher = User.objects.create_user("teacher", password="x", role="teacher", student_class=self.school_class)
+        now = timezone.now()
+        self.quiz = Quiz.objects.create(
+            school_class=self.school_class, subject=subject, title="Test 1", created_by=teacher,
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1), is_published=True,
+        )
+        self.objective = Question.objects.create(quiz=self.quiz, text="2+2", question_type="objective", marks=1)
+        self.choice = Choice.objects.create(question=self.objective, text="4", is_correct=True)
+        self.subjective = Question.objects.create(quiz=self.quiz, text="Explain", question_type="subjective", marks=5)
+
+    def add_students(self, count):
+        start = User.objects.filter(role="student").count()
+        for i in range(start, start + count):
+            student = User.objects.create_user(f"student{i}", password="x", role="student", student_class=self.school_class)
+            attempt = StudentQuizAttempt.objects.create(student=student, quiz=self.quiz, is_submitted=True, score=1)
+            Answer.objects.create(attempt=attempt, question=self.objective, selected_choice=self.choice, score=1)
+            Answer.objects.create(attempt=attempt, question=self.subjective, text_answer="Because", feedback="Good")
+        return student
+
+    def test_class_report_queries_do_not_grow_with_class_size(self):
+        self.add_students(2)
+        with self.assertNumQueries(3):
+            small = report_data.class_report(self.school_class.id)
+        self.add_students(10)
+        with self.assertNumQueries(3):
+            large = report_data.class_report(self.school_class.id)
+        self.assertEqual(len(small["students"]), 2)
+        self.assertEqual(len(large["students"]), 12)
+        self.assertEqual([a["subject"] for a in large["students"][-1]["attempts"]], ["Maths"])
+
+    def test_quiz_report_queries_do_not_grow_with_attempts(self):
+        self.add_students(2)
+        with self.assertNumQueries(3):
+            report_data.quiz_report(self.quiz.id)
+        self.add_students(10)
+        with self.assertNumQueries(3):
+            data = report_data.quiz_report(self.quiz.id)
+        self.assertEqual(len(data["attempts"]), 12)
+        self.assertEqual([a["answer"] for a in data["attempts"][0]["answers"]], ["4", "Because"])
+
+    def test_student_reports_queries_do_not_grow_with_attempts(self):
+        student = self.add_students(1)
+        with self.assertNumQueries(3):
+            report_data.student_report(student.id)
+        with self.assertNumQueries(3):
+            data = report_data.student_results(student.id)
+        self.assertEqual(len(data["attempts"][0]["answers"]), 2)
+
+
+class BatchAutosaveTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        self.url = reverse("api_submit_answers_batch", args=[self.attempt.id])
+
+    def post(self, answers):
+        return self.client.post(self.url, {"answers": answers}, content_type="application/json")
+
+    def test_every_item_is_acknowledged(self):
+        response = self.post([
+            {"question_id": self.objective.id, "answer": self.wrong.id, "client_seq": 1},
+            {"question_id": self.objective.id, "answer": self.right.id, "client_seq": 2},
+            {"question_id": self.subjective.id, "answer": "Because", "client_seq": 1},
+            {"question_id": 999999, "answer": 1, "client_seq": 1},
+        ])
+        self.assertEqual([(a["client_seq"], a["status"]) for a in response.json()["results"]], [
+            (1, "stale"), (2, "saved"), (1, "saved"), (1, "rejected"),
+        ])
+        answer = Answer.objects.get(attempt=self.attempt, question=self.objective)
+        self.assertEqual((answer.selected_choice_id, answer.score), (self.right.id, 2))
+
+    def test_an_older_save_never_overwrites_a_newer_one(self):
+        self.post([{"question_id": self.objective.id, "answer": self.right.id, "client_seq": 5}])
+        response = self.post([{"question_id": self.objective.id, "answer": self.wrong.id, "client_seq": 3}])
+        self.assertEqual(response.json()["results"][0]["status"], "stale")
+        self.assertEqual(Answer.objects.get(attempt=self.attempt).selected_choice_id, self.right.id)
+
+    def test_submitted_attempt_is_refused(self):
+        StudentQuizAttempt.objects.filter(pk=self.attempt.pk).update(is_submitted=True)
+        response = self.post([{"question_id": self.objective.id, "answer": self.right.id, "client_seq": 1}])
+        self.assertEqual(response.status_code, 400)
+
+
+class AnswerKeyTests(ExamTestCase):
+    def test_key_is_cached_until_the_quiz_changes(self):
+        key = answer_key.get_answer_key(self.quiz)
+        with self.assertNumQueries(0):
+            self.assertIs(answer_key.get_answer_key(self.quiz), key)
+        self.assertEqual(key.get(self.objective.id).correct_text, "4")
+
+        self.wrong.is_correct = True
+        self.wrong.save()
+        answer_key.invalidate_answer_key(self.quiz)
+        self.assertEqual(answer_key.get_answer_key(self.quiz).get(self.objective.id).correct_text, "3, 4")
+
+    def test_edit_never_writes_back_a_stale_version(self):
+        self.client.force_login(self.teacher)
+        version = self.quiz.content_version
+
+        def concurrent_edit(**kwargs):  # another edit commits while this one is running
+            self.quiz.bump_content_version()
+            return self.subject
+
+        payload = {
+            "title": "Test 1", "subject_id": self.subject.id, "duration_minutes": 30, "is_published": True,
+            "start_time": self.quiz.start_time.isoformat(), "end_time": self.quiz.end_time.isoformat(),
+            "questions": [{"text": "1+1", "question_type": "objective", "marks": 1, "choices": [{"text": "2", "is_correct": True}]}],
+        }
+        with mock.patch.object(Subject.objects, "get", side_effect=concurrent_edit):
+            response = self.client.post(reverse("edit_quiz_ajax", args=[self.quiz.id]), payload, content_type="application/json")
+        self.assertTrue(response.json()["ok"], response.content)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.content_version, version + 2)
+        self.assertEqual([q.correct_text for q in answer_key.get_answer_key(self.quiz)], ["2"])
+
+
+class FinalSubmissionTests(ExamTestCase):
+    def exam(self, questions):
+        quiz = Quiz.objects.create(
+            school_class=self.school_class, subject=self.subject, title=f"{questions} questions", created_by=self.teacher,
+            start_time=self.quiz.start_time, end_time=self.quiz.end_time, is_published=True,
+        )
+        attempt = StudentQuizAttempt.objects.create(student=self.student, quiz=quiz, end_time=self.quiz.end_time)
+        for i in range(questions):
+            question = Question.objects.create(quiz=quiz, text=f"Q{i}", question_type="objective", marks=1)
+            right = Choice.objects.create(question=question, text="right", is_correct=True)
+            if i % 2:  # every other question is left unanswered
+                Answer.objects.create(attempt=attempt, question=question, selected_choice=right)
+        answer_key.get_answer_key(quiz)  # as on a server that has served the exam page
+        return attempt
+
+    def submit(self, attempt):
+        return self.client.post(reverse("api_submit_attempt", args=[attempt.id]), content_type="application/json")
+
+    def test_query_count_does_not_grow_with_the_exam(self):
+        small, large = self.exam(2), self.exam(40)
+        self.submit(self.start_attempt())  # the student's dashboard summary and board entries now exist
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.submit(small).json()["score"], 1)
+        with self.assertNumQueries(len(queries)):
+            body = self.submit(large).json()
+        self.assertEqual((body["score"], len(body["questions"])), (20, 40))
+
+    def test_second_submission_is_refused(self):
+        attempt = self.start_attempt()
+        self.assertTrue(self.submit(attempt).json()["ok"])
+        self.assertEqual(self.submit(attempt).status_code, 400)
+
+
+class DeadlineSweepTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        Answer.objects.create(attempt=self.attempt, question=self.objective, selected_choice=self.right)
+        StudentQuizAttempt.objects.filter(pk=self.attempt.pk).update(end_time=timezone.now() - timedelta(minutes=1))
+        self.open = StudentQuizAttempt.objects.create(student=self.teacher, quiz=self.quiz, end_time=timezone.now() + timedelta(minutes=5))
+
+    def assertClosedOnce(self):
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.is_submitted, self.attempt.score), (True, 2))
+        self.assertEqual(Answer.objects.filter(attempt=self.attempt).count(), 1)
+        self.assertEqual(ActionLog.objects.filter(action_type="Auto-submitted Exam").count(), 1)
+        self.assertFalse(StudentQuizAttempt.objects.get(pk=self.open.pk).is_submitted)
+
+    def test_second_sweep_changes_nothing(self):
+        self.assertEqual(grading.close_expired_attempts()[0], 1)
+        self.assertEqual(grading.close_expired_attempts()[0], 0)
+        self.assertClosedOnce()
+
+    def test_sweeps_racing_for_the_same_attempts_close_them_once(self):
+        finalize = grading.finalize_attempts
+        closed_by_other = []
+
+        def other_node_first(ids, **kwargs):
+            if not closed_by_other:  # another sweep closes the batch after this one listed it
+                closed_by_other.append(None)
+                closed_by_other[0] = grading.close_expired_attempts()[0]
+            return finalize(ids, **kwargs)
+
+        with mock.patch.object(grading, "finalize_attempts", side_effect=other_node_first):
+            self.assertEqual(grading.close_expired_attempts()[0], 0)
+        self.assertEqual(closed_by_other, [1])
+        self.assertClosedOnce()
+
+    def test_student_cannot_submit_a_swept_attempt(self):
+        grading.close_expired_attempts()
+        response = self.client.post(reverse("api_submit_attempt", args=[self.attempt.id]), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class AuditLogTests(ExamTestCase):
+    def event(self, action_type, user_id=None):
+        return {
+            "user_id": user_id, "action_type": action_type, "description": "", "model_name": None,
+            "object_id": None, "details": None, "created_at": timezone.now(),
+        }
+
+    def writer(self):
+        spill = self.enterContext(tempfile.TemporaryDirectory())
+        writer = audit.AuditLogWriter(batch_size=100, spill_path=f"{spill}/spill.jsonl")
+        writer._ensure_thread = lambda: None  # the test flushes
+        return writer
+
+    def test_every_event_is_kept_by_default(self):
+        for _ in range(20):
+            audit.record(self.student, "submit_answer")
+        self.assertEqual(ActionLog.objects.filter(action_type="submit_answer").count(), 20)
+
+    @override_settings(AUDIT_LOG_SAMPLE_RATES={"submit_answer": 0.0})
+    def test_sampled_action_types(self):
+        audit.record(self.student, "submit_answer")
+        audit.record(self.student, "Submitted Exam")
+        self.assertEqual(list(ActionLog.objects.values_list("action_type", flat=True)), ["Submitted Exam"])
+
+    def test_anonymous_events_are_kept(self):
+        audit.record(None, "Deleted user")
+        writer = self.writer()
+        writer.enqueue(self.event("Edited user"))
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(sorted(ActionLog.objects.filter(user=None).values_list("action_type", flat=True)), ["Deleted user", "Edited user"])
+
+    def test_busy_database_spills_and_replays(self):
+        writer = self.writer()
+        writer.enqueue(self.event("first", self.student.pk))
+        with mock.patch.object(ActionLog.objects, "bulk_create", side_effect=OperationalError("database is locked")):
+            self.assertEqual(writer.flush(), 0)
+        self.assertFalse(ActionLog.objects.exists())
+
+        writer.enqueue(self.event("second", self.student.pk))
+        writer.flush()
+        self.assertEqual(sorted(ActionLog.objects.values_list("action_type", flat=True)), ["first", "second"])
+
+
+class DashboardSummaryTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        Answer.objects.create(attempt=self.attempt, question=self.objective, selected_choice=self.wrong)
+        grading.finalize_attempt(self.attempt)
+
+    def rows(self):
+        return StudentDashboardSummary.objects.get(pk=self.student.pk).attempts
+
+    def edit_payload(self, title):
+        return {
+            "title": title, "subject_id": self.subject.id, "duration_minutes": 30, "is_published": True,
+            "start_time": self.quiz.start_time.isoformat(), "end_time": self.quiz.end_time.isoformat(),
+            "questions": [{"text": "2+3", "question_type": "objective", "marks": 2, "choices": [{"text": "5", "is_correct": True}]}],
+        }
+
+    def test_submission_adds_a_row(self):
+        row = self.rows()[str(self.attempt.id)]
+        self.assertEqual((row["quiz"], row["obtained"]), ("Test 1", 0))
+        self.assertEqual(row["wrong_answer"], [{"question": "2+2", "your_answer": "3", "correct_answer": "4"}])
+
+    def test_partial_refresh_drops_rows_of_deleted_attempts(self):
+        other_quiz = Quiz.objects.create(
+            school_class=self.school_class, subject=self.subject, title="Test 2", created_by=self.teacher, is_published=True,
+        )
+        other = StudentQuizAttempt.objects.create(student=self.student, quiz=other_quiz)
+        StudentQuizAttempt.objects.filter(pk=self.attempt.pk).delete()  # no refresh of its own
+        grading.finalize_attempt(other)
+        self.assertEqual(list(self.rows()), [str(other.id)])
+
+    def test_deleting_the_exam_removes_its_attempts(self):
+        self.client.force_login(self.teacher)
+        self.client.post(reverse("delete_quiz_ajax", args=[self.quiz.id]))
+        summary = StudentDashboardSummary.objects.get(pk=self.student.pk)
+        self.assertEqual((summary.attempts, summary.total_attempts), ({}, 0))
+
+    def test_editing_the_exam_refreshes_its_rows(self):
+        self.client.force_login(self.teacher)
+        response = self.client.post(
+            reverse("edit_quiz_ajax", args=[self.quiz.id]), self.edit_payload("Test 1 (corrected)"), content_type="application/json",
+        )
+        self.assertTrue(response.json()["ok"], response.content)
+        row = self.rows()[str(self.attempt.id)]
+        self.assertEqual((row["quiz"], row["wrong_answer"]), ("Test 1 (corrected)", []))  # the old questions went with the edit
+
+
+class DashboardDeltaTests(ExamTestCase):
+    """Dashboard endpoints answer 304 or only the changed sections."""
+
+    def setUp(self):
+        super().setUp()
+        other_class = Class.objects.create(name="JSS2")
+        self.outsider = User.objects.create_user("outsider", password="x", role="student", approved=True, student_class=other_class)
+        other_teacher = User.objects.create_user("other", password="x", role="teacher", approved=True, student_class=other_class)
+        self.other_quiz = Quiz.objects.create(
+            school_class=other_class, subject=Subject.objects.create(name="English", school_class=other_class), title="Test 2",
+            created_by=other_teacher, start_time=self.quiz.start_time, end_time=self.quiz.end_time, is_published=True,
+        )
+
+    def load(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def outsider_submits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentQuizAttempt.objects.create(student=self.outsider, quiz=self.other_quiz, is_submitted=True, score=1)
+
+    def test_unchanged_student_dashboard_is_not_modified(self):
+        response = self.load("student_dashboard_data")
+        self.assertEqual(set(response.json()["changed"]), {"notifications", "quizzes", "summary", "leaderboard"})
+        again = self.client.get(
+            reverse("student_dashboard_data"), {"cursor": response.json()["cursor"]}, HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(again.status_code, 304)
+
+    def test_only_changed_sections_are_sent(self):
+        cursor = self.load("student_dashboard_data").json()["cursor"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(sender=self.teacher, recipient=self.student, message="hi", role="student")
+        body = self.load("student_dashboard_data", cursor=cursor).json()
+        self.assertEqual(body["changed"], ["notifications"])
+        self.assertNotIn("leaderboard", body)
+        self.assertEqual(self.load("student_dashboard_data", cursor=body["cursor"], attempts_page=2).json()["changed"], ["summary"])
+
+    def test_teacher_and_admin_dashboards_are_not_modified(self):
+        admin = User.objects.create_user("admin", password="x", role="admin", approved=True)
+        for user, name in ((self.teacher, "teacher_dashboard_data"), (admin, "admin_dashboard_data")):
+            self.client.force_login(user)
+            cursor = self.load(name).json()["cursor"]
+            self.assertEqual(self.client.get(reverse(name), {"cursor": cursor}).status_code, 304)
+
+    def test_attempts_elsewhere_leave_the_teacher_dashboard_alone(self):
+        self.client.force_login(self.teacher)
+        cursor = self.load("teacher_dashboard_data").json()["cursor"]
+        self.outsider_submits()
+        self.assertEqual(self.client.get(reverse("teacher_dashboard_data"), {"cursor": cursor}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.start_attempt()
+        changed = self.load("teacher_dashboard_data", cursor=cursor).json()["changed"]
+        self.assertEqual(set(changed), {"summary", "quizzes", "performance", "grading"})
+
+    def test_report_cache_key_follows_the_report_students_only(self):
+        key = report_jobs.cache_key("class", {"class_id": self.school_class.id})
+        self.outsider_submits()
+        self.assertEqual(report_jobs.cache_key("class", {"class_id": self.school_class.id}), key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.start_attempt()
+        self.assertNotEqual(report_jobs.cache_key("class", {"class_id": self.school_class.id}), key)
+
+
+class LeaderboardTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        Answer.objects.create(attempt=self.attempt, question=self.objective, selected_choice=self.right)
+        self.essay = Answer.objects.create(attempt=self.attempt, question=self.subjective, text_answer="Because", is_pending=True)
+        self.client.post(reverse("api_submit_attempt", args=[self.attempt.id]), content_type="application/json")
+
+    def entries(self):
+        return {(e.scope, e.scope_id): (e.total_score, e.attempt_count) for e in LeaderboardEntry.objects.filter(student=self.student)}
+
+    def test_submission_enters_every_board(self):
+        self.assertEqual(self.entries(), {
+            ("global", 0): (2.0, 1), ("class", self.school_class.id): (2.0, 1), ("subject", self.subject.id): (2.0, 1),
+        })
+        self.assertEqual([e.student_id for e in leaderboard.top(leaderboard.GLOBAL)], [self.student.id])
+
+    def test_grading_updates_the_totals(self):
+        self.client.force_login(self.teacher)
+        self.client.post(reverse("grade_attempt", args=[self.attempt.id]), {f"score_{self.essay.id}": "4"})
+        self.assertEqual(self.entries()[("global", 0)], (6.0, 1))
+
+    def test_deleting_the_exam_removes_its_entries(self):
+        self.client.force_login(self.teacher)
+        self.client.post(reverse("delete_quiz_ajax", args=[self.quiz.id]))
+        self.assertEqual(self.entries(), {})
+
+    def test_deleting_the_subject_removes_its_entries(self):
+        admin = User.objects.create_user("admin", password="x", role="admin", approved=True)
+        self.client.force_login(admin)
+        self.client.post(
+            reverse("class_subject_crud"), {"action": "delete_subject", "id": self.subject.id}, content_type="application/json",
+        )
+        self.assertEqual(self.entries(), {})
+
+    def test_rebuild_matches_the_running_entries(self):
+        before = self.entries()
+        LeaderboardEntry.objects.all().delete()
+        self.assertEqual(leaderboard.rebuild(), 1)
+        self.assertEqual(self.entries(), before)
+
+
+class QuizSnapshotAccessTests(ExamTestCase):
+    def url(self):
+        return reverse("quiz_snapshot_api", args=[self.quiz.id])
+
+    def test_open_exam_is_served(self):
+        self.assertEqual(self.client.get(self.url()).status_code, 200)
+
+    def test_exam_not_yet_open_is_refused(self):
+        self.quiz.start_time = timezone.now() + timedelta(hours=1)
+        self.quiz.end_time = timezone.now() + timedelta(hours=2)
+        self.quiz.save()
+        self.assertEqual(self.client.get(self.url()).status_code, 403)
+
+        self.start_attempt()  # e.g. a retake granted early
+        self.assertEqual(self.client.get(self.url()).status_code, 200)
+
+    def test_teacher_sees_exam_before_it_opens(self):
+        self.quiz.start_time = timezone.now() + timedelta(hours=1)
+        self.quiz.save()
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(self.url()).status_code, 200)
+
+
+@override_settings(EXAM_START_WINDOW_SECONDS=10)
+class AdmissionWindowTests(ExamTestCase):
+    """Starts are admitted starts_per_window per window, first come first served."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.quiz.starts_per_window = 2
+        self.quiz.save()
+        self.now = 1_000_000_000.0
+
+    def controller(self, method, *args):
+        # the clock is also the cache's: LocMemCache expires keys by time.time()
+        with mock.patch("time.time", return_value=self.now):
+            return getattr(admission.AdmissionController(self.quiz), method)(*args)
+
+    def admit(self, session):
+        return self.controller("admit", SimpleNamespace(session=session))
+
+    def test_each_window_admits_up_to_the_limit(self):
+        sessions = [{} for _ in range(5)]
+        results = [self.admit(session) for session in sessions]
+        self.assertEqual([r.admitted for r in results], [True, True, False, False, False])
+        self.assertEqual([r.retry_after for r in results[2:]], [10, 10, 20])
+
+        self.now += 10  # the next window opens: the two queued first get in, the last still waits
+        self.assertEqual([self.admit(s).admitted for s in sessions[2:]], [True, True, False])
+        self.assertEqual(self.controller("metrics")["queue_depth"], 1)
+
+    def test_a_stale_ticket_is_dropped(self):
+        sessions = [{} for _ in range(3)]
+        for session in sessions:
+            self.admit(session)
+        self.assertIn(f"exam_ticket_{self.quiz.pk}", sessions[2])
+
+        self.now += 10 + admission.TICKET_GRACE_WINDOWS * 10 + 1  # came back long after their window
+        self.assertTrue(self.admit(sessions[2]).admitted)  # a fresh ticket, in the current window
+        self.assertEqual(self.controller("metrics")["queue_depth"], 0)
+
+    def test_nobody_starts_once_the_exam_has_closed(self):
+        self.quiz.starts_per_window = 1
+        self.quiz.save()
+        other = User.objects.create_user("other", password="x", role="student", approved=True, student_class=self.school_class)
+        self.client.force_login(other)
+        self.client.get(reverse("take_quiz", args=[self.quiz.id]))  # takes this window's only place
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse("take_quiz", args=[self.quiz.id])).status_code, 429)
+        self.quiz.end_time = timezone.now() - timedelta(minutes=1)
+        self.quiz.save()
+        response = self.client.get(reverse("take_quiz", args=[self.quiz.id]))
+        self.assertRedirects(response, reverse("quiz_closed_detail", args=[self.quiz.id]), fetch_redirect_response=False)
+        self.assertFalse(StudentQuizAttempt.objects.filter(student=self.student).exists())
+
+
+class AnswerJournalTests(ExamTestCase):
+    """Journal merges are idempotent and never let an older save win."""
+
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+
+    def answer(self):
+        return Answer.objects.get(attempt=self.attempt, question=self.objective)
+
+    def test_newest_entry_per_question_wins(self):
+        applied, acks = merge_answer_journal(self.attempt, [
+            {"seq": 1, "question_id": self.objective.id, "answer": self.wrong.id},
+            {"seq": 2, "question_id": self.objective.id, "answer": self.right.id},
+            {"seq": 3, "question_id": self.subjective.id, "answer": "Because"},
+        ])
+        self.assertEqual(applied, 3)
+        self.assertEqual([a["status"] for a in acks], ["stale", "saved", "saved"])
+        self.assertEqual((self.answer().selected_choice_id, self.answer().score), (self.right.id, 2))
+        subjective = Answer.objects.get(attempt=self.attempt, question=self.subjective)
+        self.assertEqual((subjective.text_answer, subjective.is_pending), ("Because", True))
+
+    def test_replayed_tail_changes_nothing(self):
+        entries = [{"seq": 5, "question_id": self.objective.id, "answer": self.right.id}]
+        merge_answer_journal(self.attempt, entries)
+        applied, acks = merge_answer_journal(self.attempt, entries)
+        self.assertEqual((applied, acks[0]["status"]), (5, "stale"))
+        self.assertEqual(Answer.objects.filter(attempt=self.attempt).count(), 1)
+
+    def test_late_old_entry_does_not_regress_answer_or_seq(self):
+        merge_answer_journal(self.attempt, [{"seq": 7, "question_id": self.objective.id, "answer": self.right.id}])
+        applied, acks = merge_answer_journal(self.attempt, [{"seq": 4, "question_id": self.objective.id, "answer": self.wrong.id}])
+        self.assertEqual((applied, acks[0]["status"]), (7, "stale"))
+        self.assertEqual(self.answer().selected_choice_id, self.right.id)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.journal_seq, 7)
+
+    def test_rejected_entries_are_acknowledged(self):
+        applied, acks = merge_answer_journal(self.attempt, [
+            {"seq": 1, "question_id": 999999, "answer": "x"},
+            {"question_id": self.objective.id, "answer": self.right.id},
+        ])
+        self.assertEqual(applied, 1)
+        self.assertEqual([a["error"] for a in acks], ["question not in this exam", "client_seq required"])
+        self.assertFalse(Answer.objects.filter(attempt=self.attempt).exists())
+
+    def test_sync_endpoint(self):
+        url = reverse("api_answer_journal", args=[self.attempt.id])
+        entries = [{"seq": 2, "question_id": self.objective.id, "answer": self.right.id}]
+        response = self.client.post(url, {"entries": entries}, content_type="application/json")
+        self.assertEqual(response.json(), {"ok": True, "applied_seq": 2, "rejected": []})
+        response = self.client.post(url, {"entries": "nope"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 11))
+        self.assertEqual(loadsim.percentile(values, 50), 5)
+        self.assertEqual(loadsim.percentile(values, 90), 9)
+        self.assertEqual(loadsim.percentile(values, 95), 10)
+        self.assertEqual(loadsim.percentile(values, 100), 10)
+        self.assertEqual(loadsim.percentile(values, 0), 1)
+        self.assertEqual(loadsim.percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(loadsim.percentile(list(range(1, 101)), 7), 7)
+        self.assertEqual(loadsim.percentile([7], 50), 7)
+        self.assertIsNone(loadsim.percentile([], 50))
+
+
+class DatabaseEventsTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = events.DatabaseBackend(events.Hub())
+        self.backend.start = lambda: None  # the test drives relay() itself
+        patcher = mock.patch.multiple(events, _backend=self.backend, hub=self.backend.hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_event_published_before_first_relay_reaches_new_stream(self):
+        sub = events.subscribe(self.student)
+        UserEvent.objects.create(user=self.student, event_type="notification")
+        self.backend.relay()
+        self.assertEqual([e.type for e in sub.get(0)], ["notification"])
+        sub.close()
+
+    def test_resumed_stream_gets_backlog_then_live_events_once(self):
+        first = UserEvent.objects.create(user=self.student, event_type="graded")
+        UserEvent.objects.create(user=self.student, event_type="retake")
+        sub = events.subscribe(self.student, after_id=first.id)
+        UserEvent.objects.create(user=self.student, event_type="notification")
+        self.backend.relay()
+        self.assertEqual([e.type for e in sub.get(0)], ["retake", "notification"])
+        sub.close()
+
+    @override_settings(EVENTS_SYNC_STREAM_SECONDS=0)
+    def test_wsgi_stream_defers_to_long_poll(self):
+        self.assertEqual(self.client.get(reverse("api_event_stream")).status_code, 204)
+
+    @override_settings(EVENTS_SYNC_STREAM_SECONDS=0)
+    def test_wsgi_poll_answers_at_once(self):
+        first = UserEvent.objects.create(user=self.student, event_type="graded")
+        body = self.client.get(reverse("api_event_poll"), {"after": first.id - 1, "timeout": 25}).json()
+        self.assertEqual([e["type"] for e in body["events"]], ["graded"])
+        started = time.monotonic()
+        body = self.client.get(reverse("api_event_poll"), {"after": body["last_id"], "timeout": 25}).json()
+        self.assertLess(time.monotonic() - started, 5)  # no events: it doesn't wait for any
+        self.assertEqual((body["events"], body["last_id"]), ([], first.id))
+
+    async def test_asgi_poll_returns_the_backlog(self):
+        first = await UserEvent.objects.acreate(user=self.student, event_type="graded")
+        await UserEvent.objects.acreate(user=self.student, event_type="retake")
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse("api_event_poll"), {"after": first.id, "timeout": 1})
+        self.assertEqual([e["type"] for e in response.json()["events"]], ["retake"])
+
+
+class BroadcastAudienceTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(events, "_backend", events.LocalBackend(events.Hub()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return broadcast.post_broadcast(self.teacher, message, role="student")
+
+    def test_unapproved_accounts_get_no_broadcasts(self):
+        self.post("Exams start Monday")
+        pending = User.objects.create_user("pending", password="x", role="student", approved=False, student_class=self.school_class)
+        self.assertEqual(inbox.unread_count(self.student), 1)
+        self.assertEqual(inbox.unread_count(pending), 0)
+
+    def test_new_accounts_only_see_broadcasts_posted_since(self):
+        self.post("Old news")
+        newcomer = User.objects.create_user("newcomer", password="x", role="student", approved=True, student_class=self.school_class)
+        self.post("Welcome")
+        self.assertEqual([b.message for b in inbox.broadcasts_for(newcomer)], ["Welcome"])
+        self.assertEqual(inbox.unread_count(self.student), 2)
+
+        User.objects.filter(pk=newcomer.pk).update(created_at=None)  # an account older than the field
+        newcomer.refresh_from_db()
+        self.assertEqual(inbox.unread_count(newcomer), 2)
+
+    def test_dashboard_broadcast_answers_with_the_message(self):
+        admin = User.objects.create_user("admin", password="x", role="admin", approved=True)
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin_dashboard_data"), {"action_type": "broadcast", "role": "student", "message": "Hi"},
+                content_type="application/json",
+            )
+        body = response.json()
+        self.assertEqual((body["ok"], body["message"]), (True, "Broadcast sent to all students."))
+        self.assertEqual(BroadcastMessage.objects.get(pk=body["broadcast"]["id"]).message, "Hi")
+        self.assertEqual(inbox.unread_count(self.student), 1)
+
+
+class UnreadCounterTests(ExamTestCase):
+    """The unread counter always agrees with the notification table."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(events, "_backend", events.LocalBackend(events.Hub()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def notify(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(sender=self.teacher, recipient=self.student, message=message, role="student")
+
+    def assertConsistent(self, expected):
+        counted = UnreadCounter.objects.get(user=self.student).unread
+        actual = Notification.objects.filter(recipient=self.student, is_read=False).count()
+        self.assertEqual((counted, actual), (expected, expected))
+
+    def test_create_read_and_delete(self):
+        first, second, third = (self.notify(f"n{i}") for i in range(3))
+        self.assertConsistent(3)
+        self.assertTrue(inbox.mark_read(self.student, first.id))
+        self.assertTrue(inbox.mark_read(self.student, first.id))  # again: counted once
+        self.assertConsistent(2)
+        second.delete()
+        self.assertConsistent(1)
+        inbox.mark_read(self.student, third.id)
+        third.delete()  # a read notification was not counted
+        self.assertConsistent(0)
+
+    def test_someone_elses_notification_is_not_marked(self):
+        other = Notification.objects.create(sender=self.student, recipient=self.teacher, message="x", role="teacher")
+        self.assertFalse(inbox.mark_read(self.student, other.id))
+        self.assertEqual(UnreadCounter.objects.get(user=self.teacher).unread, 1)
+
+    def test_mark_all_read_includes_broadcasts(self):
+        for i in range(2):
+            self.notify(f"n{i}")
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast.post_broadcast(self.teacher, "All students", role="student")
+        self.assertEqual(inbox.unread_count(self.student), 3)
+        self.assertEqual(inbox.mark_all_read(self.student), 3)
+        self.assertEqual(inbox.unread_count(self.student), 0)
+        self.assertConsistent(0)
+
+    def test_recount_repairs_drift(self):
+        for i in range(2):
+            self.notify(f"n{i}")
+        UnreadCounter.objects.filter(user=self.student).update(unread=7)
+        Notification.objects.filter(recipient=self.teacher).delete()
+        inbox.recount()
+        self.assertConsistent(2)
+        self.assertFalse(UnreadCounter.objects.filter(user=self.teacher).exists())
+
+
+class ReportWorkerFallbackTests(ExamTestCase):
+    """Reports are queued for a running worker and rendered in the request when there is none."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+        patcher = mock.patch.object(report_jobs.reports, "render", side_effect=self.render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(MEDIA_ROOT=media))
+
+    def render(self, kind, params, path, progress=None):
+        with open(path, "wb") as handle:
+            handle.write(b"%PDF-1.4")
+
+    def request(self):
+        return report_jobs.request_report(self.teacher, "student", {"student_id": self.student.id}, "student.pdf")
+
+    def test_without_a_worker_the_request_renders(self):
+        self.assertFalse(report_jobs.worker_alive())
+        self.assertEqual(self.request().status, "done")
+
+    def test_with_a_worker_the_job_is_queued(self):
+        report_jobs.heartbeat()
+        self.assertEqual(self.request().status, "queued")
+
+    def test_job_left_queued_by_a_worker_that_stopped_is_rendered_on_poll(self):
+        report_jobs.heartbeat()
+        job = self.request()
+        WorkerHeartbeat.objects.update(seen_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.get(reverse("api_report_job", args=[job.id]))
+        self.assertEqual(response.json()["job"]["status"], "done")
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, "done")
+
+
+class ReportPoolSizeTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(report_pool, _merge_checked=False, _merge_available=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(REPORT_WORKERS=4)
+    def test_renders_in_process_without_pypdf(self):
+        with mock.patch("importlib.util.find_spec", return_value=None), self.assertLogs("exams.report_pool", "WARNING"):
+            self.assertEqual(report_pool.workers(), 1)
+
+    @override_settings(REPORT_WORKERS=4)
+    def test_uses_the_pool_with_pypdf(self):
+        with mock.patch("importlib.util.find_spec", return_value=object()):
+            self.assertEqual(report_pool.workers(), 4)
+
+
+class ChartCacheTests(SimpleTestCase):
+    def setUp(self):
+        charts.clear_chart_cache()
+
+    def test_same_chart_is_drawn_once(self):
+        png = charts.bar_chart(["Maths", "English"], [1, 2], "Scores")
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertIs(charts.bar_chart(["Maths", "English"], [1.0, 2.0], "Scores"), png)  # same data, any student
+        self.assertIsNot(charts.bar_chart(["Maths", "English"], [1, 2], "Scores", figsize=(6, 2)), png)
+
+    @override_settings(CHART_CACHE_SIZE=1)
+    def test_least_recently_used_chart_is_evicted(self):
+        first = charts.bar_chart(["Maths"], [1], "Scores")
+        charts.bar_chart(["Maths"], [2], "Scores")
+        self.assertEqual(len(charts._cache), 1)
+        self.assertIsNot(charts.bar_chart(["Maths"], [1], "Scores"), first)
+
+
+class SectionFeedTests(SimpleTestCase):
+    def test_sections_are_pulled_one_at_a_time(self):
+        pulled = []
+
+        def sections():
+            for name in ("first", "second"):
+                pulled.append(name)
+                yield [f"{name} table", f"{name} chart"]
+
+        feed = reports.SectionFeed(sections())
+        self.assertEqual(pulled, [])
+        self.assertEqual(len(feed), 2)
+        del feed[:2]  # laid out
+        self.assertEqual(pulled, ["first"])
+        self.assertEqual((len(feed), pulled), (2, ["first", "second"]))
+        del feed[:2]
+        self.assertEqual(len(feed), 0)
+
+
+@override_settings(REPORT_WORKERS=1)
+class ClassReportTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("Ada", "Bola", "Chidi"):
+            student = User.objects.create_user(
+                name.lower(), password="x", first_name=name, role="student", approved=True, student_class=self.school_class,
+            )
+            StudentQuizAttempt.objects.create(student=student, quiz=self.quiz, is_submitted=True, score=2, submitted_at=timezone.now())
+
+    @skipUnless(importlib.util.find_spec("pypdf"), "pypdf is not installed")
+    def test_every_student_gets_their_own_page(self):
+        from pypdf import PdfReader
+
+        out, calls = BytesIO(), []
+        reports.render("class", {"class_id": self.school_class.id}, out, progress=lambda done, total: calls.append(done))
+        pages = [page.extract_text() for page in PdfReader(out).pages]
+        self.assertEqual(len(pages), 4)
+        for page, name in zip(pages, ("student", "Ada", "Bola", "Chidi")):
+            self.assertIn(f"Student Name: {name}", page)
+            self.assertIn("Total Students in Class: 4", page)
+        self.assertIn("No Exam attempts yet.", pages[0])
+        self.assertIn("Test 1", pages[1])
+        self.assertEqual(calls, [0, 1, 2, 3, 4])
+
+
+class ReportDateRangeTests(ExamTestCase):
+    def submitted(self, when):
+        student = User.objects.create_user(f"s{when:%d%H}", password="x", role="student", student_class=self.school_class)
+        attempt = StudentQuizAttempt.objects.create(student=student, quiz=self.quiz, is_submitted=True)
+        StudentQuizAttempt.objects.filter(pk=attempt.pk).update(submitted_at=timezone.make_aware(when))  # auto_now_add
+
+    def test_both_days_are_included(self):
+        for when in (datetime(2025, 3, 2, 23, 59), datetime(2025, 3, 3), datetime(2025, 3, 5, 15), datetime(2025, 3, 6)):
+            self.submitted(when)
+        data = report_data.class_report(self.school_class.id, "2025-03-03", "2025-03-05")
+        days = sorted(timezone.localtime(a["submitted_at"]).day for s in data["students"] for a in s["attempts"])
+        self.assertEqual(days, [3, 5])
+
+
+class ExportTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attempt = StudentQuizAttempt.objects.create(student=self.student, quiz=self.quiz, is_submitted=True, score=2)
+        StudentQuizAttempt.objects.filter(pk=self.attempt.pk).update(submitted_at=timezone.make_aware(datetime(2026, 3, 10, 15, 30)))
+        Answer.objects.create(attempt=self.attempt, question=self.subjective, text_answer='=HYPERLINK("http://x","y")', feedback="-1 for spelling")
+        Answer.objects.create(attempt=self.attempt, question=self.objective, selected_choice=self.right, score=2)
+
+    def answer_rows(self, **scope):
+        return list(exports.rows("answers", quiz_id=self.quiz.id, **scope))[1:]
+
+    def test_end_date_includes_the_whole_day(self):
+        self.assertEqual(len(self.answer_rows(start_date="2026-03-10", end_date="2026-03-10")), 2)
+        self.assertEqual(len(self.answer_rows(end_date="2026-03-09")), 0)
+        self.assertEqual(len(self.answer_rows(start_date="2026-03-11")), 0)
+
+    def test_csv_text_is_never_a_formula(self):
+        content = "".join(exports.stream("answers", "csv", quiz_id=self.quiz.id))
+        self.assertIn('"\'=HYPERLINK(""http://x"",""y"")"', content)
+        self.assertIn("'-1 for spelling", content)
+        self.assertIn("2026-03-10 15:30:00", content)
+
+    def test_xlsx_text_is_never_a_formula(self):
+        data = b"".join(exports.stream("answers", "xlsx", quiz_id=self.quiz.id))
+        sheet = load_workbook(BytesIO(data)).active
+        cells = [cell for row in sheet.iter_rows() for cell in row]
+        self.assertFalse([cell.coordinate for cell in cells if cell.data_type == "f"])
+        self.assertIn('\'=HYPERLINK("http://x","y")', [cell.value for cell in cells])
+
+
+class ReportImageCacheTests(SimpleTestCase):
+    def setUp(self):
+        images.clear_image_cache()
+        self.dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.photo = os.path.join(self.dir, "photo.png")
+        PILImage.new("RGBA", (2000, 1500), (255, 0, 0, 128)).save(self.photo)
+
+    def test_image_is_decoded_once_at_its_drawn_size(self):
+        with mock.patch.object(images, "_decode", wraps=images._decode) as decode:
+            reader = images._reader(self.photo, 86.4, 86.4)
+            self.assertIs(images._reader(self.photo, 86.4, 86.4), reader)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(reader.getSize(), (180, 135))  # 1.2 inch at 150 dpi, aspect kept
+
+    def test_replaced_file_is_decoded_again(self):
+        reader = images._reader(self.photo, 86.4, 86.4)
+        os.utime(self.photo, ns=(1, 1))
+        self.assertIsNot(images._reader(self.photo, 86.4, 86.4), reader)
+
+    def test_unreadable_images_are_left_out(self):
+        bad = os.path.join(self.dir, "bad.png")
+        with open(bad, "wb") as f:
+            f.write(b"not an image")
+        with self.assertLogs("exams.images", "WARNING"):
+            self.assertIsNone(images.report_image(bad, 50, 50))
+        with self.assertNoLogs("exams.images", "WARNING"):
+            self.assertIsNone(images.report_image(bad, 50, 50))  # remembered, not retried
+        self.assertIsNone(images.report_image(os.path.join(self.dir, "missing.png"), 50, 50))
+        self.assertIsNone(images.report_image(None, 50, 50))
+
+
+def exam_sheet(title="Test 2", published="yes", questions=None, header_row=9):
+    """Rows of an exam sheet in the download_excel_template format."""
+    rows = [
+        ("exam_title", title),
+        ("class_name", "jss1"),
+        ("subject_name", "Maths"),
+        ("start_time", datetime(2026, 3, 10, 9, 0)),
+        ("end_time", "10-03-2026 11:00"),
+        ("duration_minutes", 45),
+        ("is_published", published),
+    ]
+    rows += [()] * (header_row - 1 - len(rows))
+    rows.append(("question_text", "question_type", "marks", "choice_1", "choice_1_correct", "choice_2", "choice_2_correct"))
+    rows += questions if questions is not None else [
+        ("3x3", "objective", 2, "6", 0, "9", 1),
+        ("Explain division", "subjective", 5),
+    ]
+    return rows
+
+
+class QuizSheetParseTests(SimpleTestCase):
+    def test_valid_sheet(self):
+        parsed = quiz_import.parse_sheet(exam_sheet())
+        self.assertTrue(parsed.ok, parsed.errors)
+        self.assertEqual(parsed.meta["title"], "Test 2")
+        self.assertEqual(parsed.meta["duration_minutes"], 45)
+        self.assertEqual(parsed.meta["end_time"] - parsed.meta["start_time"], timedelta(hours=2))
+        objective, subjective = parsed.questions
+        self.assertEqual((objective["row"], objective["marks"]), (10, 2))
+        self.assertEqual(objective["choices"], [{"text": "6", "is_correct": False}, {"text": "9", "is_correct": True}])
+        self.assertEqual((subjective["question_type"], subjective["choices"]), ("subjective", []))
+
+    def test_is_published(self):
+        for value, expected in (("yes", True), ("TRUE", True), (1, True), (True, True), ("no", False), (0, False), (None, False)):
+            with self.subTest(value=value):
+                self.assertIs(quiz_import.parse_sheet(exam_sheet(published=value)).meta["is_published"], expected)
+        parsed = quiz_import.parse_sheet(exam_sheet(published="maybe"))
+        self.assertEqual(parsed.errors, [{"row": 7, "field": "is_published", "error": "is_published must be True or False"}])
+
+    def test_every_problem_is_reported_with_its_row(self):
+        parsed = quiz_import.parse_sheet(exam_sheet(questions=[
+            ("ok", "objective", 1, "a", 1),
+            ("bad marks", "objective", "two", "a", 1),
+            ("no correct choice", "objective", 1, "a", 0, "b", 0),
+            ("bad flag", "objective", 1, "a", "perhaps"),
+            (None, "objective", 1, "a", 1),
+            ("bad type", "essay", 1),
+        ]))
+        self.assertEqual([(e["row"], e["field"]) for e in parsed.errors], [
+            (11, "marks"), (12, "choice_1_correct"), (13, "choice_1_correct"), (14, "question_text"), (15, "question_type"),
+        ])
+
+    def test_header_row_is_found_below_the_default(self):
+        parsed = quiz_import.parse_sheet(exam_sheet(header_row=12))
+        self.assertTrue(parsed.ok, parsed.errors)
+        self.assertEqual([q["row"] for q in parsed.questions], [13, 14])
+
+    def test_blank_rows_are_skipped_and_an_empty_sheet_fails(self):
+        parsed = quiz_import.parse_sheet(exam_sheet(questions=[(None, None), ("Only", "subjective", 1), ("",)]))
+        self.assertEqual([q["row"] for q in parsed.questions], [11])
+        parsed = quiz_import.parse_sheet(exam_sheet(questions=[]))
+        self.assertEqual(parsed.errors, [{"row": 10, "field": "question_text", "error": "the sheet has no questions"}])
+
+
+class BulkImportTests(ExamTestCase):
+    def workbook(self, *sheets):
+        wb = Workbook()
+        wb.remove(wb.active)
+        for title, rows in sheets:
+            ws = wb.create_sheet(title)
+            for row in rows:
+                ws.append(row)
+        out = BytesIO()
+        wb.save(out)
+        return out.getvalue()
+
+    def import_file(self, data, name, user=None):
+        return bulk_import.import_sources(bulk_import.sources(data, name), user or self.teacher, workers=1)
+
+    def test_each_sheet_is_an_exam_and_reimporting_resumes(self):
+        broken = exam_sheet(title="Broken", questions=[("no marks", "objective", 0, "a", 1)])
+        data = self.workbook(("Test 2", exam_sheet()), ("Test 3", exam_sheet(title="Test 3")), ("Broken", broken))
+        results = self.import_file(data, "term.xlsx")
+        self.assertEqual([r["status"] for r in results], ["imported", "imported", "failed"])
+        self.assertEqual(results[2]["errors"][0]["field"], "marks")
+        quiz = Quiz.objects.get(title="Test 2")
+        self.assertEqual((quiz.questions.count(), quiz.is_published, quiz.school_class), (2, True, self.school_class))
+
+        results = self.import_file(data, "term.xlsx")
+        self.assertEqual([r["status"] for r in results], ["skipped", "skipped", "failed"])
+        self.assertEqual(results[0]["quiz_id"], quiz.id)
+        self.assertEqual(Quiz.objects.filter(title__in=["Test 2", "Test 3"]).count(), 2)
+        self.assertEqual(QuizImportRecord.objects.count(), 3)
+
+    def test_resume_is_per_importer(self):
+        data = self.workbook(("Test 2", exam_sheet()))
+        self.import_file(data, "test2.xlsx")
+        other = User.objects.create_user("teacher2", password="x", role="teacher", approved=True)
+        self.assertEqual(self.import_file(data, "test2.xlsx", user=other)[0]["status"], "imported")
+        self.assertEqual(Quiz.objects.filter(title="Test 2").count(), 2)
+
+    def zip_of(self, files):
+        out = BytesIO()
+        with zipfile.ZipFile(out, "w") as archive:
+            for name, data in files:
+                archive.writestr(name, data)
+        return out.getvalue()
+
+    def test_zip_of_workbooks(self):
+        data = self.zip_of([
+            ("exams/b.xlsx", self.workbook(("Sheet", exam_sheet(title="B")))),
+            ("exams/a.xlsx", self.workbook(("Sheet", exam_sheet(title="A")))),
+            ("__MACOSX/exams/._a.xlsx", b"junk"),
+            ("exams/~$a.xlsx", b"lock"),
+            ("exams/readme.txt", b"hello"),
+        ])
+        self.assertEqual([r["title"] for r in self.import_file(data, "exams.zip")], ["A", "B"])
+
+    def test_archive_limits_are_checked_before_reading(self):
+        data = self.zip_of([(f"{i}.xlsx", b"x" * 100) for i in range(3)])
+        with mock.patch.object(bulk_import, "MAX_ARCHIVE_MEMBERS", 2), self.assertRaisesMessage(ValueError, "at most 2"):
+            bulk_import.sources(data, "exams.zip")
+        with mock.patch.object(bulk_import, "MAX_ARCHIVE_BYTES", 250), self.assertRaisesMessage(ValueError, "uncompressed"):
+            bulk_import.sources(data, "exams.zip")
+        self.assertEqual(len(bulk_import.sources(data, "exams.zip")), 3)
+
+    def upload(self, data, name):
+        upload = BytesIO(data)
+        upload.name = name
+        self.client.force_login(self.teacher)
+        return self.client.post(reverse("import_quiz_bulk"), {"file": upload})
+
+    def test_upload_lists_every_exam_with_its_outcome(self):
+        data = self.zip_of([
+            ("term1/maths.xlsx", self.workbook(("Sheet", exam_sheet(title="Maths")))),
+            ("term1/junk.xlsx", b"not a workbook"),
+        ])
+        body = self.upload(data, "term1.zip").json()
+        self.assertEqual((body["ok"], body["imported"], body["failed"]), (False, 1, 1))
+        self.assertEqual([r["source"] for r in body["results"]], ["term1/junk.xlsx", "term1/maths.xlsx"])
+        body = self.upload(data, "term1.zip").json()
+        self.assertEqual((body["imported"], body["skipped"], body["failed"]), (0, 1, 1))
+
+        response = self.upload(b"nope", "exams.zip")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "exams.zip is neither a ZIP archive nor an Excel workbook")
+
+    def test_command_fails_while_any_exam_fails(self):
+        broken = exam_sheet(title="Broken", questions=[("no marks", "objective", 0, "a", 1)])
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "term.xlsx")
+        with open(path, "wb") as f:
+            f.write(self.workbook(("Test 2", exam_sheet()), ("Broken", broken)))
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 imported, 0 already imported, 1 failed"):
+            call_command("import_quizzes", path, "--user", "teacher", "--workers", "1", stdout=out)
+        self.assertIn("row 10, marks", out.getvalue())
+        self.assertEqual(Quiz.objects.filter(title="Test 2").count(), 1)
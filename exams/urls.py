@@ -15,6 +15,7 @@ urlpatterns = [
 
     # Excel import (AJAX file upload)
     path("api/import_excel/", views.import_quiz_excel, name="import_quiz_excel"),
+    path("api/import_bulk/", views.import_quiz_bulk, name="import_quiz_bulk"),
     path("download/template/xlsx/", views.download_excel_template, name="download_excel_template"),
 
     # AJAX manage actions
@@ -35,6 +36,9 @@ urlpatterns = [
     path('admin/class/<int:class_id>/report/', views.admin_classes_report_pdf, name='admin_classes_report_pdf'),
     path('reports/', views.admin_report_generator, name='admin_report_generator'),
     path('reports/class/pdf/', views.admin_class_report_pdf, name='admin_class_report_pdf'),
+    path('reports/export/', views.export_results, name='export_results'),
+    path('reports/jobs/<int:job_id>/download/', views.download_report_job, name='download_report_job'),
+    path('api/reports/<int:job_id>/', views.api_report_job, name='api_report_job'),
 
     # Admin dashboard and retake requests from students
     path("admin/dashboard/", views.admin_dashboard, name="admin_dashboard"),
@@ -61,11 +65,9 @@ urlpatterns = [
 
     # Teacher approval and settings, notification and broadcast
     path("teacher/student/<int:student_id>/review/", views.student_review, name="student_review"),
-    path("teacher/broadcast/", views.broadcast_message, name="broadcast_message"),
     path("teacher/download/student/<int:student_id>/", views.download_student_report, name="download_student_report"),
     path('teacher/student/<int:student_id>/report/', views.student_report_pdf, name='student_report_pdf'),
     path("teacher/download/quiz/<int:quiz_id>/", views.download_quiz_report, name="download_quiz_report"),
-    path("teacher/broadcast/", views.broadcast_message, name="teacher_broadcast"),
     path("notifications/mark-read/<int:notification_id>/", views.mark_notification_read, name="mark_notification_read"),
 
     # Teacher report (all students in a quiz)
@@ -82,10 +84,16 @@ urlpatterns = [
       
     # take quiz page
     path('quiz/<int:quiz_id>/take/', views.take_quiz_view, name='take_quiz'),
+    path('quiz/<int:quiz_id>/snapshot/', views.quiz_snapshot_api, name='quiz_snapshot_api'),
+    path('admin/quiz/<int:quiz_id>/admission/', views.quiz_admission_metrics, name='quiz_admission_metrics'),
 
     # autosave single answer (POST JSON)
     path('attempt/<int:attempt_id>/submit-answer/', views.api_submit_answer, name='api_submit_answer'),
 
+    # autosave many answers at once (POST JSON) -> per-item acks
+    path('attempt/<int:attempt_id>/submit-answers/', views.api_submit_answers_batch, name='api_submit_answers_batch'),
+    path('attempt/<int:attempt_id>/journal/', views.api_answer_journal, name='api_answer_journal'),
+
     # final submit (POST JSON) -> computes score, marks completed
     path('attempt/<int:attempt_id>/submit/', views.api_submit_attempt, name='api_submit_attempt'),
 
@@ -104,6 +112,9 @@ urlpatterns = [
     # API endpoints used by fetch in the template
     path('api/student/notifications/unread/', views.api_notifications_unread, name='api_notifications_unread'),
     path('api/student/notifications/mark-read/', views.api_notifications_mark_read, name='api_notifications_mark_read'),
+    path('api/notifications/mark-all-read/', views.api_notifications_mark_all_read, name='api_notifications_mark_all_read'),
+    path('api/events/stream/', views.api_event_stream, name='api_event_stream'),
+    path('api/events/poll/', views.api_event_poll, name='api_event_poll'),
     path("api/quizzes/<int:quiz_id>/toggle-publish/", views.toggle_quiz_publish, name="toggle_quiz_publish"),
     path("api/quizzes/<int:quiz_id>/", views.quiz_detail_api, name="quiz_detail_api"),
    
@@ -1,12 +1,6 @@
-from .models import ActionLog
-from django.utils import timezone
-import json
+from .audit import record
 
-def log_action(user, action, model_name=None, object_id=None, details=None):
-    ActionLog.objects.create(
-        user=user,
-        action=action,
-        model_name=model_name,
-        object_id=str(object_id) if object_id else None,
-        details=details or {}
-    )
+
+def log_action(user, action_type, description="", model_name=None, object_id=None, details=None):
+    """Audit-log an action. Writes are batched behind the request (see exams.audit)."""
+    record(user, action_type, description=description, model_name=model_name, object_id=object_id, details=details)
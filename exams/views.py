@@ -4,15 +4,20 @@ from django.utils import timezone
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.cache import patch_cache_control
 from django.db.models import Sum, Avg, Count, Min, Max, Q
 from django.template.loader import render_to_string
 from django.core.paginator import Paginator
 from django.views.decorators.http import require_POST, require_http_methods
+from asgiref.sync import sync_to_async
 import json, os, io, datetime
 from io import BytesIO
 import openpyxl
 from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from zipfile import BadZipFile
 from datetime import datetime, timedelta
 
 from reportlab.lib.pagesizes import A4
@@ -30,9 +35,24 @@ User = get_user_model()
 
 
 # Your models
-from .models import Quiz, Question, Choice, StudentQuizAttempt, ActionLog, Answer, Class, Subject,RetakeRequest
+from .models import Quiz, Question, Choice, StudentQuizAttempt, ActionLog, Answer, Class, Subject,RetakeRequest, ReportJob
 from users.models import Notification
 from .utils import log_action
+from .autosave import apply_answer_batch, merge_answer_journal, MAX_BATCH_SIZE
+from . import changes, events
+from . import leaderboard as boards
+from .changes import Section, section_response
+from .dashboard import (
+    get_student_summary, past_attempt_rows, public_row, subject_performance, refresh_student_summary, note_attempt_started,
+    attempt_students, refresh_students, refresh_summaries_for_attempts,
+)
+from .answer_key import get_answer_key, invalidate_answer_key
+from .grading import finalize_attempt
+from .snapshots import get_quiz_snapshot, quiz_etag
+from .admission import AdmissionController
+from .broadcast import post_broadcast
+from .report_jobs import request_report, run_unserved, artifact_path
+from . import bulk_import, exports, inbox, quiz_import
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
 
@@ -46,9 +66,6 @@ from django.db.models import Sum
 from django.utils import timezone
 from reportlab.platypus import PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib import pyplot as plt
 
 
 
@@ -83,13 +100,11 @@ def superadmin_dashboard(request):
     teachers = User.objects.filter(role='teacher', approved=True).count()
     students = User.objects.filter(role='student', approved=True).count()
 
-    # leaderboard: top students by average total_score (only graded attempts)
-    leaderboard = (
-        StudentQuizAttempt.objects.filter(is_submitted=True)
-        .values("student__username")
-        .annotate(avg_score=Avg("score"))
-        .order_by("-avg_score")[:10]  # top 10
-    )
+    # leaderboard: top 10 students by average attempt score (global board)
+    leaderboard = [
+        {"username": e.student.username, "score": round(e.avg_score, 2)}
+        for e in boards.top(boards.GLOBAL, limit=10)
+    ]
 
     # recent action logs
     actions = ActionLog.objects.order_by('-timestamp')[:20]
@@ -165,7 +180,7 @@ def admin_dashboard_data(request):
                 return JsonResponse({"error": "invalid status"}, status=400)
             target_user.save(update_fields=["approved"])
             # Log action
-            ActionLog.objects.create(
+            log_action(
                 user=request.user,
                 action_type=f"Updated user status -> {new_status}",
                 model_name="User",
@@ -186,261 +201,184 @@ def admin_dashboard_data(request):
             if request.user.role == "teacher" and role != "student":
                 return JsonResponse({"error": "forbidden"}, status=403)
             # admins can send to both teachers/students
-            recipients = User.objects.filter(role=role, approved=True)
-            created = 0
-            for r in recipients:
-                Notification.objects.create(sender=request.user, recipient=r, message=message, role=role, is_broadcast=True)
-                created += 1
-                ActionLog.objects.create(
-                user=request.user,
-                action_type="Broadcast",
-                model_name="Notification",
-                object_id="bulk",
-                details={"role": role, "count": created, "message": message[:200]},
-            )
-            return JsonResponse({"ok": True, "message": f"Broadcast sent to {created} {role}(s).", "count": created})
+            return JsonResponse(_broadcast_reply(post_broadcast(request.user, message, role=role)))
 
     # -----------------------
     # GET: return dashboard data JSON
     # Supports pagination parameters: logs_page, quizzes_page, quizzes_page_size, logs_page_size
+    # Polls send ?cursor= / If-None-Match and get 304 or only the sections that changed
     # -----------------------
-    # Stats
-    stats = {
-        "total_users": User.objects.filter(role__in=["admin", "teacher", "student"], approved=True).count(),
-        "admins": User.objects.filter(role="admin", approved=True).count(),
-        "teachers": User.objects.filter(role="teacher", approved=True).count(),
-        "students": User.objects.filter(role="student", approved=True).count(),
-        "pending_users": User.objects.filter(approved=False).count(),
-        "classes": Class.objects.count(),
-        "subjects": Subject.objects.count(),
-        "quizzes": Quiz.objects.count(),
-    }
-    
+    def stats_section():
+        return {"stats": {
+            "total_users": User.objects.filter(role__in=["admin", "teacher", "student"], approved=True).count(),
+            "admins": User.objects.filter(role="admin", approved=True).count(),
+            "teachers": User.objects.filter(role="teacher", approved=True).count(),
+            "students": User.objects.filter(role="student", approved=True).count(),
+            "pending_users": User.objects.filter(approved=False).count(),
+            "classes": Class.objects.count(),
+            "subjects": Subject.objects.count(),
+            "quizzes": Quiz.objects.count(),
+        }}
+
     # Pending users (basic)
-    pending_list_qs = User.objects.filter(approved=False).order_by("-date_joined")
-    pending_list = list(pending_list_qs.values("id", "username", "email", "role", "date_joined")[:50])
+    def pending_section():
+        pending_list_qs = User.objects.filter(approved=False).order_by("-date_joined")
+        return {"pending_list": list(pending_list_qs.values("id", "username", "email", "role", "date_joined")[:50])}
 
     # Action logs paginated
-    logs_page = int(request.GET.get("logs_page", 1))
-    logs_page_size = int(request.GET.get("logs_page_size", 5))
-    logs_qs = ActionLog.objects.order_by("-timestamp")
-    paginator_logs = Paginator(logs_qs, logs_page_size)
-    page_logs = paginator_logs.get_page(logs_page)
-    logs = [
-        {"action_type": l.action_type, "user": (l.user.username if l.user else "system"), "timestamp": l.timestamp.isoformat(), "details": l.details}
-        for l in page_logs
-    ]
-
-        
-    # Best student per class (leaderboard showing top student for each class)
-    per_student_class_qs = (
-        StudentQuizAttempt.objects.filter(is_submitted=True)
-        .values(
-            "student__id",
-            "student__username",
-            "student__first_name",
-            "student__last_name",
-            "student__student_class__id",
-            "student__student_class__name",
-        )
-        .annotate(avg_score=Avg("score"))
-        .order_by("student__student_class__id", "-avg_score", "submitted_at")
-    )
-
-    # pick the top student per class (first row per class after ordering)
-    best_in_class_map = {}
-    for row in per_student_class_qs:
-        cls_id = row.get("student__student_class__id") or 0
-        if cls_id not in best_in_class_map:
-            best_in_class_map[cls_id] = {
-                "class_id": cls_id if cls_id != 0 else None,
-                "class_name": row.get("student__student_class__name") or "Unknown",
-                "student_id": row.get("student__id"),
-                "username": row.get("student__username"),
-                "first_name": row.get("student__first_name"),
-                "last_name": row.get("student__last_name"),
-                "avg_score": float(row.get("avg_score") or 0.0),
+    def logs_section():
+        logs_page = int(request.GET.get("logs_page", 1))
+        logs_page_size = int(request.GET.get("logs_page_size", 5))
+        logs_qs = ActionLog.objects.select_related("user").order_by("-timestamp")
+        paginator_logs = Paginator(logs_qs, logs_page_size)
+        page_logs = paginator_logs.get_page(logs_page)
+        logs = [
+            {"action_type": l.action_type, "user": (l.user.username if l.user else "system"), "timestamp": l.timestamp.isoformat(), "details": l.details}
+            for l in page_logs
+        ]
+        return {"logs": logs, "logs_total_pages": paginator_logs.num_pages}
+
+    def performance_section():
+        # Best student per class (top entry of each class board)
+        best_in_class = boards.best_per_class()
+        averages = boards.class_averages()
+        names = boards.class_names(set(averages) | {e.scope_id for e in best_in_class})
+        leaderboard = [
+            {
+                "class_id": e.scope_id or None,
+                "class_name": names.get(e.scope_id, "Unknown"),
+                "student_id": e.student_id,
+                "username": e.student.username,
+                "first_name": e.student.first_name,
+                "last_name": e.student.last_name,
+                "avg_score": e.avg_score,
             }
+            for e in best_in_class
+        ]
 
-    # final leaderboard: best student for each class
-    leaderboard = list(best_in_class_map.values())
-
-    # Class performance: average score per class (avg of attempts' scores grouped by student's class)
-    class_perf_qs = (
-        StudentQuizAttempt.objects.filter(is_submitted=True)
-        .values("student__student_class__id", "student__student_class__name")
-        .annotate(avg_score=Avg("score"))
-        .order_by("student__student_class__name")
-    )
-
-    class_performance = [
-        {
-            "class_id": row.get("student__student_class__id") or None,
-            "class_name": row.get("student__student_class__name") or "Unknown",
-            "avg_score": float(row.get("avg_score") or 0.0),
-        }
-        for row in class_perf_qs
-    
-    ]
+        # Class performance: average attempt score per class (students grouped by their class)
+        class_performance = sorted(
+            (
+                {"class_id": cls_id or None, "class_name": names.get(cls_id, "Unknown"), "avg_score": avg}
+                for cls_id, avg in averages.items()
+            ),
+            key=lambda row: row["class_name"],
+        )
+        # final leaderboard: best student for each class
+        return {"leaderboard": leaderboard, "class_performance": class_performance}
 
     # Available quizzes (paginated) - show basic metadata
-    quizzes_page = int(request.GET.get("quizzes_page", 1))
-    quizzes_page_size = int(request.GET.get("quizzes_page_size", 10))
-    quizzes_qs = Quiz.objects.select_related("subject", "created_by").order_by("-created_at")
-    paginator_quiz = Paginator(quizzes_qs, quizzes_page_size)
-    page_quiz = paginator_quiz.get_page(quizzes_page)
-    quizzes = [
-        {
-            "id": q.id,
-            "title": q.title,
-            "subject": q.subject.name,
-            "class_name": q.subject.school_class.name,
-            "created_by": getattr(q.created_by, "username", str(q.created_by)),
-            "start_time": q.start_time.isoformat(),
-            "end_time": q.end_time.isoformat(),
-            "is_published": q.is_published,
-            "allow_retake": getattr(q, "allow_retake", False),
-        }
-        for q in page_quiz
-    ]
+    def quizzes_section():
+        quizzes_page = int(request.GET.get("quizzes_page", 1))
+        quizzes_page_size = int(request.GET.get("quizzes_page_size", 10))
+        quizzes_qs = Quiz.objects.select_related("subject", "subject__school_class", "created_by").order_by("-created_at")
+        paginator_quiz = Paginator(quizzes_qs, quizzes_page_size)
+        page_quiz = paginator_quiz.get_page(quizzes_page)
+        quizzes = [
+            {
+                "id": q.id,
+                "title": q.title,
+                "subject": q.subject.name,
+                "class_name": q.subject.school_class.name,
+                "created_by": getattr(q.created_by, "username", str(q.created_by)),
+                "start_time": q.start_time.isoformat(),
+                "end_time": q.end_time.isoformat(),
+                "is_published": q.is_published,
+                "allow_retake": getattr(q, "allow_retake", False),
+            }
+            for q in page_quiz
+        ]
+        return {"quizzes": quizzes, "quizzes_total_pages": paginator_quiz.num_pages}
 
     # Notifications for this admin (last 10)
-    notifications_qs = Notification.objects.filter(recipient=request.user, is_read=False).order_by("-created_at")[:5]
-    notifications = [{"id": n.id, "message": n.message, "sender": getattr(n.sender, "username", None), "created_at": n.created_at.isoformat()} for n in notifications_qs]
-   
+    def notifications_section():
+        items = inbox.unread(request.user, limit=5)
+        return {
+            "notifications": [dict(item, created_at=item["created_at"].isoformat()) for item in items],
+            "unread_count": inbox.unread_count(request.user),
+        }
 
-    return JsonResponse({
-        "stats": stats,
-        "pending_list": pending_list,
-        "logs": logs,
-        "logs_total_pages": paginator_logs.num_pages,
-        "leaderboard": leaderboard,
-        "class_performance": class_performance,
-        "notifications": notifications,
-        "quizzes": quizzes,
-        "quizzes_total_pages": paginator_quiz.num_pages,
-    })
+    return section_response(request, [
+        Section("stats", [changes.USERS, changes.CATALOG, changes.QUIZZES], stats_section),
+        Section("pending", [changes.USERS], pending_section),
+        Section("logs", [changes.LOGS, changes.USERS], logs_section, params=("logs_page", "logs_page_size")),
+        Section("performance", [changes.LEADERBOARD, changes.USERS, changes.CATALOG], performance_section),
+        Section("notifications", [changes.notifications_scope(request.user.pk), changes.BROADCASTS], notifications_section),
+        Section("quizzes", [changes.QUIZZES, changes.CATALOG, changes.USERS], quizzes_section, params=("quizzes_page", "quizzes_page_size")),
+    ])
 
 
 @login_required
 @user_passes_test(is_teacher_or_admin)
 def admin_report_generator(request):
     """
-    Display the report generator page where admin/teacher can choose class and date range.
+    Display the report generator page where admin/teacher can choose class and date range,
+    or the scope of a results export.
     """
     classes = Class.objects.all()
-    return render(request, "exams/admin_report_generator.html", {"classes": classes})
+    subjects = Subject.objects.select_related("school_class").order_by("school_class__name", "name")
+    quizzes = Quiz.objects.select_related("school_class").order_by("-created_at").only("id", "title", "school_class__name")
+    return render(request, "exams/admin_report_generator.html", {"classes": classes, "subjects": subjects, "quizzes": quizzes})
 
 
 
-@login_required
-def admin_classes_report_pdf(request, class_id):
-    from .models import Class  
-    ClassModel = Class
-    class_obj = get_object_or_404(ClassModel, id=class_id)
-    students = User.objects.filter(role='student', student_class=class_obj)
+def _report_job_payload(job):
+    data = job.as_dict()
+    data["status_url"] = reverse("api_report_job", args=[job.id])
+    data["download_url"] = reverse("download_report_job", args=[job.id]) if job.status == "done" else None
+    return data
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{class_obj.name}_report.pdf"'
-    buffer = BytesIO()
 
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=30)
-    styles = getSampleStyleSheet()
-    elements = []
+def _report_response(request, job):
+    """
+    Serve a finished report. Otherwise answer 202 with where to follow the job:
+    JSON for AJAX clients, else a page that waits for it and then downloads the file.
+    """
+    if job.status == "done":
+        return _report_file(job)
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest" or "application/json" in request.headers.get("Accept", ""):
+        return JsonResponse({"ok": job.status != "failed", "job": _report_job_payload(job)}, status=202)
+    return render(request, "exams/report_job.html", {"job": _report_job_payload(job)}, status=202)
 
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'school_logo.png')
-    school_name = settings.SCHOOL_NAME if hasattr(settings, 'SCHOOL_NAME') else "My School"
 
-    for student in students:
-        # Header
-        try:
-            logo = Image(logo_path, width=1.2*inch, height=1.2*inch)
-        except Exception:
-            logo = Paragraph("", styles['Normal'])
+def _report_file(job):
+    try:
+        handle = open(artifact_path(job.artifact), "rb")
+    except (FileNotFoundError, IsADirectoryError):
+        raise Http404("Report file is no longer available; request the report again.")
+    return FileResponse(handle, as_attachment=True, filename=job.filename, content_type="application/pdf")
 
-        # Student photo
-        if hasattr(student, 'profile_picture') and student.profile_picture:
-            try:
-                student_photo = Image(student.profile_picture.path, width=1.2*inch, height=1.2*inch)
-            except Exception:
-                student_photo = Paragraph("", styles['Normal'])
-        else:
-            student_photo = Paragraph("", styles['Normal'])
 
-        header_data = [
-            [logo, Paragraph(f"<b>{school_name}</b>", ParagraphStyle('centered', fontSize=16, alignment=1)), student_photo]
-        ]
-        header_table = Table(header_data, colWidths=[1.5*inch, 3.5*inch, 1.5*inch])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(header_table)
-        elements.append(Spacer(1, 12))
-
-        # Student info
-        total_students = students.count()
-        info_text = f"""
-        <b>Student Name:</b> {student.get_full_name() or student.username}<br/>
-        <b>Class:</b> {class_obj.name}<br/>
-        <b>Total Students in Class:</b> {total_students}
-        """
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 12))
-
-        # Student attempts
-        attempts = StudentQuizAttempt.objects.filter(student=student).select_related('quiz__subject')
-
-        if attempts.exists():
-            subjects = [a.quiz.subject.name for a in attempts if a.quiz.subject]
-            scores = [a.score for a in attempts]
-
-            plt.figure(figsize=(5, 2))
-            plt.bar(subjects, scores)
-            plt.title("Performance by Subject")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-
-            chart_buf = BytesIO()
-            plt.savefig(chart_buf, format='png')
-            plt.close()
-            chart_buf.seek(0)
-            chart_img = Image(chart_buf, width=5.5*inch, height=2.2*inch)
-            elements.append(chart_img)
-            elements.append(Spacer(1, 12))
-
-            # Table
-            data = [["Exam Title", "Subject", "Score", "Date"]]
-            for attempt in attempts:
-                data.append([
-                    attempt.quiz.title,
-                    attempt.quiz.subject.name if attempt.quiz.subject else "—",
-                    f"{attempt.score}",
-                    attempt.submitted_at.strftime("%Y-%m-%d %H:%M") if attempt.submitted_at else "—"
-                ])
-
-            table = Table(data, colWidths=[160, 120, 80, 100])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#003366")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ]))
-            elements.append(table)
-        else:
-            elements.append(Paragraph("<i>No Exam attempts yet.</i>", styles['Normal']))
+def _get_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    if job.requested_by_id != request.user.id and request.user.role not in ("admin", "superadmin"):
+        raise Http404("Report job not found")
+    return job
 
-        # Add page break between students
-        elements.append(PageBreak())
 
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+@login_required
+@require_http_methods(["GET"])
+def api_report_job(request, job_id):
+    """GET -> status and progress of a report job (its requester, admins and superadmins only)."""
+    job = run_unserved(_get_report_job(request, job_id))  # left queued with no worker running: render it now
+    return JsonResponse({"ok": job.status != "failed", "job": _report_job_payload(job)})
+
+
+@login_required
+@require_http_methods(["GET"])
+def download_report_job(request, job_id):
+    job = _get_report_job(request, job_id)
+    if job.status != "done":
+        return JsonResponse({"ok": False, "error": "report not ready", "job": _report_job_payload(job)}, status=409)
+    return _report_file(job)
+
+
+@login_required
+def admin_classes_report_pdf(request, class_id):
+    """Report for every student of a class (rendered by the report worker, see exams.report_jobs)."""
+    class_obj = get_object_or_404(Class, id=class_id)
+    job = request_report(request.user, "class", {"class_id": class_obj.id}, f"{class_obj.name}_report.pdf")
+    return _report_response(request, job)
 
 
 @login_required
@@ -450,132 +388,64 @@ def admin_class_report_pdf(request):
     Generate report for selected class and date range.
     """
     class_id = request.GET.get("class_id")
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
+    start_date = request.GET.get("start_date") or None
+    end_date = request.GET.get("end_date") or None
 
     if not class_id:
         return HttpResponse("Class not selected.", status=400)
 
     class_obj = get_object_or_404(Class, id=class_id)
-    students = User.objects.filter(role='student', student_class=class_obj)
-
-    # Date filtering (optional)
-    date_filter = {}
-    if start_date:
-        date_filter["submitted_at__gte"] = datetime.strptime(start_date, "%Y-%m-%d")
-    if end_date:
-        date_filter["submitted_at__lte"] = datetime.strptime(end_date, "%Y-%m-%d")
+    try:
+        for value in (start_date, end_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return HttpResponse("Dates must be YYYY-MM-DD.", status=400)
 
-    response = HttpResponse(content_type='application/pdf')
     filename = f"{class_obj.name}_report_{timezone.now().strftime("%Y-%m-%d")}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=30)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # School branding
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'school_logo.png')
-    school_name = settings.SCHOOL_NAME if hasattr(settings, 'SCHOOL_NAME') else "My School"
-
-    for student in students:
-        # Header
-        try:
-            logo = Image(logo_path, width=1.2 * inch, height=1.2 * inch)
-        except Exception:
-            logo = Paragraph("", styles['Normal'])
-
-        # Student photo
-        if hasattr(student, 'profile_picture') and student.profile_picture:
-            try:
-                student_photo = Image(student.profile_picture.path, width=1.2 * inch, height=1.2 * inch)
-            except Exception:
-                student_photo = Paragraph("", styles['Normal'])
-        else:
-            student_photo = Paragraph("", styles['Normal'])
+    params = {"class_id": class_obj.id, "start_date": start_date, "end_date": end_date}
+    return _report_response(request, request_report(request.user, "class_range", params, filename))
 
-        header_data = [
-            [logo, Paragraph(f"<b>{school_name}</b>", ParagraphStyle('centered', fontSize=16, alignment=1)), student_photo]
-        ]
-        header_table = Table(header_data, colWidths=[1.5 * inch, 3.5 * inch, 1.5 * inch])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(header_table)
-        elements.append(Spacer(1, 12))
-
-        # Student info
-        total_students = students.count()
-        info_text = f"""
-        <b>Student Name:</b> {student.get_full_name() or student.username}<br/>
-        <b>Class:</b> {class_obj.name}<br/>
-        <b>Total Students in Class:</b> {total_students}
-        """
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 12))
-
-        # Quiz attempts filtered by date
-        attempts = StudentQuizAttempt.objects.filter(student=student, **date_filter)
-
-        if attempts.exists():
-            subjects = [a.quiz.subject.name for a in attempts if a.quiz.subject]
-            scores = [a.score for a in attempts]
-
-            # Chart
-            plt.figure(figsize=(5, 2))
-            plt.bar(subjects, scores, color="steelblue")
-            plt.title("Performance by Subject")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            chart_buf = BytesIO()
-            plt.savefig(chart_buf, format='png')
-            plt.close()
-            chart_buf.seek(0)
-            chart_img = Image(chart_buf, width=5.5 * inch, height=2.2 * inch)
-            elements.append(chart_img)
-            elements.append(Spacer(1, 12))
-
-            # Table
-            data = [["Exam Title", "Subject", "Score", "Date"]]
-            for attempt in attempts:
-                data.append([
-                    attempt.quiz.title,
-                    attempt.quiz.subject.name if attempt.quiz.subject else "—",
-                    f"{attempt.score}",
-                    attempt.submitted_at.strftime("%Y-%m-%d %H:%M") if attempt.submitted_at else "—"
-                ])
-            table = Table(data, colWidths=[160, 120, 80, 100])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#003366")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ]))
-            elements.append(table)
-        else:
-            elements.append(Paragraph("<i>No Exam attempts found for this period.</i>", styles['Normal']))
 
-        elements.append(PageBreak())
-
-    # Digital signature section
-    signature_text = f"""
-    <br/><br/><br/>
-    ____________________________ <br/>
-    <b>Class Teacher / Admin Signature</b><br/>
-    Generated on: {timezone.now().strftime("%d-%m-%Y %H:%M")}
+@login_required
+@user_passes_test(is_teacher_or_admin)
+@require_http_methods(["GET"])
+def export_results(request):
     """
-    elements.append(Paragraph(signature_text, styles['Normal']))
-
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    Results as a spreadsheet: ?kind=attempts (one row per attempt) or answers (per-question
+    scores), ?format=csv or xlsx, scoped by any of class_id, quiz_id, subject_id and a
+    start_date/end_date range (YYYY-MM-DD); streamed as it is read (see exams.exports).
+    """
+    kind = request.GET.get("kind", "attempts")
+    fmt = request.GET.get("format", "csv")
+    if kind not in exports.KINDS:
+        return HttpResponse(f"kind must be one of: {', '.join(exports.KINDS)}.", status=400)
+    if fmt not in exports.FORMATS:
+        return HttpResponse(f"format must be one of: {', '.join(exports.FORMATS)}.", status=400)
+
+    scope = {}
+    for name in ("class_id", "quiz_id", "subject_id"):
+        value = request.GET.get(name)
+        if value:
+            if not value.isdigit():
+                return HttpResponse(f"{name} must be a number.", status=400)
+            scope[name] = int(value)
+    for name in ("start_date", "end_date"):
+        value = request.GET.get(name)
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return HttpResponse("Dates must be YYYY-MM-DD.", status=400)
+            scope[name] = value
+
+    filename = f"exam_{kind}_{timezone.now().strftime('%Y-%m-%d')}.{fmt}"
+    log_action(user=request.user, action_type="Exported Results", details={"kind": kind, "format": fmt, **scope})
+    return StreamingHttpResponse(
+        exports.stream(kind, fmt, **scope),
+        content_type=exports.CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 # ----------------- TEACHER DASHBOARD -------------------
@@ -655,34 +525,9 @@ def teacher_dashboard_data(request):
         attempt_count=Count("studentquizattempt")
     ).order_by("-created_at")
 
-    quiz_page = Paginator(quizzes, 7).get_page(quiz_page_num)
-
-    # Broadcasts
-    broadcasts = Notification.objects.filter(sender=teacher).order_by("-created_at")
-    broadcast_page = Paginator(broadcasts, 5).get_page(broadcast_page_num)
-
-    # Notifications
-    notifications = Notification.objects.filter(recipient=teacher).order_by("-created_at")
-    notif_page = Paginator(notifications, 5).get_page(notif_page_num)
-
-    # Grading: only submitted but NOT yet graded attempts (pending grading)
-    teacher = request.user
-
-    # Show pending attempts initially (attempts that have at least one pending subjective answer)
-    pending_attempts = StudentQuizAttempt.objects.filter(quiz__created_by=teacher,is_submitted=True).select_related('quiz', 'student').distinct().order_by('-submitted_at')
-    
-    grade_page = Paginator(pending_attempts, 5).get_page(grade_page_num)
-    
-
-    # Performance
-    performance = (
-        StudentQuizAttempt.objects.filter(student__student_class=student_class)
-        .values("student__username")
-        .annotate(avg_score=Avg("score"))
-    )
-
-    data = {
-        "summary": {
+    # Each section below is rebuilt only when its data changed (see exams.changes)
+    def summary_section():
+        return {"summary": {
             "teacher": f" {teacher.username}, {teacher.first_name}",
             # return a simple count, not the QuerySet
             "attempts": attempts_qs.count(),
@@ -695,66 +540,103 @@ def teacher_dashboard_data(request):
             "graded": Answer.objects.filter(question__quiz__created_by=teacher, is_pending=False).count(),
             "attempts_total": StudentQuizAttempt.objects.filter(student__student_class=student_class).count(),
             "total_students": User.objects.filter(student_class=student_class, role="student").count(),
-        },
-        "quizzes": [
-            {
-                "id": q.id,
-                "title": q.title,
-                "subject": q.subject.name,
-                "class_name": q.subject.school_class.name,
-                "created_at": datetime.date(q.created_at),
-                "end_time": datetime.date(q.end_time),
-                "attempts": q.attempt_count,
-                "allow_retake": getattr(q, "allow_retake", False),
-            }
-            for q in quiz_page
-        ],
-        "notifications": [
-            {
-                "id": n.id,
-                "message": n.message,
-                "is_read": n.is_read,
-                "created_at": datetime.date(n.created_at),
-            }
-            for n in notif_page
-        ],
-        "broadcasts": [
-            {
-                "message": b.message,
-                "get_target_display": b.get_target_display(),
-                "created_at": datetime.date(b.created_at),
-            }
-            for b in broadcast_page
-        ],
-        "performance": list(performance),
-       
-        "grading": [
-            {
-                "id": a.id,
-                "student": a.student.username,
-                "full_name": a.student.get_full_name(),
-                "quiz": a.quiz.title,
-                "quiz_id": a.quiz.id,
-                "score": float(a.score or 0.0),
-                "graded": bool(a.graded),
-                "submitted_at": datetime.date(a.submitted_at) if getattr(a, "submitted_at", None) else None,
-            }
-            for a in grade_page
-        ],
+        }}
+
+    def quizzes_section():
+        quiz_page = Paginator(quizzes.select_related("subject", "subject__school_class"), 7).get_page(quiz_page_num)
+        return {
+            "quizzes": [
+                {
+                    "id": q.id,
+                    "title": q.title,
+                    "subject": q.subject.name,
+                    "class_name": q.subject.school_class.name,
+                    "created_at": datetime.date(q.created_at),
+                    "end_time": datetime.date(q.end_time),
+                    "attempts": q.attempt_count,
+                    "allow_retake": getattr(q, "allow_retake", False),
+                }
+                for q in quiz_page
+            ],
+            "pagination": {"quiz_page_number": quiz_page.number, "quiz_num_pages": quiz_page.paginator.num_pages},
+        }
 
-        "pagination": {
-            "quiz_page_number": quiz_page.number,
-            "quiz_num_pages": quiz_page.paginator.num_pages,
-            "notif_page_number": notif_page.number,
-            "notif_num_pages": notif_page.paginator.num_pages,
-            "broadcast_page_number": broadcast_page.number,
-            "broadcast_num_pages": broadcast_page.paginator.num_pages,
-            "grade_page_number": grade_page.number,
-            "grade_num_pages": grade_page.paginator.num_pages,
-        },
-    }
-   
-    return JsonResponse(data)
+    # Notifications
+    def notifications_section():
+        items, meta = inbox.page(teacher, notif_page_num, 5)
+        return {
+            "notifications": [
+                {
+                    "id": n["id"],
+                    "kind": n["kind"],
+                    "message": n["message"],
+                    "is_read": n["is_read"],
+                    "created_at": datetime.date(n["created_at"]),
+                }
+                for n in items
+            ],
+            "pagination": {"notif_page_number": meta["page"], "notif_num_pages": meta["pages"]},
+            "unread_count": inbox.unread_count(teacher),
+        }
+
+    # Broadcasts
+    def broadcasts_section():
+        sent, meta = inbox.sent_page(teacher, broadcast_page_num, 5)
+        return {
+            "broadcasts": [
+                {
+                    "message": b.message,
+                    "get_target_display": b.get_target_display(),
+                    "created_at": datetime.date(b.created_at),
+                }
+                for b in sent
+            ],
+            "pagination": {"broadcast_page_number": meta["page"], "broadcast_num_pages": meta["pages"]},
+        }
+
+    # Performance
+    def performance_section():
+        performance = (
+            StudentQuizAttempt.objects.filter(student__student_class=student_class)
+            .values("student__username")
+            .annotate(avg_score=Avg("score"))
+        )
+        return {"performance": list(performance)}
+
+    # Show pending attempts initially (attempts that have at least one pending subjective answer)
+    def grading_section():
+        pending_attempts = StudentQuizAttempt.objects.filter(quiz__created_by=teacher,is_submitted=True).select_related('quiz', 'student').distinct().order_by('-submitted_at')
+        grade_page = Paginator(pending_attempts, 5).get_page(grade_page_num)
+        return {
+            "grading": [
+                {
+                    "id": a.id,
+                    "student": a.student.username,
+                    "full_name": a.student.get_full_name(),
+                    "quiz": a.quiz.title,
+                    "quiz_id": a.quiz.id,
+                    "score": float(a.score or 0.0),
+                    "graded": bool(a.graded),
+                    "submitted_at": datetime.date(a.submitted_at) if getattr(a, "submitted_at", None) else None,
+                }
+                for a in grade_page
+            ],
+            "pagination": {"grade_page_number": grade_page.number, "grade_num_pages": grade_page.paginator.num_pages},
+        }
+
+    # attempts are tracked per student: those of the teacher's class and anyone who took their exams
+    attempts = changes.student_scopes(
+        attempt_students(quiz__created_by=teacher)
+        | set(User.objects.filter(student_class=student_class, role="student").values_list("pk", flat=True))
+    )
+    return section_response(request, [
+        Section("summary", [*attempts, changes.QUIZZES, changes.USERS], summary_section),
+        Section("quizzes", [changes.QUIZZES, *attempts, changes.CATALOG], quizzes_section, params=("page",)),
+        Section("notifications", [changes.notifications_scope(teacher.pk), changes.BROADCASTS], notifications_section, params=("notif_page",)),
+        Section("broadcasts", [changes.sent_scope(teacher.pk)], broadcasts_section, params=("broadcast_page",)),
+        Section("performance", [*attempts, changes.USERS], performance_section),
+        Section("grading", [*attempts, changes.USERS], grading_section, params=("grade_page",)),
+    ])
 
 
 # ============================
@@ -774,24 +656,14 @@ def teacher_broadcast(request):
         return JsonResponse({"error": "Missing fields"}, status=400)
 
     if audience == "students":
-        recipients = User.objects.filter(role="student")
+        role = "student"
     elif audience == "admin":
-        recipients = User.objects.filter(role="admin")
+        role = "admin"
     else:
         return JsonResponse({"error": "Invalid audience"}, status=400)
 
-    for r in recipients:
-        Notification.objects.create(sender=request.user, recipient=r, message=message)
-
-    ActionLog.objects.create(
-        user=request.user,
-        action_type="Teacher Broadcast",
-        model_name="Notification",
-        object_id=str(request.user.id),
-        details={"message": message, "audience": audience},
-    )
-
-    return JsonResponse({"success": True, "message": f"Broadcast sent to {audience}."})
+    reply = _broadcast_reply(post_broadcast(request.user, message, role=role, action_type="Teacher Broadcast"))
+    return JsonResponse({"success": True, "message": reply["message"], "broadcast": reply["broadcast"]})
 
 
 # ============================
@@ -842,6 +714,9 @@ def grade_attempt(request, attempt_id):
         attempt.score = total_score
         attempt.graded = True
         attempt.save(update_fields=["score", "graded"])
+        refresh_student_summary(attempt.student_id, [attempt.id])
+        boards.refresh_students([attempt.student_id])
+        events.publish(attempt.student_id, "graded", {"attempt_id": attempt.id, "quiz_id": attempt.quiz_id, "score": attempt.score})
 
         if _is_ajax(request):
             return JsonResponse({
@@ -891,135 +766,8 @@ def grade_attempt(request, attempt_id):
 @login_required
 def student_report_pdf(request, student_id):
     student = get_object_or_404(User, id=student_id, role='student')
-    attempts = StudentQuizAttempt.objects.filter(student=student).select_related('quiz__subject')
-
-    # Prepare PDF response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{student.username}_report.pdf"'
-    buffer = BytesIO()
-
-    # PDF setup
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=30)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # =============================
-    # HEADER SECTION (LOGO + TITLE + PHOTO)
-    # =============================
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'school_logo.png') 
-    school_name = settings.SCHOOL_NAME if hasattr(settings, 'SCHOOL_NAME') else "My School"
-
-    # Try loading logo
-    try:
-        logo = Image(logo_path, width=1.2*inch, height=1.2*inch)
-    except Exception:
-        logo = Paragraph("", styles['Normal'])
-
-    # Try loading student photo (if exists)
-    if hasattr(student, 'profile_picture') and student.profile_picture:
-        photo_path = student.profile_picture.path
-        try:
-            student_photo = Image(photo_path, width=1.2*inch, height=1.2*inch)
-        except Exception:
-            student_photo = Paragraph("", styles['Normal'])
-    else:
-        student_photo = Paragraph("", styles['Normal'])
-
-    # Header layout (logo, school name, student photo)
-    header_data = [
-        [logo, Paragraph(f"<b>{school_name}</b>", ParagraphStyle('centered', fontSize=16, alignment=1)), student_photo]
-    ]
-    header_table = Table(header_data, colWidths=[1.5*inch, 3.5*inch, 1.5*inch])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 12))
-
-    # =============================
-    # STUDENT INFO SECTION
-    # =============================
-    total_students = User.objects.filter(role='student', student_class=student.student_class).count()
-
-    info_text = f"""
-    <b>Student Name:</b> {student.get_full_name() or student.username}<br/>
-    <b>Class:</b> {student.student_class.name if hasattr(student, 'student_class') else 'N/A'}<br/>
-    <b>Total Students in Class:</b> {total_students}
-    """
-    elements.append(Paragraph(info_text, styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    # =============================
-    # PERFORMANCE CHART (MATPLOTLIB)
-    # =============================
-    if attempts.exists():
-        subjects = []
-        scores = []
-
-        for attempt in attempts:
-            if attempt.quiz.subject:
-                subjects.append(attempt.quiz.subject.name)
-                scores.append(attempt.score or 0.0)
-
-        if subjects:
-            fig = Figure(figsize=(6, 2))
-            ax = fig.add_subplot(111)
-            ax.bar(subjects, scores, color='#2a9df4')
-            ax.set_title("Student Performance by Subject")
-            ax.set_xlabel("Subject")
-            ax.set_ylabel("Score")
-            ax.tick_params(axis='x', rotation=45)
-            fig.tight_layout()
-
-            canvas = FigureCanvas(fig)
-            chart_buffer = BytesIO()
-            canvas.print_png(chart_buffer)
-            chart_buffer.seek(0)
-
-            chart_image = Image(chart_buffer, width=5.5*inch, height=4.5*inch)
-            elements.append(chart_image)
-            elements.append(Spacer(1, 20))
-
-    # =============================
-    # QUIZ ATTEMPT TABLE
-    # =============================
-    elements.append(Paragraph("<b>Exam Attempt Details</b>", styles['Heading3']))
-    elements.append(Spacer(1, 8))
-
-    if not attempts.exists():
-        elements.append(Paragraph("No Exam attempts yet.", styles['Normal']))
-    else:
-        data = [["Exam Title", "Subject", "Score", "Date Taken"]]
-        for attempt in attempts:
-            data.append([
-                attempt.quiz.title,
-                attempt.quiz.subject.name if attempt.quiz.subject else "—",
-                f"{attempt.score}",
-                attempt.submitted_at.strftime("%d-%m-%Y %H:%M") if attempt.submitted_at else "—"
-            ])
-
-        table = Table(data, colWidths=[160, 120, 80, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#003366")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ]))
-        elements.append(table)
-
-    # =============================
-    # BUILD DOCUMENT
-    # =============================
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    job = request_report(request.user, "student", {"student_id": student.id}, f"{student.username}_report.pdf")
+    return _report_response(request, job)
 
 
 
@@ -1046,65 +794,22 @@ def approve_retake(request, quiz_id, student_id):
     attempt.end_time = None
     attempt.retake_count += 1
     attempt.save()
+    refresh_student_summary(student.id, [attempt.id])
+    boards.refresh_students([student.id])
   
     Notification.objects.create(user=student, recipient=student, message=f"You can now retake Exam: {quiz.title}")
-    ActionLog.objects.create(user=request.user, action_type="Approved Retake", model_name="Exam", object_id=str(quiz.id))
+    log_action(user=request.user, action_type="Approved Retake", model_name="Exam", object_id=str(quiz.id))
 
     return JsonResponse({"success": True})
 
-# ----------------- BROADCAST MESSAGE -------------------
-@login_required
-@user_passes_test(is_teacher)
-def broadcast_message(request):
-    """
-    Allows a teacher to send broadcast messages to students in their classes or admins.
-    """
-    if request.method == "POST":
-        message = request.POST.get("message", "").strip()
-        audience = request.POST.get("audience", "students")
-
-        if not message:
-            return JsonResponse({"error": "Message cannot be empty."}, status=400)
-
-        if audience == "students":
-            # Send to students in teacher's class
-            students = User.objects.filter(
-                role="student", school_class__in=request.user.classes.all()
-            )
-        elif audience == "admin":
-            students = User.objects.filter(role="admin")
-        else:
-            return JsonResponse({"error": "Invalid audience."}, status=400)
-
-        for student in students:
-            Notification.objects.create(
-                recipient=student,
-                sender=request.user,
-                message=message,
-                is_broadcast=True,
-                role="student" if audience == "students" else "admin",
-                created_at=timezone.now()
-            )
-
-        ActionLog.objects.create(
-            user=request.user,
-            action="Broadcast Message",
-            model_name="Notification",
-            object_id=str(request.user.id)
-        )
-
-        return JsonResponse({"success": True, "message": "Broadcast sent successfully!"})
-    return JsonResponse({"error": "Invalid request method."}, status=400)
-
 # ----------------- MARK NOTIFICATION READ -------------------
 @login_required
 def mark_notification_read(request, notification_id):
     """
     Marks a specific notification as read.
     """
-    notif = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-    notif.is_read = True
-    notif.save()
+    if not inbox.mark_read(request.user, notification_id):
+        raise Http404("Notification not found")
     return JsonResponse({"success": True})
 
 # ----------------- DOWNLOAD REPORTS -------------------
@@ -1203,192 +908,111 @@ def student_dashboard_data(request):
     attempts_page_size = int(request.GET.get("attempts_page_size", 5))
 
     # ---------------- Notifications (paginated) ----------------
-    notif_qs = Notification.objects.filter(recipient=student).order_by("-created_at")
-    notif_p = Paginator(notif_qs, notif_page_size)
-    notif_page_obj = notif_p.get_page(notif_page)
-    notifications = [
-        {"id": n.id, "message": n.message, "is_read": n.is_read, "created_at": datetime.date(n.created_at)}
-        for n in notif_page_obj
-    ]
-    notif_meta = {"page": notif_page_obj.number, "pages": notif_p.num_pages, "total": notif_p.count}
+    def notifications_section():
+        items, notif_meta = inbox.page(student, notif_page, notif_page_size)
+        notifications = [
+            {"id": n["id"], "kind": n["kind"], "message": n["message"], "is_read": n["is_read"], "created_at": datetime.date(n["created_at"])}
+            for n in items
+        ]
+        return {"notifications": notifications, "notifications_meta": notif_meta, "unread_count": inbox.unread_count(student)}
 
     
     # ---------------- Available quizzes (paginated) ----------------
-
-    now = timezone.now()
-    if student_class is None:
-        available_qs = Quiz.objects.none()
-    else:
-        available_qs = Quiz.objects.filter(
-        school_class__name=student_class,
-        is_published=True, 
-        end_time__gte=now 
-        ).order_by("-created_at")
-
-        # exclude quizzes already completed without retake allowed
-        exclude_ids = StudentQuizAttempt.objects.filter(
-            student=student, is_submitted=True, retake_allowed=False,
-        ).values_list("quiz_id", flat=True)
-        available_qs = available_qs.exclude(id__in=exclude_ids) 
-
-    qp = Paginator(available_qs, quizzes_page_size)
-    qp_obj = qp.get_page(quizzes_page)
-
-    quizzes_data = []
-    # build rich data (can't easily get allow_retake from values; use getattr)
-    for q in qp_obj:
-        # check last attempt status
-        last_attempt = StudentQuizAttempt.objects.filter(student=student, quiz=q).order_by("-started_at").first()
-        already_submitted = StudentQuizAttempt.objects.filter(student=student, quiz=q, is_submitted=True).exists()
-        student_retake_override = bool(last_attempt and getattr(last_attempt, "retake_allowed", False))
-        allow_retake_global = getattr(q, "allow_retake", False) if hasattr(q, "allow_retake") else False
+    def quizzes_section():
+        now = timezone.now()
+        if student_class is None:
+            available_qs = Quiz.objects.none()
+        else:
+            available_qs = Quiz.objects.filter(
+            school_class__name=student_class,
+            is_published=True, 
+            end_time__gte=now 
+            ).order_by("-created_at")
+
+            # exclude quizzes already completed without retake allowed
+            exclude_ids = StudentQuizAttempt.objects.filter(
+                student=student, is_submitted=True, retake_allowed=False,
+            ).values_list("quiz_id", flat=True)
+            available_qs = available_qs.exclude(id__in=exclude_ids) 
+
+        qp = Paginator(available_qs, quizzes_page_size)
+        qp_obj = qp.get_page(quizzes_page)
+
+        quizzes_data = []
+        # build rich data (can't easily get allow_retake from values; use getattr)
+        for q in qp_obj:
+            # check last attempt status
+            last_attempt = StudentQuizAttempt.objects.filter(student=student, quiz=q).order_by("-started_at").first()
+            already_submitted = StudentQuizAttempt.objects.filter(student=student, quiz=q, is_submitted=True).exists()
+            student_retake_override = bool(last_attempt and getattr(last_attempt, "retake_allowed", False))
+            allow_retake_global = getattr(q, "allow_retake", False) if hasattr(q, "allow_retake") else False
         
-        # Added lately for great UI/UX. 
-        latest_request = RetakeRequest.objects.filter(student=request.user, quiz=q).last()
-        retake_request_count = RetakeRequest.objects.filter(student=already_submitted, quiz=q).count()
-        retake_status = latest_request.status if latest_request else None
+            # Added lately for great UI/UX. 
+            latest_request = RetakeRequest.objects.filter(student=request.user, quiz=q).last()
+            retake_request_count = RetakeRequest.objects.filter(student=already_submitted, quiz=q).count()
+            retake_status = latest_request.status if latest_request else None
         
-        quizzes_data.append({
-            "id": q.id,
-            "title": q.title,
-            "subject": q.subject.name if q.subject else "",
-            "class_name": q.subject.school_class.name if (q.subject and q.subject.school_class) else "",
-            "start_time": datetime.date(q.start_time) if q.start_time else None,
-            "end_time": datetime.date(q.end_time) if q.end_time else None,
-            "duration_minutes": getattr(q, "duration_minutes", None),
-            "is_published": bool(q.is_published),
-            "allow_retake": bool(allow_retake_global),
-            "already_submitted": bool(already_submitted),
-            "student_retake_override": student_retake_override,
-            "retake_status": retake_status,  # 🔹 added
-        })
+            quizzes_data.append({
+                "id": q.id,
+                "title": q.title,
+                "subject": q.subject.name if q.subject else "",
+                "class_name": q.subject.school_class.name if (q.subject and q.subject.school_class) else "",
+                "start_time": datetime.date(q.start_time) if q.start_time else None,
+                "end_time": datetime.date(q.end_time) if q.end_time else None,
+                "duration_minutes": getattr(q, "duration_minutes", None),
+                "is_published": bool(q.is_published),
+                "allow_retake": bool(allow_retake_global),
+                "already_submitted": bool(already_submitted),
+                "student_retake_override": student_retake_override,
+                "retake_status": retake_status,  # 🔹 added
+            })
             
-    quizzes_meta = {"page": qp_obj.number, "pages": qp.num_pages, "total": qp.count}
-
- 
-      # ---------------- Summary ----------------
-
-    total_attempts = StudentQuizAttempt.objects.filter(student=student).count()
-    auto_graded_count = Answer.objects.filter(attempt__student=student, is_pending=False).count()
-    pending_subjectives = Answer.objects.filter(attempt__student=student, is_pending=True).count()
-
-    summary = {
-        "total_attempts": total_attempts,
-        "auto_graded_count": auto_graded_count,
-        "pending_subjectives": pending_subjectives,
-    } 
-
-
-    # ---------------- Past attempts (paginated) ----------------
-    attempts_qs = StudentQuizAttempt.objects.filter(student=student, is_submitted=True, retake_requested=False).select_related("quiz").order_by("-started_at")
-    ap = Paginator(attempts_qs, attempts_page_size)
-    ap_obj = ap.get_page(attempts_page)
-
-    past_attempts = []
-    for a in ap_obj:
-        # compute totals for this attempt using Answer model
-        answer = Answer.objects.filter(attempt=a).select_related("question", "selected_choice")
-        total_score = Answer.objects.filter(attempt=a).aggregate(total=Sum('score'))['total'] or 0
-        total_qmarks = 0.0
-        obtained = 0.0
-        pending_subjectives_count = 0
-        wrong_review = []
-        for ans in answer:
-            q_marks = getattr(ans.question, "marks", 0) or 0
-            total_qmarks += q_marks
-            if ans.is_pending:
-                pending_subjectives_count += 1
-                # subjective might not have marks yet; don't include
-            else:
-                # for objective and graded subjective
-                obtained += float(ans.score or 0.0)
-            # for review: detect wrong objective answer
-            # if question is objective and selected_choice exists but is incorrect
-            if getattr(ans.question, "question_type", getattr(ans.question, "type", None)) in ("objective", "multiple_choice"):
-                if not (ans.selected_choice and getattr(ans.selected_choice, "is_correct", False)):
-                    # get correct answer text(s)
-                    correct_choices = ans.question.choices.filter(is_correct=True).values_list("text", flat=True)
-                    correct_text = ", ".join(correct_choices) if correct_choices else ""
-                    user_ans = ans.selected_choice.text if ans.selected_choice else "-"
-                    wrong_review.append({
-                        "question": ans.question.text,
-                        "your_answer": user_ans,
-                        "correct_answer": correct_text
-                    })
-
-        past_attempts.append({
-            "attempt_id": a.id,
-            "quiz_id": a.quiz.id,
-            "quiz": a.quiz.title if a.quiz else "", 
-            "subject": a.quiz.subject.name,
-            "total_score": total_score,
-            "obtained": obtained,
-            "total_qmarks": total_qmarks,
-            "pending_subjectives": pending_subjectives_count,
-            "is_submitted": bool(a.is_submitted),
-            "started_at": datetime.date(a.started_at) if getattr(a, "started_at", None) else None,
-            "submitted_at": datetime.date(getattr(a, "submitted_at", None)) if getattr(a, "submitted_at", None) else None,
-            "wrong_answer": wrong_review,
-            "retake_count": getattr(a, "retake_count", 0),
-        })
-
-    
-    attempts_meta = {"page": ap_obj.number, "pages": ap.num_pages, "total": ap.count}
-
-
-  
-    # ---------------- Leaderboard (top 10 students) ----------------
-    lb_qs = (
-        StudentQuizAttempt.objects.filter(is_submitted=True, student__student_class=request.user.student_class)
-        .values("student__id", "student__username", "student__first_name", "student__last_name")
-        .annotate(avg_score=Avg("score"))
-        .order_by("-avg_score")[:10]
-    )
-    leaderboard = [
-        {
-            "student_id": r["student__id"],
-            "username": r.get("student__username"),
-            "full_name": f"{r.get('student__first_name') or ''} {r.get('student__last_name') or ''}".strip(),
-            "avg_score": float(r["avg_score"] or 0)
+        quizzes_meta = {"page": qp_obj.number, "pages": qp.num_pages, "total": qp.count}
+        return {"available_quizzes": quizzes_data, "available_quizzes_meta": quizzes_meta}
+
+
+    # ---------------- Summary, past attempts (paginated), performance chart ----------------
+    def summary_section():
+        # counts, past attempts and chart come precomputed (refreshed on submit/grade/retake)
+        dashboard = get_student_summary(student)
+        summary = {
+            "total_attempts": dashboard.total_attempts,
+            "auto_graded_count": dashboard.auto_graded_count,
+            "pending_subjectives": dashboard.pending_subjectives,
+        }
+        ap = Paginator(past_attempt_rows(dashboard), attempts_page_size)
+        ap_obj = ap.get_page(attempts_page)
+        return {
+            "summary": summary,
+            "past_attempts": [public_row(row) for row in ap_obj],
+            "past_attempts_meta": {"page": ap_obj.number, "pages": ap.num_pages, "total": ap.count},
+            "performance_chart": subject_performance(dashboard, getattr(student_class, "id", None)),
         }
-        for r in lb_qs
-    ]
-
-    # ---------------- Performance Chart (per subject in student's class) ----------------
-    
 
-    attempts = StudentQuizAttempt.objects.filter(student=student, is_submitted=True)
 
-    performance_chart = []
-    for att in attempts:    
-        perf_qs = Answer.objects.filter(
-            attempt=att,
-            attempt__quiz__school_class=student_class
-        ).values("attempt__quiz__subject__name").annotate(
-            obtained=Sum('score'),
-            possible=Sum("question__marks")
-        )
-        for r in perf_qs:
-            subj = r.get("attempt__quiz__subject__name") or "Unknown"
-            obtained = float(r.get("obtained") or 0)
-            possible = float(r.get("possible") or 0) or 0.0
-            pct = round((obtained / possible) * 100, 2) if possible > 0 else 0.0
-            performance_chart.append({"subject": subj, "obtained": obtained, "possible": possible, "percentage": pct})
-   
+    # ---------------- Leaderboard (top 10 students) ----------------
+    def leaderboard_section():
+        entries = boards.top(boards.CLASS, request.user.student_class_id, limit=10)
+        leaderboard = [
+            {
+                "student_id": e.student_id,
+                "username": e.student.username,
+                "full_name": e.student.get_full_name(),
+                "avg_score": e.avg_score,
+            }
+            for e in entries
+        ]
+        return {"leaderboard": leaderboard}
 
-    # ---------------- Return JSON ----------------
 
-    return JsonResponse({
-        "notifications": notifications,
-        "notifications_meta": notif_meta,
-        "summary": summary,
-        "available_quizzes": quizzes_data,
-        "available_quizzes_meta": quizzes_meta,
-        "past_attempts": past_attempts,
-        "past_attempts_meta": attempts_meta,
-        "leaderboard": leaderboard,
-        "performance_chart": performance_chart,
-    })
+    # ---------------- Return JSON (only the sections that changed since ?cursor=) ----------------
+    return section_response(request, [
+        Section("notifications", [changes.notifications_scope(student.pk), changes.BROADCASTS], notifications_section, params=("notif_page", "notif_page_size")),
+        # availability also depends on the clock (end_time), so refresh at least every minute
+        Section("quizzes", [changes.QUIZZES, changes.RETAKES, changes.student_scope(student.pk)], quizzes_section, params=("quizzes_page", "quizzes_page_size"), max_age=60),
+        Section("summary", [changes.student_scope(student.pk)], summary_section, params=("attempts_page", "attempts_page_size")),
+        Section("leaderboard", [changes.LEADERBOARD, changes.USERS], leaderboard_section),
+    ])
 
 
 
@@ -1433,7 +1057,8 @@ def api_broadcast(request):
     POST JSON { "role": "student"|"teacher", "message": "..." }
     - Admins (admin/superadmin) may broadcast to 'teacher' or 'student'
     - Teachers may broadcast only to 'student'
-    Creates Notification objects for each recipient and logs ActionLog.
+    Posts one BroadcastMessage for the role (see exams.broadcast) and logs one ActionLog.
+    Returns {ok, message, broadcast}.
     """
     try:
         payload = json.loads(request.body.decode())
@@ -1453,22 +1078,16 @@ def api_broadcast(request):
     if request.user.role not in ("admin", "superadmin", "teacher"):
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
 
-    recipients = User.objects.filter(role=role, approved=True)
-    created = 0
-    for r in recipients:
-        # Notification.objects.create(sender=request.user, recipient=r, role=role, message=message, created_at=timezone.now())
-        created += 1
+    return JsonResponse(_broadcast_reply(post_broadcast(request.user, message, role=role, action_type="Broadcast sent")))
 
-    ActionLog.objects.create(
-        user=request.user,
-        action="Broadcast sent",
-        model_name="Notification",
-        object_id="bulk",
-        details={"role": role, "count": created, "sample": message[:120]},
-        timestamp=timezone.now()
-    )
 
-    return JsonResponse({"ok": True, "message": f"Broadcast sent to {created} {role}(s).", "count": created})
+def _broadcast_reply(broadcast):
+    """JSON body for a posted broadcast."""
+    return {
+        "ok": True,
+        "message": f"Broadcast sent to {broadcast.audience_display()}.",
+        "broadcast": {"id": broadcast.id, "audience": broadcast.audience_display(), "created_at": broadcast.created_at.isoformat()},
+    }
 
 
 # -------------------
@@ -1515,13 +1134,12 @@ def api_notifications_mark_read(request):
     notif.is_read = True
     notif.save(update_fields=["is_read"])
 
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
-        action="Read notification",
+        action_type="Read notification",
         model_name="Notification",
         object_id=str(nid),
         # details={"message_sample": (notif.message[:80] if notif.message else "")},
-        timestamp=timezone.now()
     )
 
     return JsonResponse({"ok": True, "message": "marked read", "id": nid})
@@ -1532,24 +1150,39 @@ def api_notifications_mark_read(request):
 
 @require_http_methods(["GET"])
 def api_notifications_unread(request):
-    """Return unread notifications for current user."""
+    """
+    Return the newest unread notifications for current user (direct ones and broadcasts to their audience, see exams.inbox).
+    GET ?limit= (default 20, at most 100); "count" is the total unread.
+    """
     if not request.user.is_authenticated:
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
 
-    from users.models import Notification  # import here to avoid circular issues
-    qs = Notification.objects.filter(recipient=request.user, is_read=False).order_by("-created_at")
-    notifs = [{
-        "id": n.id,
-        "message": n.message,
-        "sender": n.sender.username if n.sender else None,
-        "created_at": n.created_at.isoformat()
-    } for n in qs]
-    return JsonResponse({"ok": True, "notifications": notifs})
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid limit"}, status=400)
+    notifs = [dict(item, created_at=item["created_at"].isoformat()) for item in inbox.unread(request.user, limit=limit)]
+    return JsonResponse({"ok": True, "count": inbox.unread_count(request.user), "notifications": notifs})
+
+
+@require_http_methods(["POST"])
+def api_notifications_mark_all_read(request):
+    """Mark all of current user's notifications and broadcasts as read."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    marked = inbox.mark_all_read(request.user)
+    if marked:
+        log_action(user=request.user, action_type="Read all notifications", model_name="Notification", details={"count": marked})
+    return JsonResponse({"ok": True, "marked": marked, "count": 0})
 
 
 @require_http_methods(["POST"])
 def api_notifications_mark_read(request):
-    """Mark notification as read (student/teacher/admin)."""
+    """
+    Mark notification as read (student/teacher/admin).
+    POST JSON {id, kind}: kind "broadcast" records a read receipt, otherwise ("notification") the Notification is updated
+    """
     if not request.user.is_authenticated:
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
 
@@ -1561,13 +1194,80 @@ def api_notifications_mark_read(request):
     nid = payload.get("id")
     if not nid:
         return JsonResponse({"ok": False, "error": "id required"}, status=400)
+    kind = payload.get("kind") or inbox.NOTIFICATION
+    if kind not in (inbox.NOTIFICATION, inbox.BROADCAST):
+        return JsonResponse({"ok": False, "error": "invalid kind"}, status=400)
 
-    from users.models import Notification
-    notif = get_object_or_404(Notification, id=nid, recipient=request.user)
-    notif.is_read = True
-    notif.save(update_fields=["is_read"])
-    ActionLog.objects.create(user=request.user, action_type="Read notification", model_name="Notification", object_id=str(nid))
-    return JsonResponse({"ok": True, "id": nid})
+    if not inbox.mark_read(request.user, nid, kind):
+        return JsonResponse({"ok": False, "error": "not found"}, status=404)
+    model_name = "BroadcastMessage" if kind == inbox.BROADCAST else "Notification"
+    log_action(user=request.user, action_type="Read notification", model_name=model_name, object_id=str(nid))
+    return JsonResponse({"ok": True, "id": nid, "kind": kind})
+
+
+# -------------------
+# Push channel: notifications, grading results, retake decisions as they happen
+# -------------------
+@require_http_methods(["GET"])
+def api_event_stream(request):
+    """
+    Server-sent events for request.user (EventSource). Each message's data is
+    {id, type, data, created_at}; a reconnecting browser sends Last-Event-ID and gets
+    what it missed. Served from school/asgi.py a waiting stream holds no thread. Under
+    WSGI a stream would hold a worker thread, so unless EVENTS_SYNC_STREAM_SECONDS allows
+    short ones it answers 204, which stops the EventSource, and the page long-polls instead.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    is_asgi = isinstance(request, ASGIRequest)
+    sync_seconds = getattr(settings, "EVENTS_SYNC_STREAM_SECONDS", 0)
+    if not is_asgi and sync_seconds <= 0:
+        return HttpResponse(status=204)
+
+    after_id = events.parse_event_id(request.headers.get("Last-Event-ID") or request.GET.get("last_event_id"))
+    sub = events.subscribe(request.user, after_id)
+    if is_asgi:
+        body = events.asse_stream(sub, getattr(settings, "EVENTS_STREAM_SECONDS", 300))
+    else:
+        body = events.sse_stream(sub, sync_seconds)
+    response = StreamingHttpResponse(body, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return response
+
+
+@require_http_methods(["GET"])
+async def api_event_poll(request):
+    """
+    Long-poll fallback for the event stream.
+    GET ?after=<id>&timeout=<s> -> waits up to timeout seconds (max 55) for events newer than id
+    Without ?after= returns immediately with the current last_id to start from.
+    Returns {ok, events: [...], last_id}
+    Under ASGI a waiting poll holds no thread. Under WSGI it would hold a worker thread, so
+    it waits no longer than EVENTS_SYNC_STREAM_SECONDS (0: answers at once and the page
+    polls again on its interval).
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    after_id = events.parse_event_id(request.GET.get("after"))
+    if after_id is None:
+        return JsonResponse({"ok": True, "events": [], "last_id": await sync_to_async(events.last_event_id)()})
+    try:
+        timeout = min(max(float(request.GET.get("timeout", 25)), 0), 55)
+    except ValueError:
+        timeout = 25
+    if not isinstance(request, ASGIRequest):
+        timeout = min(timeout, getattr(settings, "EVENTS_SYNC_STREAM_SECONDS", 0))
+
+    sub = await sync_to_async(events.subscribe)(user, after_id)
+    try:
+        new_events = await sub.aget(timeout)
+    finally:
+        sub.close()
+    return JsonResponse({"ok": True, "events": [e.as_dict() for e in new_events], "last_id": sub.last_id})
 
 
 
@@ -1596,7 +1296,7 @@ def create_user(request):
         password = request.POST["password"]
 
         user = User.objects.create_user(username=username, email=email, password=password, role=role, approved=True)
-        ActionLog.objects.create(user=request.user, action=f"Created user {user.username} ({role})")
+        log_action(request.user, "Created user", description=f"Created user {user.username} ({role})", model_name="User", object_id=user.id)
         messages.success(request, f"User {username} created successfully.")
         return redirect("manage_users")
 
@@ -1638,7 +1338,10 @@ def class_subject_crud(request):
 
         # ✅ DELETE CLASS
         elif action == "delete_class":
+            students = attempt_students(quiz__school_class_id=data["id"])
             Class.objects.filter(pk=data["id"]).delete()
+            refresh_students(students)
+            boards.refresh_students(students)
 
         # ✅ CREATE SUBJECT
         elif action == "create_subject":
@@ -1656,7 +1359,10 @@ def class_subject_crud(request):
 
         # ✅ DELETE SUBJECT
         elif action == "delete_subject":
+            students = attempt_students(quiz__subject_id=data["id"])
             Subject.objects.filter(pk=data["id"]).delete()
+            refresh_students(students)
+            boards.refresh_students(students)
 
         return JsonResponse(serialize_all(), safe=False)
 
@@ -1741,7 +1447,7 @@ def create_quiz(request):
 
         subject = Subject.objects.get(id=subject_id)
         quiz = Quiz.objects.create(title=title, subject=subject, duration=duration, created_by=request.user)
-        ActionLog.objects.create(user=request.user, action_type=f"Created quiz {quiz.title}")
+        log_action(request.user, "Created quiz", description=f"Created quiz {quiz.title}", model_name="Exam", object_id=quiz.id)
         messages.success(request, f"Quiz {title} created successfully.")
         return redirect("manage_quizzes")
 
@@ -1766,7 +1472,7 @@ def upload_quiz_excel(request):
             subject, _ = Subject.objects.get_or_create(name=subject_name)
             Quiz.objects.create(title=title, subject=subject, duration=int(duration), created_by=request.user)
 
-        ActionLog.objects.create(user=request.user, action_type=f"Uploaded Exams from Excel")
+        log_action(request.user, "Uploaded Exams from Excel")
         messages.success(request, "Exams uploaded successfully.")
         return redirect("manage_quizzes")
 
@@ -1868,12 +1574,15 @@ def handle_retake_request(request, request_id):
 
         if attempt:
             # delete answers then attempt
+            attempt_id = attempt.id
             Answer.objects.filter(attempt=attempt).delete()
             attempt.delete()
+            refresh_student_summary(req.student_id, [attempt_id])
+            boards.refresh_students([req.student_id])
 
         message = f"Your retake request for {req.quiz.title} was approved."
         # log & notify
-        ActionLog.objects.create(
+        log_action(
             user=request.user,
             action_type="Retake Approved",
             model_name="RetakeRequest",
@@ -1886,6 +1595,7 @@ def handle_retake_request(request, request_id):
             role="student",
             message=message,
         )
+        events.publish(req.student_id, "retake", {"request_id": req.id, "quiz_id": req.quiz_id, "status": req.status})
 
         return JsonResponse({"success": True, "message": "Retake approved and previous attempt removed"})
 
@@ -1893,7 +1603,7 @@ def handle_retake_request(request, request_id):
     req.status = "denied"
     req.save(update_fields=["status"])
     message = f"Your retake request for {req.quiz.title} was denied."
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
         action_type="Retake Denied",
         model_name="RetakeRequest",
@@ -1906,6 +1616,7 @@ def handle_retake_request(request, request_id):
         role="student",
         message=message,
     )
+    events.publish(req.student_id, "retake", {"request_id": req.id, "quiz_id": req.quiz_id, "status": req.status})
     return JsonResponse({"success": True, "message": "Retake denied"})
 
 # -----------------------------Retake Approval & Request ended ---------------------------------#
@@ -1968,119 +1679,19 @@ def handle_retake_request(request, request_id):
 # --------------------------------------------------------------#
 # PDF export (consolidated results for a student)
 
+@login_required
 def download_student_full_report(request, student_id):
     """Download full report for a single student (all quizzes)."""
-    # Fetch attempts for this student
-    attempts = StudentQuizAttempt.objects.filter(student_id=student_id).select_related("quiz", "quiz__subject")
-
-    # Prepare PDF response
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="student_{student_id}_results.pdf"'
-
-    doc = SimpleDocTemplate(response, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Header: logo | school name + student | student photo
-    school_logo = os.path.join(settings.MEDIA_ROOT, "school_logo.png")
-    student = attempts.first().student if attempts.exists() else None
-    school_name = getattr(settings, "SCHOOL_NAME", "My School Name")
-    student_photo = getattr(student, "profile_picture", None)  # assuming User has photo field
-
-    header_data = [
-        [
-            Image(school_logo, width=50, height=50) if os.path.exists(school_logo) else "",
-            Paragraph(f"<b>{school_name}</b><br/> " + (student.get_full_name() if student else "Unknown"), styles["Title"]),
-            Image(student_photo.path, width=50, height=50) if student_photo and os.path.exists(student_photo.path) else "",
-        ]
-    ]
-    header_table = Table(header_data, colWidths=[70, 350, 70])
-    header_table.setStyle(TableStyle([("ALIGN", (1, 0), (1, 0), "CENTER")]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 20))
-
-    # Loop through attempts
-    for attempt in attempts:
-        elements.append(Paragraph(f"<b>Exam:</b> {attempt.quiz.title}", styles["Heading3"]))
-        elements.append(Paragraph(f"Subject: {attempt.quiz.subject.name}", styles["Normal"]))
-        elements.append(Paragraph(f"Date: {attempt.started_at.strftime('%d-%m-%Y %H:%M')}", styles["Normal"]))
-
-        # Collect answers
-        answers = Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice")
-
-        data = [["Question", "Answer", "Marks", "Feedback"]]
-        for ans in answers:
-            if ans.selected_choice:
-                ans_text = ans.selected_choice.text
-            else:
-                ans_text = ans.text_answer or "-"
-            data.append([ans.question.text, ans_text, ans.score, ans.feedback or ""])
-
-        table = Table(data, colWidths=[200, 150, 60, 100])
-        table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-        ]))
-        elements.append(table)
-        elements.append(Spacer(1, 15))
-
-    doc.build(elements)
-    return response
+    job = request_report(request.user, "student_results", {"student_id": int(student_id)}, f"student_{student_id}_results.pdf")
+    return _report_response(request, job)
 
 
+@login_required
 def download_closed_quiz_report(request, quiz_id):
     """Download report for all students who attempted a closed quiz."""
-    quiz = Quiz.objects.get(id=quiz_id)
-    attempts = StudentQuizAttempt.objects.filter(quiz=quiz).select_related("student")
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="quiz_{quiz_id}_report.pdf"'
-
-    doc = SimpleDocTemplate(response, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Header
-    school_logo = os.path.join(settings.MEDIA_ROOT, "school_logo.png")
-    school_name = getattr(settings, "SCHOOL_NAME", "My school name")
-    header_data = [
-        [
-            Image(school_logo, width=50, height=50) if os.path.exists(school_logo) else "",
-            Paragraph(f"<b>{school_name}</b><br/>Exam Report: {quiz.title}", styles["Title"]),
-            "",
-        ]
-    ]
-    header_table = Table(header_data, colWidths=[70, 350, 70])
-    header_table.setStyle(TableStyle([("ALIGN", (1, 0), (1, 0), "CENTER")]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 20))
-
-    # Loop through each student's attempt
-    for attempt in attempts:
-        student = attempt.student
-        elements.append(Paragraph(f"<b>Student:</b> {student.get_full_name()} ({getattr(student, 'student_class', 'N/A')})", styles["Heading3"]))
-        elements.append(Paragraph(f"Date: {attempt.started_at.strftime('%d-%m-%Y %H:%M')}", styles["Normal"]))
-
-        answers = Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice")
-
-        data = [["Question", "Answer", "Marks", "Feedback"]]
-        for ans in answers:
-            if ans.selected_choice:
-                ans_text = ans.selected_choice.text
-            else:
-                ans_text = ans.text_answer or "-"
-            data.append([ans.question.text, ans_text, ans.obtained_marks, ans.feedback or ""])
-
-        table = Table(data, colWidths=[200, 150, 60, 100])
-        table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-        ]))
-        elements.append(table)
-        elements.append(Spacer(1, 15))
-
-    doc.build(elements)
-    return response
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    job = request_report(request.user, "quiz", {"quiz_id": quiz.id}, f"quiz_{quiz.id}_report.pdf")
+    return _report_response(request, job)
 
 
 # -------------------------
@@ -2091,20 +1702,8 @@ def leaderboard(request):
     """
     Renders a leaderboard template showing top students by average score across their completed attempts.
     """
-    # compute average attempt scores per student; use StudentQuizAttempt.score (we ensure it's set on submit)
-    qs = StudentQuizAttempt.objects.filter(is_submitted=True).values("student").annotate(
-        avg_score=Avg("score"), attempts=Sum("score")
-    ).order_by("-avg_score")[:50]
-
-    # map to user objects + scores
-    leaderboard_list = []
-    for item in qs:
-        user_id = item["student"]
-        try:
-            user = User.objects.get(id=user_id)
-            leaderboard_list.append({"student": user, "avg_score": item["avg_score"] or 0})
-        except User.DoesNotExist:
-            continue
+    # top 50 of the global board, students loaded in the same query
+    leaderboard_list = [{"student": e.student, "avg_score": e.avg_score} for e in boards.top(boards.GLOBAL, limit=50)]
 
     return render(request, "exams/leaderboard.html", {"leaderboard": leaderboard_list})
 
@@ -2220,164 +1819,61 @@ def create_quiz_ajax(request):
 @require_POST
 def import_quiz_excel(request):
     """
-    Expect FormData with 'excel_file' and optionally 'subject_id' (or subject/class declared in file).
-    Excel format (first sheet):
-      - Row 1..6: metadata key/value in column A/B:
-         A1: quiz_title  B1: My Quiz Title
-         A2: class_name  B2: JSS1
-         A3: subject_name B3: Mathematics
-         A4: start_time  B4: 2025-09-13 14:00
-         A5: end_time    B5: 2025-09-13 15:00
-         A6: duration_minutes B6: 60
-         A7: is_published B7: True
-      - Row 9 header then rows from 10:
-         Columns: question_text | question_type | marks | choice_1 | choice_1_correct (0/1) | choice_2 | choice_2_correct | ...
+    Expect FormData with 'excel_file', in the download_excel_template format (see
+    exams.quiz_import). The whole sheet is checked before anything is saved; if it has
+    problems nothing is imported and they are listed per row:
+      {"ok": false, "error": "...", "errors": [{"row": 12, "field": "marks", "error": "..."}], "truncated": false}
     """
     f = request.FILES.get('excel_file')
     if not f:
         return JsonResponse({"ok": False, "error": "No file uploaded"}, status=400)
 
-    # save to temp location (openpyxl can read file-like objects but safer to store)
     try:
-        wb = load_workbook(filename=f, data_only=True)
-    except Exception as e:
+        quiz, parsed = quiz_import.import_workbook(f, request.user)
+    except (InvalidFileException, BadZipFile, KeyError, OSError) as e:
         return JsonResponse({"ok": False, "error": "Invalid Excel file: " + str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": "Import failed: " + str(e)}, status=500)
 
-    sheet = wb.active
-
-    def cell_value(r,c):
-        return sheet.cell(row=r, column=c).value
-
-    # read metadata
-    try:
-        meta = {}
-        for r in range(1, 9):
-            key = cell_value(r,1)
-            val = cell_value(r,2)
-            if key:
-                meta[str(key).strip().lower()] = val
-    except Exception:
-        return JsonResponse({"ok": False, "error": "Failed to read metadata"}, status=400)
-
-    title = meta.get("exam_title") or meta.get("title")
-    class_name = meta.get("class_name")
-    subject_name = meta.get("subject_name")
-    start_time_s = meta.get("start_time")
-    end_time_s = meta.get("end_time")
-    duration = int(meta.get("duration_minutes") or meta.get("duration") or 30)
-    published = bool(meta.get("is_published")) if meta.get("is_published") is not None else False
+    if quiz is None:
+        count = len(parsed.errors)
+        error = f"{count}{'+' if parsed.truncated else ''} problem{'s' if count != 1 else ''} found in the sheet; nothing was imported."
+        return JsonResponse({"ok": False, "error": error, **parsed.report()}, status=400)
 
-    # validate subject/class
-    if not (class_name and subject_name and title):
-        return JsonResponse({"ok": False, "error": "Metadata must include class_name, subject_name and exam_title"}, status=400)
+    log_action(
+        user=request.user, action_type="Imported Exam from Excel", model_name="Exam", object_id=str(quiz.id),
+        details={"questions": len(parsed.questions)},
+    )
+    return JsonResponse({
+        "ok": True, "quiz_id": quiz.id, "questions": len(parsed.questions), "message": "Exam imported from Excel.",
+    })
 
-    try:
-        school_class = Class.objects.get(name__iexact=str(class_name).strip())
-    except Class.DoesNotExist:
-        return JsonResponse({"ok": False, "error": f"Class '{class_name}' not found"}, status=404)
-    try:
-        subject = Subject.objects.get(name__iexact=str(subject_name).strip(), school_class=school_class)
-    except Subject.DoesNotExist:
-        return JsonResponse({"ok": False, "error": f"Subject '{subject_name}' not found for class {class_name}"}, status=404)
 
-    # parse datetimes (support datetime objects too)
-    def parse_dt_obj(v):
-        if v is None:
-            return None
-        if isinstance(v, datetime):
-            return timezone.make_aware(v) if timezone.is_naive(v) else v
-        try:
-            s = str(v)
-            if "T" in s: s = s.replace("T"," ")
-            return timezone.make_aware(datetime.strptime(s, "%d-%m-%Y %H:%M"))
-        except Exception:
-            try:
-                return timezone.make_aware(datetime.fromisoformat(str(v)))
-            except Exception:
-                return None
-
-    st = parse_dt_obj(start_time_s)
-    et = parse_dt_obj(end_time_s)
-    if not st or not et:
-        return JsonResponse({"ok": False, "error": "Invalid start_time or end_time in metadata. Use 'DD-MM-YYYY HH:MM' or Excel datetime."}, status=400)
-
-    # find header row (we expect header at row 9 or row with 'question_text')
-    header_row = None
-    for r in range(1, 30):
-        first_col = cell_value(r,1)
-        if first_col and str(first_col).strip().lower() in ("question_text","question","q_text"):
-            header_row = r
-            break
-    if header_row is None:
-        # assume header at row 9
-        header_row = 9
-
-    # parse questions starting from header_row+1 to last row with question_text
-    questions = []
-    r = header_row + 1
-    while True:
-        q_text = cell_value(r, 1)
-        if q_text is None:
-            break
-        q_type = cell_value(r, 2) or 'objective'
-        q_marks = int(cell_value(r, 3) or 1)
-
-        # choices start at col 4, every pair: text, correct
-        choices = []
-        col = 4
-        while True:
-            c_text = cell_value(r, col)
-            c_flag = cell_value(r, col+1)
-            if c_text is None:
-                break
-            is_corr = False
-            if c_flag in (1, '1', True, 'TRUE', 'true'):
-                is_corr = True
-            choices.append({"text": str(c_text).strip(), "is_correct": bool(is_corr)})
-            col += 2
-
-        questions.append({
-            "text": str(q_text).strip(),
-            "question_type": str(q_type).strip().lower(),
-            "marks": q_marks,
-            "choices": choices
-        })
-        r += 1
+@login_required
+@user_passes_test(is_teacher_or_admin)
+@require_POST
+def import_quiz_bulk(request):
+    """
+    Expect FormData with 'file': a ZIP of exam workbooks or one workbook with an exam per
+    sheet (see exams.bulk_import). Every exam is imported or fails on its own; the response
+    lists each with its outcome, and uploading the same file again retries only those
+    not yet imported.
+    """
+    f = request.FILES.get('file')
+    if not f:
+        return JsonResponse({"ok": False, "error": "No file uploaded"}, status=400)
 
-    # Now create quiz
     try:
-        with transaction.atomic():
-            quiz = Quiz.objects.create(
-                title=title,
-                school_class=school_class,
-                subject=subject,
-                created_by=request.user,
-                start_time=st,
-                end_time=et,
-                duration_minutes=duration,
-                is_published=published
-            )
-            # create questions
-            for q in questions:
-                qtext = q["text"]
-                qtype = q["question_type"]
-                qmarks = q["marks"]
-                question = Question.objects.create(quiz=quiz, text=qtext, question_type=qtype, marks=qmarks)
-                if qtype == "objective":
-                    if not q["choices"]:
-                        raise ValueError("Objective question without choices found in Excel.")
-                    correct_found = False
-                    for c in q["choices"]:
-                        Choice.objects.create(question=question, text=c["text"], is_correct=c["is_correct"])
-                        if c["is_correct"]:
-                            correct_found = True
-                    if not correct_found:
-                        raise ValueError("Objective question must have at least one correct choice.")
-            return JsonResponse({"ok": True, "quiz_id": quiz.id, "message": "Exam imported from Excel."})
+        items = bulk_import.sources(f.read(), f.name)
     except ValueError as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
-    except Exception as e:
-        return JsonResponse({"ok": False, "error": "Import failed: " + str(e)}, status=500)
+    if not items:
+        return JsonResponse({"ok": False, "error": "No Excel workbooks found in the upload"}, status=400)
+
+    results = bulk_import.import_sources(items, request.user)
+    counts = bulk_import.summarize(results)
+    log_action(user=request.user, action_type="Bulk Imported Exams", description=f.name, details=counts)
+    return JsonResponse({"ok": counts["failed"] == 0, **counts, "results": results})
 
 
 # ---- Manage quizzes page ----
@@ -2400,7 +1896,8 @@ def publish_toggle_ajax(request, quiz_id):
     if request.user != quiz.created_by and request.user.role not in ('admin','superadmin'):
         return JsonResponse({"ok": False, "error": "Permission denied."}, status=403)
     quiz.is_published = not quiz.is_published
-    quiz.save()
+    quiz.save(update_fields=["is_published"])
+    quiz.bump_content_version()  # new snapshot version for the take page
     return JsonResponse({"ok": True, "is_published": quiz.is_published})
 
 # ---- AJAX delete ----
@@ -2411,8 +1908,11 @@ def delete_quiz_ajax(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
     if request.user != quiz.created_by and request.user.role not in ('admin','superadmin'):
         return JsonResponse({"ok": False, "error": "Permission denied."}, status=403)
+    students = attempt_students(quiz=quiz)
     quiz.delete()
-    ActionLog.objects.create(
+    refresh_students(students)  # drops the deleted attempts from their dashboards
+    boards.refresh_students(students)  # and from the leaderboards
+    log_action(
     user=request.user,
     action_type= "Delete Exam",
     model_name="Exam",
@@ -2488,7 +1988,9 @@ def edit_quiz_ajax(request, quiz_id):
             quiz.end_time = end_time
             quiz.duration_minutes = int(duration_minutes)
             quiz.is_published = is_published
-            quiz.save()
+            # not content_version: it only moves through bump_content_version's F() update,
+            # so a concurrent edit's bump is never overwritten with the value loaded here
+            quiz.save(update_fields=["title", "subject", "start_time", "end_time", "duration_minutes", "is_published"])
             
 
             # delete old questions & choices, then recreate
@@ -2517,8 +2019,11 @@ def edit_quiz_ajax(request, quiz_id):
                             correct_found = True
                     if not correct_found:
                         raise ValueError(f"At least one correct choice required for question {qidx}")
+            invalidate_answer_key(quiz)
+            # past-attempt rows show the exam's title and correct answers
+            refresh_summaries_for_attempts(StudentQuizAttempt.objects.filter(quiz=quiz, is_submitted=True))
             # success
-            ActionLog.objects.create(
+            log_action(
             user=request.user,
             action_type="Edit Exam",
             model_name="Exam",
@@ -2539,7 +2044,8 @@ def edit_quiz_ajax(request, quiz_id):
 def toggle_quiz_publish(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
     quiz.is_published = not quiz.is_published
-    quiz.save()
+    quiz.save(update_fields=["is_published"])
+    quiz.bump_content_version()
     return JsonResponse({"ok": True, "new_status": quiz.is_published})
 
 def quiz_detail_api(request, quiz_id):
@@ -2781,6 +2287,7 @@ def request_retake(request, attempt_id):
     # Mark request
     attempt.retake_requested = True
     attempt.save()
+    refresh_student_summary(attempt.student_id, [attempt.id])
 
     # Notify admin/teacher
     Notification.objects.create(
@@ -2821,6 +2328,9 @@ def approve_retake(request, attempt_id):
     attempt.is_submitted = False
     attempt.end_time = None
     attempt.save()
+    refresh_student_summary(attempt.student_id, [attempt.id])
+    boards.refresh_students([attempt.student_id])
+    events.publish(attempt.student_id, "retake", {"attempt_id": attempt.id, "quiz_id": attempt.quiz_id, "status": "approved"})
 
     # Notify studenl
     Notification.objects.create(
@@ -2830,7 +2340,7 @@ def approve_retake(request, attempt_id):
     )
 
     # Log action
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
         action_type="approve_retake",
         details={"attempt_id": attempt.id, "student": attempt.student.username, "Exam": attempt.quiz.title}
@@ -2874,7 +2384,9 @@ def take_quiz_view(request, quiz_id):
             attempt = None
 
     if not attempt:
-        # not resuming: check whether quiz open or retake allowed
+        admission = AdmissionController(quiz)
+        # not resuming: check whether quiz open or retake allowed (a waiting-room ticket
+        # holds a place in the queue, not the exam open past its end time)
         available = quiz.is_published and (quiz.start_time <= now <= quiz.end_time)
         last_attempt = StudentQuizAttempt.objects.filter(student=request.user, quiz=quiz).order_by("-started_at").first()
         allow_ret = quiz.allow_retake or (last_attempt and last_attempt.retake_allowed)
@@ -2884,7 +2396,19 @@ def take_quiz_view(request, quiz_id):
                 return redirect('quiz_result', attempt_id=last_attempt.id)
             return redirect('quiz_closed_detail', quiz_id=quiz.id)
 
+        # pace new starts; the timer only begins once admitted, so waiting costs no exam time
+        result = admission.admit(request)
+        if not result.admitted:
+            response = render(request, "exams/waiting_room.html", {
+                "quiz": quiz,
+                "retry_after": result.retry_after,
+                "position": result.position,
+            }, status=429)  # not 5xx: the session (holding the ticket) is only saved below 500
+            response["Retry-After"] = str(result.retry_after)
+            return response
+
         # create new attempt
+        now = timezone.now()
         end_time = now + timezone.timedelta(minutes=quiz.duration_minutes)
         attempt = StudentQuizAttempt.objects.create(
             student=request.user,
@@ -2896,27 +2420,67 @@ def take_quiz_view(request, quiz_id):
             retake_count=(last_attempt.retake_count+1 if last_attempt else 0),
             score=0.0
         )
-        ActionLog.objects.create(user=request.user, action_type="Started Exam", description=f"Started exam {quiz.title}", model_name="StudentQuizAttempt", object_id=str(attempt.id), details={"Exam": quiz.title})
+        note_attempt_started(request.user.pk)
+        log_action(user=request.user, action_type="Started Exam", description=f"Started exam {quiz.title}", model_name="StudentQuizAttempt", object_id=str(attempt.id), details={"Exam": quiz.title})
 
-    # ensure questions are prefetched for template rendering
-    questions = quiz.questions.prefetch_related("choices").all()
-    # also pass existing saved answers to prefill (dict question_id -> answer)
+    # questions come from the immutable published snapshot (shared by every student);
+    # only this attempt's saved answers are read live (dict question_id -> answer)
+    snapshot = get_quiz_snapshot(quiz)
     saved_answers = {}
-    for ans in Answer.objects.filter(attempt=attempt).select_related("selected_choice", "question"):
-        if ans.question.question_type == "objective" and ans.selected_choice:
-            saved_answers[str(ans.question.id)] = {"choice_id": ans.selected_choice.id}
+    for qid, choice_id, text in Answer.objects.filter(attempt=attempt).values_list("question_id", "selected_choice_id", "text_answer"):
+        if choice_id:
+            saved_answers[str(qid)] = {"choice_id": choice_id}
         else:
-            saved_answers[str(ans.question.id)] = {"text": ans.text_answer}
+            saved_answers[str(qid)] = {"text": text}
 
     context = {
         "quiz": quiz,
         "attempt": attempt,
-        "questions": questions,
+        "questions_html": snapshot.questions_html,
         "saved_answers": saved_answers,
     }
     return render(request, "exams/take_quiz.html", context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def quiz_snapshot_api(request, quiz_id):
+    """
+    Published quiz content (questions + choices, no correct flags) as JSON.
+    Versioned by Quiz.content_version and served with an ETag, so clients revalidate with a 304.
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if is_student(request.user):
+        if not quiz.is_published or quiz.school_class_id != request.user.student_class_id:
+            return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+        now = timezone.now()
+        if quiz.start_time and now < quiz.start_time:
+            # before the exam opens only a student already sitting it (e.g. a granted retake) sees the questions
+            attempts = StudentQuizAttempt.objects.filter(student=request.user, quiz=quiz)
+            active = attempts.filter(is_submitted=False).filter(Q(end_time__isnull=True) | Q(end_time__gt=now))
+            if not (active.exists() or attempts.filter(retake_allowed=True).exists()):
+                return JsonResponse({"ok": False, "error": "exam has not started"}, status=403)
+    elif not is_teacher_or_admin(request.user):
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    etag = quiz_etag(quiz.id, quiz.content_version)
+    if etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_quiz_snapshot(quiz).payload, content_type="application/json")
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
+
+
+@login_required
+@user_passes_test(is_admin_or_superadmin)
+def quiz_admission_metrics(request, quiz_id):
+    """Waiting-room metrics for a quiz: queue depth, admitted starts and admission latency."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    return JsonResponse({"ok": True, "metrics": AdmissionController(quiz).metrics()})
+
+
 @login_required
 @require_POST
 def api_submit_answer(request, attempt_id):
@@ -2926,7 +2490,7 @@ def api_submit_answer(request, attempt_id):
     - For subjective: answer is text
     Autograde objectives here.
     """
-    attempt = get_object_or_404(StudentQuizAttempt, id=attempt_id, student=request.user)
+    attempt = get_object_or_404(StudentQuizAttempt.objects.select_related("quiz"), id=attempt_id, student=request.user)
     if attempt.is_submitted:
         return JsonResponse({"ok": False, "error": "Attempt already submitted"}, status=400)
     if attempt.end_time and timezone.now() > attempt.end_time:
@@ -2943,43 +2507,34 @@ def api_submit_answer(request, attempt_id):
     if not qid:
         return JsonResponse({"ok": False, "error": "question_id required"}, status=400)
 
-    question = get_object_or_404(Question, id=qid, quiz=attempt.quiz)
+    question = get_answer_key(attempt.quiz).get(qid)
+    if question is None:
+        return JsonResponse({"ok": False, "error": "Question not found"}, status=404)
 
     # objective
-    if question.question_type == "objective":
-        # answer should be a choice id (int or str)
+    if question.is_objective:
+        # answer should be a choice id (int or str) belonging to this question
         try:
-            choice = Choice.objects.get(id=int(answer), question=question)
-        except Exception:
-            choice = None
-
-        if choice:
-            obtained = float(question.marks) if choice.is_correct else 0.0
-            ans_obj, created = Answer.objects.update_or_create(
-                attempt=attempt, question=question,
-                defaults={
-                    "selected_choice": choice,
-                    "text_answer": None,
-                    "score": obtained,
-                    "is_pending": False,
-                }
-            )
-        else:
-            # clear selection
-            ans_obj, created = Answer.objects.update_or_create(
-                attempt=attempt, question=question,
-                defaults={
-                    "selected_choice": None,
-                    "text_answer": None,
-                    "score": 0.0,
-                    "is_pending": False,
-                }
-            )
+            choice_id = int(answer)
+        except (TypeError, ValueError):
+            choice_id = None
+        if choice_id not in question.choice_ids:
+            choice_id = None  # clear selection
+
+        ans_obj, created = Answer.objects.update_or_create(
+            attempt=attempt, question_id=question.id,
+            defaults={
+                "selected_choice_id": choice_id,
+                "text_answer": None,
+                "score": question.score(choice_id),
+                "is_pending": False,
+            }
+        )
     else:
         # subjective: save text, mark is_pending True, obtained_marks left as 0 (teacher will grade later)
         text = str(answer or "")
         ans_obj, created = Answer.objects.update_or_create(
-            attempt=attempt, question=question,
+            attempt=attempt, question_id=question.id,
             defaults={
                 "selected_choice": None,
                 "text_answer": text,
@@ -2988,88 +2543,97 @@ def api_submit_answer(request, attempt_id):
             }
         )
 
-    ActionLog.objects.create(user=request.user, action_type="submit_answer", description="Autosaved answer", model_name="Answer", object_id=str(ans_obj.id), details={"question": question.id})
+    log_action(user=request.user, action_type="submit_answer", description="Autosaved answer", model_name="Answer", object_id=str(ans_obj.id), details={"question": question.id})
     return JsonResponse({"ok": True})
 
 
 @login_required
 @require_POST
-def api_submit_attempt(request, attempt_id):
+def api_submit_answers_batch(request, attempt_id):
     """
-    Final submission: autograde objective parts (again to be safe), sum objective + graded subjective.
-    Returns JSON with overall score and per-question details.
+    Batched autosave (AJAX). Accepts JSON: {answers: [{question_id, answer, client_seq}, ...]}
+    - client_seq increases per change on the client; older saves never overwrite newer ones
+    Returns per-item acknowledgements: saved | stale | rejected
     """
-    attempt = get_object_or_404(StudentQuizAttempt, id=attempt_id, student=request.user)
+    attempt = get_object_or_404(StudentQuizAttempt.objects.select_related("quiz"), id=attempt_id, student=request.user)
+    if attempt.is_submitted:
+        return JsonResponse({"ok": False, "error": "Attempt already submitted"}, status=400)
+    if attempt.end_time and timezone.now() > attempt.end_time:
+        return JsonResponse({"ok": False, "error": "Attempt time expired"}, status=400)
 
+    try:
+        payload = json.loads(request.body.decode())
+    except Exception:
+        return JsonResponse({"ok": False, "error": "invalid json"}, status=400)
+
+    items = payload.get("answers") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"ok": False, "error": "answers list required"}, status=400)
+    if len(items) > MAX_BATCH_SIZE:
+        return JsonResponse({"ok": False, "error": f"at most {MAX_BATCH_SIZE} answers per batch"}, status=400)
+
+    acks = apply_answer_batch(attempt, items)
+    saved = [a["question_id"] for a in acks if a["status"] == "saved"]
+
+    if saved:
+        log_action(user=request.user, action_type="submit_answer", description="Autosaved answers (batch)", model_name="Answer", object_id=str(attempt.id), details={"questions": saved})
+    return JsonResponse({"ok": True, "results": acks})
+
+
+@login_required
+@require_POST
+def api_answer_journal(request, attempt_id):
+    """
+    Answer journal sync (AJAX). Accepts JSON: {entries: [{seq, question_id, answer}, ...]}
+    - entries are the client's unacknowledged journal tail, seq increases per change
+    - merging is idempotent per (attempt, question, seq): replays and out-of-order retries never regress an answer
+    Returns {ok, applied_seq}: every entry with seq <= applied_seq is stored and can be dropped by the client
+    """
+    attempt = get_object_or_404(StudentQuizAttempt.objects.select_related("quiz"), id=attempt_id, student=request.user)
     if attempt.is_submitted:
-        return JsonResponse({"ok": False, "error": "Already submitted"}, status=400)
+        return JsonResponse({"ok": False, "error": "Attempt already submitted"}, status=400)
+    if attempt.end_time and timezone.now() > attempt.end_time:
+        return JsonResponse({"ok": False, "error": "Attempt time expired"}, status=400)
 
-    # re-evaluate objective answers and ensure answers exist for all objective questions
-    answers_qs = Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice")
-    # Ensure every objective question has an Answer row (create with 0 if missing)
-    for q in attempt.quiz.questions.filter(question_type="objective"):
-        ans, created = Answer.objects.get_or_create(attempt=attempt, question=q, defaults={
-            "selected_choice": None, "text_answer": None, "score": 0.0, "is_pending": False
-        })
+    try:
+        payload = json.loads(request.body.decode())
+    except Exception:
+        return JsonResponse({"ok": False, "error": "invalid json"}, status=400)
 
-    # Auto-grade objective answers
-    score = 0.0
+    entries = payload.get("entries") if isinstance(payload, dict) else None
+    if not isinstance(entries, list):
+        return JsonResponse({"ok": False, "error": "entries list required"}, status=400)
+    if len(entries) > MAX_BATCH_SIZE:
+        return JsonResponse({"ok": False, "error": f"at most {MAX_BATCH_SIZE} entries per sync"}, status=400)
 
-    for ans in Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice"):
-        q = ans.question
-        if q.question_type == "objective":
-            if ans.selected_choice and getattr(ans.selected_choice, "is_correct", False):
-                ans.score = float(q.marks)
-                score += q.marks
-            
-            else:
-                ans.score = 0.0
-            ans.is_pending = False
-            ans.save(update_fields=["score", "is_pending"])
-        # subjective answers left as is (pending until graded)
-
-       # calculate totals using Answer helper methods
-    objective_sum = Answer.objective_score(attempt)
-    subjective_sum = Answer.subjective_score(attempt)  # only graded subjective answers contribute
-    total_score = float(objective_sum) + float(subjective_sum)
-
-    attempt.score = total_score
-    attempt.is_submitted = True
-    attempt.submitted_at = timezone.now() if hasattr(attempt, "submitted_at") else timezone.now()
-    attempt.save()
- 
+    applied_seq, acks = merge_answer_journal(attempt, entries)
 
-    ActionLog.objects.create(user=request.user, action_type="Submitted Exam", description=f"Submitted attempt {attempt.id}", model_name="StudentQuizAttempt", object_id=str(attempt.id), details={"score": attempt.score})
+    saved = [a["question_id"] for a in acks if a["status"] == "saved"]
+    if saved:
+        log_action(user=request.user, action_type="submit_answer", description="Autosaved answers (journal)", model_name="Answer", object_id=str(attempt.id), details={"questions": saved})
+    errors = [{"question_id": a["question_id"], "error": a["error"]} for a in acks if a["status"] == "rejected"]
+    return JsonResponse({"ok": True, "applied_seq": applied_seq, "rejected": errors})
 
-    # Build a summary payload
-    question_details = []
-    for ans in Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice"):
-        q = ans.question
-        if q.question_type == "objective":
-            student_ans = ans.selected_choice.text if ans.selected_choice else None
-            correct = bool(ans.selected_choice and getattr(ans.selected_choice, "is_correct", False))
-            correct_ans_text = ", ".join([c.text for c in q.choices.filter(is_correct=True)])
-            question_details.append({
-                "question_id": q.id,
-                "type": "objective",
-                "text": q.text,
-                "student": student_ans,
-                "correct_answer": correct_ans_text,
-                "marks_awarded": ans.score,
-                "max_marks": q.marks,
-                "status": "correct" if correct else "wrong",
-            })
-        else:
-            question_details.append({
-                "question_id": q.id,
-                "type": "subjective",
-                "text": q.text,
-                "student": ans.text_answer,
-                "marks_awarded": ans.score if not ans.is_pending else None,
-                "max_marks": q.marks,
-                "status": "pending" if ans.is_pending else "graded",
-                "feedback": ans.feedback,
-            })
+
+@login_required
+@require_POST
+def api_submit_attempt(request, attempt_id):
+    """
+    Final submission: autograde objective parts (again to be safe), sum objective + graded subjective.
+    Returns JSON with overall score and per-question details.
+    """
+    attempt = get_object_or_404(StudentQuizAttempt.objects.select_related("quiz"), id=attempt_id, student=request.user)
+
+    if attempt.is_submitted:
+        return JsonResponse({"ok": False, "error": "Already submitted"}, status=400)
+    # set-based pipeline: bulk-create missing answers, bulk-update scores, one aggregate for totals
+    result = finalize_attempt(attempt)
+    if result is None:  # closed concurrently (e.g. by the deadline sweep)
+        return JsonResponse({"ok": False, "error": "Already submitted"}, status=400)
+    objective_sum, subjective_sum, question_details = result
+    total_score = attempt.score
+
+    log_action(user=request.user, action_type="Submitted Exam", description=f"Submitted attempt {attempt.id}", model_name="StudentQuizAttempt", object_id=str(attempt.id), details={"score": attempt.score})
 
     return JsonResponse({
         "ok": True,
@@ -3085,21 +2649,23 @@ def quiz_result_view(request, attempt_id):
     """
     Render result page with per-question breakdown and Chart.js bar for objective correctness.
     """
-    attempt = get_object_or_404(StudentQuizAttempt, id=attempt_id)
+    attempt = get_object_or_404(StudentQuizAttempt.objects.select_related("quiz"), id=attempt_id)
     # allow only owner or teacher/admin
     if request.user != attempt.student and not is_teacher_or_admin(request.user):
         return HttpResponseForbidden("forbidden")
 
+    key = get_answer_key(attempt.quiz)
     answers = Answer.objects.filter(attempt=attempt).select_related("question", "selected_choice", "graded_by")
     qrows = []
     correct_count = 0
     for ans in answers:
         q = ans.question
         if q.question_type == "objective":
-            correct = bool(ans.selected_choice and getattr(ans.selected_choice, "is_correct", False))
+            qkey = key.get(q.id)
+            correct = bool(qkey and qkey.is_correct(ans.selected_choice_id))
             if correct:
                 correct_count += 1
-            correct_text = ", ".join([c.text for c in q.choices.filter(is_correct=True)])
+            correct_text = qkey.correct_text if qkey else ""
             student_text = ans.selected_choice.text if ans.selected_choice else (ans.text_answer or "")
             qrows.append({
                 "id": q.id,
@@ -3208,7 +2774,7 @@ def student_request_retake_view(request, quiz_id):
         )
 
     # Log action
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
         action_type="retake_request",
         description="Requested retake",
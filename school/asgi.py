@@ -3,6 +3,11 @@ ASGI config for school project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn school.asgi:application --workers 4``)
+so the push channel at /exams/api/events/stream/ holds no thread per open stream.
+With more than one worker keep EVENTS_BACKEND = "database" so events published by
+one worker reach streams held by the others (see exams.events).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -52,6 +52,36 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 SCHOOL_NAME = "AL MUMEEN STANDARD ACADEMY"
 
+# Exam start waiting room: a rate limit of new attempts admitted per window, per quiz (Quiz.starts_per_window
+# overrides). Its state lives in the cache: configure a shared CACHES backend when running several processes
+EXAM_STARTS_PER_WINDOW = 25
+EXAM_START_WINDOW_SECONDS = 1
+
+# Audit log: ActionLog rows are queued and bulk-written by a background thread
+AUDIT_LOG_WRITE_BEHIND = True
+AUDIT_LOG_BATCH_SIZE = 100
+AUDIT_LOG_FLUSH_SECONDS = 2
+AUDIT_LOG_SPILL_FILE = BASE_DIR / "audit_spill.jsonl"  # used while the database is busy
+AUDIT_LOG_SAMPLE_RATES = {}  # action type -> fraction kept, e.g. {"submit_answer": 0.1} keeps 10% of autosave events
+
+# Push events (notification stream): "local" fans out inside one process only,
+# "database" relays through the UserEvent table so every worker sees every event
+EVENTS_BACKEND = "database"
+EVENTS_POLL_SECONDS = 1
+EVENTS_RETENTION_SECONDS = 3600
+EVENTS_STREAM_SECONDS = 300  # ASGI streams reconnect after this long
+EVENTS_SYNC_STREAM_SECONDS = 0  # under WSGI a stream holds a worker thread: 0 long-polls instead, else keep it short
+
+# PDF reports: rendered by `manage.py run_report_worker` into MEDIA_ROOT/REPORTS_DIR and reused until the data changes
+REPORTS_DIR = "reports"
+REPORT_JOBS_INLINE = False  # True always renders in the request; False only while no worker is running
+REPORT_WORKER_POLL_SECONDS = 2
+REPORT_WORKER_TIMEOUT_SECONDS = 60  # a worker not seen for this long is taken as not running
+REPORT_JOB_TIMEOUT_SECONDS = 1800  # running jobs older than this are requeued
+REPORT_RETENTION_SECONDS = 7 * 24 * 3600
+REPORT_WORKERS = 1  # processes rendering one class report's student pages (0: one per core; above 1 needs pypdf, else 1)
+QUIZ_IMPORT_WORKERS = 1  # processes parsing a bulk exam import (0: one per core)
+
 
 # Messages config (optional but neat)
 from django.contrib.messages import constants as messages
@@ -0,0 +1,38 @@
+// Conditional polling for the dashboard data endpoints.
+// Each poll sends the cursor and ETag from the previous response. The server answers
+// 304 when nothing changed (poll() resolves to null, nothing to re-render) or returns
+// only the changed sections, which are merged into the last full payload.
+function createDashboardPoller() {
+  let data = null;
+  let cursor = null;
+  let etag = null;
+
+  function merge(target, part) {
+    Object.keys(part).forEach(key => {
+      const value = part[key];
+      const isObj = v => v && typeof v === 'object' && !Array.isArray(v);
+      target[key] = (isObj(value) && isObj(target[key])) ? Object.assign({}, target[key], value) : value;
+    });
+    return target;
+  }
+
+  return {
+    async poll(url) {
+      const u = new URL(url, window.location.origin);
+      const headers = {'X-Requested-With': 'XMLHttpRequest'};
+      if (data && cursor) {
+        u.searchParams.set('cursor', cursor);
+        if (etag) headers['If-None-Match'] = etag;
+      }
+      const res = await fetch(u, {headers: headers, credentials: 'same-origin', cache: 'no-store'});
+      if (res.status === 304) return null;
+      if (!res.ok) throw new Error('Failed to fetch dashboard data');
+      const delta = await res.json();
+      cursor = delta.cursor || null;
+      etag = res.headers.get('ETag');
+      data = merge(data || {}, delta);
+      return data;
+    },
+    reset() { data = null; cursor = null; etag = null; },
+  };
+}
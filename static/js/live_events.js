@@ -0,0 +1,86 @@
+// Push channel for the dashboards.
+// Opens an EventSource on the event stream; if the browser has no EventSource, the
+// server offers no stream or the stream keeps failing, falls back to long-polling. One channel is shared by every
+// caller on the page. onEvent(event) is called for every event ({id, type, data,
+// created_at}); onChange() once per burst of events. schedule(fn, fastMs, slowMs) runs
+// fn every fastMs while the channel is down and only every slowMs while it is up, so
+// the dashboards keep a slow safety refresh.
+const liveChannels = {};
+// a poll the server answers at once (WSGI servers don't hold polls open) is repeated only
+// after this long
+const POLL_INTERVAL_MS = 5000;
+
+function openLiveEvents(streamUrl, pollUrl, options) {
+  const opts = options || {};
+  let channel = liveChannels[streamUrl];
+  if (!channel) channel = liveChannels[streamUrl] = createLiveChannel(streamUrl, pollUrl);
+  channel.listen(opts);
+  return channel;
+}
+
+function createLiveChannel(streamUrl, pollUrl) {
+  const listeners = [];
+  let connected = false;
+  let lastId = null;
+
+  function handle(event) {
+    lastId = event.id;
+    listeners.forEach(l => {
+      if (l.onEvent) l.onEvent(event);
+      if (l.onChange) {
+        clearTimeout(l.timer);
+        l.timer = setTimeout(l.onChange, 300);
+      }
+    });
+  }
+
+  async function longPoll() {
+    let delay = 1000;
+    while (true) {
+      try {
+        const started = Date.now();
+        const u = new URL(pollUrl, window.location.origin);
+        if (lastId !== null) u.searchParams.set('after', lastId);
+        const res = await fetch(u, {credentials: 'same-origin', cache: 'no-store'});
+        if (!res.ok) throw new Error('poll failed');
+        const body = await res.json();
+        connected = true;
+        delay = 1000;
+        (body.events || []).forEach(handle);
+        lastId = body.last_id;
+        const wait = POLL_INTERVAL_MS - (Date.now() - started);
+        if (wait > 0) await new Promise(r => setTimeout(r, wait));
+      } catch (e) {
+        connected = false;
+        await new Promise(r => setTimeout(r, delay));
+        delay = Math.min(delay * 2, 30000);
+      }
+    }
+  }
+
+  function openStream() {
+    const source = new EventSource(streamUrl, {withCredentials: true});
+    let failures = 0;
+    source.onopen = () => { connected = true; failures = 0; };
+    source.onmessage = (e) => { try { handle(JSON.parse(e.data)); } catch (err) { console.error(err); } };
+    source.onerror = () => {
+      connected = false;
+      // the server ends streams on purpose and the browser reconnects; give up on repeated
+      // failures, or at once when the browser won't reconnect (a 204: no streams here)
+      if (source.readyState === EventSource.CLOSED || ++failures >= 3) { source.close(); longPoll(); }
+    };
+  }
+
+  if (window.EventSource) openStream(); else longPoll();
+
+  return {
+    listen(opts) { listeners.push(Object.assign({timer: null}, opts)); },
+    connected() { return connected; },
+    schedule(fn, fastMs, slowMs) {
+      let last = Date.now();
+      setInterval(() => {
+        if (!connected || Date.now() - last >= slowMs) { last = Date.now(); fn(); }
+      }, fastMs);
+    },
+  };
+}
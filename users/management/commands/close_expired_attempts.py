@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams.grading import close_expired_attempts
+
+
+class Command(BaseCommand):
+    help = "Auto-submit and grade exam attempts whose end_time has passed. Use --loop to keep sweeping."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running, sweeping every --interval seconds")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds between sweeps in --loop mode")
+        parser.add_argument("--batch-size", type=int, default=200, help="Attempts graded per transaction")
+        parser.add_argument("--grace", type=int, default=0, help="Extra seconds after end_time before closing")
+
+    def handle(self, *args, **options):
+        while True:
+            closed, elapsed = close_expired_attempts(batch_size=options["batch_size"], grace_seconds=options["grace"])
+            self.stdout.write(self.style.SUCCESS(f"Sweep closed {closed} attempt(s) in {elapsed:.2f}s"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
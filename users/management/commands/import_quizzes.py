@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.bulk_import import import_sources, sources, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Import exams from ZIPs of exam workbooks and/or multi-sheet workbooks (download_excel_template format). "
+        "Exams already imported are skipped, so an interrupted or partly failed import can simply be run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="ZIP archives or .xlsx workbooks")
+        parser.add_argument("--user", required=True, help="Username the imported exams are created by")
+        parser.add_argument("--workers", type=int, default=None, help="Parsing processes (QUIZ_IMPORT_WORKERS; 0: one per core)")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']}")
+
+        started = time.monotonic()
+        items = []
+        for path in options["paths"]:
+            try:
+                with open(path, "rb") as f:
+                    items.extend(sources(f.read(), path))
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+        results = import_sources(items, user, workers=options["workers"])
+        for result in results:
+            if result["status"] == "failed":
+                self.stdout.write(self.style.ERROR(f"failed    {result['source']}"))
+                for error in result["errors"]:
+                    row = f"row {error['row']}" if error["row"] else "file"
+                    self.stdout.write(f"          {row}, {error['field']}: {error['error']}")
+                if result["truncated"]:
+                    self.stdout.write("          ...")
+            else:
+                self.stdout.write(
+                    f"{result['status']:<9} {result['source']} -> exam #{result['quiz_id']} ({result['questions']} questions)"
+                )
+
+        counts = summarize(results)
+        summary = (
+            f"{counts['imported']} imported, {counts['skipped']} already imported, {counts['failed']} failed "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        if counts["failed"]:
+            raise CommandError(summary + "; fix the failed sheets and run the import again")
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the global, class and subject leaderboard tables from submitted attempts (backfills, repairs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Students recomputed per query")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        students = rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt leaderboards for {students} student(s) in {time.monotonic() - started:.2f}s"
+        ))
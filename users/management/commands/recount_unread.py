@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams.inbox import recount
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's unread-notification counter from the notification table (backfills, repairs)."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted unread notifications for {users} user(s) in {time.monotonic() - started:.2f}s"
+        ))
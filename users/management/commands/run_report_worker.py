@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from exams.report_jobs import work
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF report jobs into MEDIA_ROOT (run one or more alongside the web workers)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--sleep", type=float, default=None, help="Seconds between queue polls (REPORT_WORKER_POLL_SECONDS)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Report worker started")
+        try:
+            work(once=options["once"], sleep=options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Report worker stopped"))
@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.loadsim import seed_school, teardown_school, run_simulation, compare_reports, render_html
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic school and drive virtual students through a full exam "
+        "(login, take, autosave, submit, result). Reports latency percentiles, throughput, "
+        "error rates and DB queries per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=100)
+        parser.add_argument("--questions", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=20, help="Virtual students active at once")
+        parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which students arrive")
+        parser.add_argument("--think-min", type=float, default=1.0, help="Min seconds between answers")
+        parser.add_argument("--think-max", type=float, default=3.0, help="Max seconds between answers")
+        parser.add_argument("--url", help="Base URL of a running server (e.g. http://127.0.0.1:8000). Default: in-process")
+        parser.add_argument("--host", default="localhost", help="Host header for in-process runs")
+        parser.add_argument("--prefix", default="loadsim", help="Name prefix for the seeded users/class")
+        parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+        parser.add_argument("--json", dest="json_path", help="Write the report as JSON")
+        parser.add_argument("--html", dest="html_path", help="Write the report as HTML")
+        parser.add_argument("--compare", help="Earlier JSON report to compare against")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded school afterwards")
+
+    def handle(self, *args, **opts):
+        if opts["think_min"] > opts["think_max"]:
+            raise CommandError("--think-min must not exceed --think-max")
+        baseline = None
+        if opts["compare"]:
+            with open(opts["compare"], encoding="utf-8") as fh:
+                baseline = json.load(fh)
+
+        school = seed_school(students=opts["students"], questions=opts["questions"], prefix=opts["prefix"])
+        self.stdout.write(f"Seeded {len(school.usernames)} students and a {len(school.questions)}-question exam")
+        try:
+            report = run_simulation(
+                school,
+                concurrency=opts["concurrency"],
+                ramp_up=opts["ramp_up"],
+                think=(opts["think_min"], opts["think_max"]),
+                base_url=opts["url"],
+                host=opts["host"],
+                seed=opts["seed"],
+            )
+        finally:
+            if not opts["keep"]:
+                teardown_school(opts["prefix"])
+
+        if baseline:
+            report["comparison"] = compare_reports(report, baseline)
+
+        self.stdout.write(
+            f"{report['total_requests']} requests in {report['duration_s']}s "
+            f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}"
+        )
+        for name, data in report["endpoints"].items():
+            queries = "" if data["avg_queries"] is None else f"  queries {data['avg_queries']}"
+            self.stdout.write(
+                f"  {name:<15} n={data['requests']:<6} p50 {data['p50_ms']}ms  p95 {data['p95_ms']}ms  "
+                f"p99 {data['p99_ms']}ms  errors {data['errors']}{queries}"
+            )
+        for name, metrics in (report.get("comparison") or {}).items():
+            p95 = metrics.get("p95_ms")
+            if p95 and p95["change_pct"] is not None:
+                self.stdout.write(f"  {name:<15} p95 {p95['before']}ms -> {p95['after']}ms ({p95['change_pct']:+}%)")
+
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"JSON report written to {opts['json_path']}"))
+        if opts["html_path"]:
+            with open(opts["html_path"], "w", encoding="utf-8") as fh:
+                fh.write(render_html(report))
+            self.stdout.write(self.style.SUCCESS(f"HTML report written to {opts['html_path']}"))
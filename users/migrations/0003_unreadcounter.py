@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    Notification = apps.get_model("users", "Notification")
+    UnreadCounter = apps.get_model("users", "UnreadCounter")
+    rows = (
+        Notification.objects.filter(is_read=False)
+        .values("recipient_id").annotate(unread=Count("id")).order_by()
+    )
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=r["recipient_id"], unread=r["unread"]) for r in rows], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_broadcastmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_unreadcounter'),
+    ]
+
+    # existing accounts are left empty (their creation time is unknown); new ones get the default
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='created_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='created_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, null=True),
+        ),
+    ]
@@ -23,6 +23,8 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     other_name = models.CharField(max_length=100, blank=True, null=True)
     date_joined = models.DateTimeField(auto_now=True)
+    # when the account was created (date_joined above changes on every save); empty for accounts older than the field
+    created_at = models.DateTimeField(default=timezone.now, null=True, blank=True, editable=False)
     gender = models.CharField(max_length=10, choices=GENDER, null=True, blank=True)
     age = models.PositiveIntegerField(default=8)
     date_of_birth = models.CharField(max_length=20, blank=True, null=True)
@@ -96,6 +98,57 @@ class Notification(models.Model):
         return f"To {self.recipient} from {self.sender}: {self.message[:30]}"
 
 
+class BroadcastMessage(models.Model):
+    """
+    One announcement for everyone in an audience (a role and/or a class), stored once and
+    merged into each user's notifications when read. Read state lives in BroadcastReceipt.
+    """
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_broadcasts")
+    message = models.TextField()
+    role = models.CharField(max_length=20, choices=Notification.ROLE_CHOICES, blank=True)  # blank: every role
+    school_class = models.ForeignKey(Class, on_delete=models.CASCADE, null=True, blank=True, related_name="broadcasts")  # null: every class
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["role", "created_at"], name="broadcast_role_created_idx")]
+
+    def audience_display(self):
+        who = f"all {self.role}s" if self.role else "everyone"
+        return f"{who} in {self.school_class}" if self.school_class_id else who
+
+    def get_target_display(self):
+        return f"To {self.audience_display()} from {self.sender}: {self.message[:30]}"
+
+    def __str__(self):
+        return self.get_target_display()
+
+
+class BroadcastReceipt(models.Model):
+    """Marks one broadcast as read by one user; users who haven't read it have no row."""
+    broadcast = models.ForeignKey(BroadcastMessage, on_delete=models.CASCADE, related_name="receipts")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="broadcast_receipts")
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["broadcast", "user"], name="broadcast_receipt_unique")]
+
+    def __str__(self):
+        return f"{self.user} read broadcast #{self.broadcast_id}"
+
+
+class UnreadCounter(models.Model):
+    """
+    How many of a user's direct Notifications are unread, kept in step by exams.inbox so
+    badges don't count the notification table. Users without a row have none unread.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="unread_counter")
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}: {self.unread} unread"
+
+
 class UserStatusLog(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="status_logs")
     old_status = models.CharField(max_length=20, null=True, blank=True)
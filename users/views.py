@@ -8,9 +8,11 @@ from .models import Notification
 from django.urls import reverse
 from .forms import TeacherAdminForm, EditUserRegistrationForm, EditTeacherAdminForm, UserRegistrationForm, loginForm
 from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import Http404, JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST   
-from exams.models import ActionLog  
+from exams.utils import log_action
+from exams.broadcast import post_broadcast
+from exams import inbox
 
 User = get_user_model()
 
@@ -113,7 +115,7 @@ def edit_user(request, user_id):
                 "role": updated_user.role,
             }
             # Log the edit
-            ActionLog.objects.create(
+            log_action(
                 user=request.user,
                 action_type="Edit User",
                 model_name="User",
@@ -262,7 +264,7 @@ def update_user(request, user_id):
     user.save()
 
     # Log action
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
         action_type="Edited user",
         model_name="User",
@@ -294,7 +296,7 @@ def delete_user(request, user_id):
     user.delete()
 
     # Log action
-    ActionLog.objects.create(
+    log_action(
         user=request.user,
         action_type="Deleted user",
         model_name="User",
@@ -322,9 +324,8 @@ def dashboard_redirect(request):
 
 @login_required
 def mark_notification_read(request, pk):
-    notif = get_object_or_404(Notification, pk=pk, recipient=request.user)
-    notif.is_read = True
-    notif.save()
+    if not inbox.mark_read(request.user, pk):
+        raise Http404("Notification not found")
     messages.success(request, "Notification marked as read ✅")
     return redirect("dashboard")
 
@@ -337,21 +338,16 @@ def send_broadcast(request):
 
         # Decide recipients
         if sender.role == "admin":
-            recipients = User.objects.filter(role__in=["teacher", "student"])
+            roles = ["teacher", "student"]
         elif sender.role == "teacher":
-            recipients = User.objects.filter(role="student")
+            roles = ["student"]
         else:
             messages.error(request, "You cannot send broadcasts.")
             return redirect("dashboard")
 
-        # Create notifications
-        for recipient in recipients:
-            Notification.objects.create(
-                sender=sender,
-                recipient=recipient,
-                message=message,
-                role=recipient.role,
-            )
+        # One broadcast row per audience role, shown to each member when they read notifications
+        for role in roles:
+            post_broadcast(sender, message, role=role)
 
         messages.success(request, "Broadcast sent successfully ✅")
     return redirect("dashboard")